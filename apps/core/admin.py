@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import LojaPerfil, Produto, Cardapio
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import LojaPerfil, Produto, Cardapio, PerfilRequisicao, CoordenadaCep
 
 
 @admin.register(LojaPerfil)
@@ -30,3 +34,51 @@ class CardapioAdmin(admin.ModelAdmin):
     list_display = ("id", "loja")
     autocomplete_fields = ("loja",)
     inlines = [ProdutoInline]
+
+
+@admin.register(CoordenadaCep)
+class CoordenadaCepAdmin(admin.ModelAdmin):
+    list_display = ("prefixo", "cidade", "estado", "latitude", "longitude")
+    list_filter = ("estado",)
+    search_fields = ("prefixo", "cidade")
+
+
+@admin.register(PerfilRequisicao)
+class PerfilRequisicaoAdmin(admin.ModelAdmin):
+    list_display = ("criado_em", "metodo", "caminho", "view", "status", "duracao_ms", "total_queries", "tempo_sql_ms", "user", "download")
+    list_filter = ("metodo", "status", "view")
+    search_fields = ("caminho", "view")
+    readonly_fields = (
+        "criado_em", "user", "metodo", "caminho", "view", "status", "duracao_ms",
+        "total_queries", "tempo_sql_ms", "relatorio", "queries", "download",
+    )
+    exclude = ("pstats",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.baixar_pstats),
+                name="core_perfilrequisicao_download",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description="pstats")
+    def download(self, obj):
+        url = reverse("admin:core_perfilrequisicao_download", args=[obj.pk])
+        return format_html('<a href="{}">baixar .prof</a>', url)
+
+    def baixar_pstats(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        perfil = get_object_or_404(PerfilRequisicao, pk=pk)
+        response = HttpResponse(bytes(perfil.pstats), content_type="application/octet-stream")
+        response["Content-Disposition"] = f'attachment; filename="perfil-{perfil.pk}.prof"'
+        return response
@@ -0,0 +1,137 @@
+"""
+Seleção de campos nas listagens: `?fields=id,nome,preco` ou `?exclude=descricao`.
+
+O mixin corta os campos do serializer e ajusta a consulta ao que sobrou:
+`only()` com as colunas necessárias e `select_related`/`prefetch_related`
+só para as relações que algum campo pedido usa. Campos que não são colunas
+do model declaram o que precisam em `campos_carga`.
+"""
+from drf_yasg import openapi
+from rest_framework.exceptions import ValidationError
+
+
+PARAMETROS_CAMPOS = [
+    openapi.Parameter(
+        "fields", openapi.IN_QUERY,
+        description="Campos a retornar, separados por vírgula (ex.: id,nome,preco)",
+        type=openapi.TYPE_STRING
+    ),
+    openapi.Parameter(
+        "exclude", openapi.IN_QUERY,
+        description="Campos a omitir, separados por vírgula",
+        type=openapi.TYPE_STRING
+    ),
+]
+
+
+class Carga:
+    """
+    O que um campo do serializer precisa do banco: colunas para `only()`
+    (caminhos do ORM) e relações a carregar junto.
+    """
+
+    def __init__(self, *only, select_related=(), prefetch_related=()):
+        self.only = only
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+
+
+class CamposSelecionaveisMixin:
+    campos_carga = {}
+
+    def get_campos_carga(self):
+        """
+        Cargas dos campos do serializer em uso; views com mais de um
+        serializer na listagem escolhem aqui.
+        """
+        return self.campos_carga
+
+    def _campos_disponiveis(self):
+        if not hasattr(self, "_campos_serializer"):
+            serializer = self.get_serializer_class()(context=self.get_serializer_context())
+            self._campos_serializer = serializer.fields
+        return self._campos_serializer
+
+    def _ler_lista(self, parametro):
+        valor = self.request.query_params.get(parametro)
+        if valor is None:
+            return None
+        return {nome.strip() for nome in valor.split(",") if nome.strip()}
+
+    def campos_solicitados(self):
+        """
+        Nomes dos campos pedidos na listagem, ou None para todos.
+        """
+        if self.action != "list":
+            return None
+        if hasattr(self, "_campos_solicitados"):
+            return self._campos_solicitados
+
+        incluir = self._ler_lista("fields")
+        excluir = self._ler_lista("exclude")
+        campos = None
+
+        if incluir is not None or excluir is not None:
+            disponiveis = set(self._campos_disponiveis())
+            desconhecidos = ((incluir or set()) | (excluir or set())) - disponiveis
+            if desconhecidos:
+                raise ValidationError({
+                    "fields": [f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}."]
+                })
+            campos = (incluir if incluir is not None else disponiveis) - (excluir or set())
+
+        self._campos_solicitados = campos
+        return campos
+
+    def carregar_campos(self, queryset):
+        campos_serializer = self._campos_disponiveis()
+        nomes = self.campos_solicitados()
+        if nomes is None:
+            nomes = set(campos_serializer)
+
+        campos_carga = self.get_campos_carga()
+        colunas_modelo = {campo.name for campo in queryset.model._meta.concrete_fields}
+        only = set()
+        select_related = set()
+        prefetch_related = []
+        restringir = True
+
+        for nome in nomes:
+            carga = campos_carga.get(nome)
+            if carga is None:
+                fonte = campos_serializer[nome].source
+                if fonte in colunas_modelo:
+                    only.add(fonte)
+                else:
+                    # Campo calculado sem carga declarada: não dá para saber as colunas.
+                    restringir = False
+                continue
+
+            only.update(carga.only)
+            select_related.update(carga.select_related)
+            prefetch_related.extend(p for p in carga.prefetch_related if p not in prefetch_related)
+
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if restringir:
+            # A FK precisa estar carregada para seguir o select_related.
+            only.update(select_related)
+            queryset = queryset.only(queryset.model._meta.pk.name, *sorted(only))
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list":
+            queryset = self.carregar_campos(queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        campos = self.campos_solicitados()
+        if campos is not None:
+            alvo = getattr(serializer, "child", serializer)
+            for nome in set(alvo.fields) - campos:
+                alvo.fields.pop(nome)
+        return serializer
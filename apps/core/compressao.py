@@ -0,0 +1,101 @@
+"""
+Compressão das respostas da API: negociação via Accept-Encoding e codecs.
+
+Brotli é usado quando o pacote `brotli` está instalado e o cliente o aceita;
+senão, gzip. Os níveis padrão (gzip 5, brotli 4) ficam perto do melhor
+tamanho com uma fração do CPU dos níveis máximos, o que importa para
+respostas geradas a cada requisição (ao contrário dos estáticos, que o
+Whitenoise comprime uma vez no collectstatic).
+
+Mitigação de BREACH: páginas HTML e respostas que definem cookies (o login
+devolve o token) nunca são comprimidas, e o gzip leva um preenchimento de
+tamanho aleatório no cabeçalho, como o `GZipMiddleware` do Django, para que
+o tamanho da resposta não revele o conteúdo byte a byte. O formato do
+brotli não tem onde pôr esse preenchimento; ele conta só com as exclusões.
+"""
+import gzip
+import secrets
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+
+TIPOS_COMPRIMIVEIS = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/yaml",
+    "text/",
+)
+
+TIPOS_NAO_COMPRIMIVEIS = ("text/html",)
+
+
+def codecs_disponiveis():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def comprimir(dados, codificacao, nivel=None, max_bytes_aleatorios=0):
+    if codificacao == "br":
+        qualidade = nivel if nivel is not None else getattr(settings, "COMPRESSAO_QUALIDADE_BROTLI", 4)
+        return brotli.compress(dados, quality=qualidade, mode=brotli.MODE_TEXT)
+    if codificacao == "gzip":
+        nivel = nivel if nivel is not None else getattr(settings, "COMPRESSAO_NIVEL_GZIP", 5)
+        comprimido = gzip.compress(dados, compresslevel=nivel, mtime=0)
+        if max_bytes_aleatorios:
+            comprimido = _preencher_gzip(comprimido, max_bytes_aleatorios)
+        return comprimido
+    raise ValueError(f"Codificação não suportada: {codificacao}")
+
+
+def _preencher_gzip(comprimido, max_bytes_aleatorios):
+    """
+    Mesmo truque de `django.utils.text.compress_string`: um campo FNAME de
+    tamanho aleatório no cabeçalho, que os clientes ignoram.
+    """
+    cabecalho = bytearray(comprimido[:10])
+    cabecalho[3] |= gzip.FNAME
+    nome = b"a" * secrets.randbelow(max_bytes_aleatorios) + b"\x00"
+    return bytes(cabecalho) + nome + comprimido[10:]
+
+
+def negociar(accept_encoding, disponiveis=None):
+    """
+    Escolhe a codificação de maior q aceita pelo cliente entre as disponíveis;
+    no empate, vale a ordem de `disponiveis` (brotli antes de gzip).
+    """
+    disponiveis = disponiveis or codecs_disponiveis()
+    pesos = {}
+    for item in (accept_encoding or "").split(","):
+        partes = [p.strip() for p in item.split(";")]
+        nome = partes[0].lower()
+        if not nome:
+            continue
+        q = 1.0
+        for parametro in partes[1:]:
+            if parametro.startswith("q="):
+                try:
+                    q = float(parametro[2:])
+                except ValueError:
+                    q = 0.0
+        pesos[nome] = q
+
+    melhor, melhor_q = None, 0.0
+    for codificacao in disponiveis:
+        q = pesos.get(codificacao, pesos.get("*", 0.0))
+        if q > melhor_q:
+            melhor, melhor_q = codificacao, q
+    return melhor
+
+
+def comprimivel(response):
+    if response.cookies or response.has_header("Set-Cookie"):
+        return False
+    tipo = response.get("Content-Type", "").split(";")[0].strip().lower()
+    if tipo in TIPOS_NAO_COMPRIMIVEIS:
+        return False
+    return any(tipo.startswith(prefixo) for prefixo in TIPOS_COMPRIMIVEIS)
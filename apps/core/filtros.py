@@ -0,0 +1,109 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django import forms
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+from django_filters import rest_framework as filters
+
+from .models import LojaPerfil, Produto
+
+
+# Limites das faixas de preço das facetas; a última faixa não tem teto.
+FAIXAS_PRECO = (Decimal("10"), Decimal("20"), Decimal("50"), Decimal("100"))
+
+# Maior janela aceita em `?novidades=` (dias).
+NOVIDADES_MAX_DIAS = 3650
+
+
+class InteiroFilter(filters.NumberFilter):
+    field_class = forms.IntegerField
+
+
+class LojaFilter(filters.FilterSet):
+    preco_ate = filters.NumberFilter(
+        field_name="preco_minimo", lookup_expr="lte",
+        label="Lojas com algum produto até este preço",
+    )
+    min_produtos = filters.NumberFilter(
+        field_name="produtos_ativos", lookup_expr="gte",
+        label="Quantidade mínima de produtos ativos",
+    )
+    com_estoque = filters.BooleanFilter(method="filtrar_com_estoque", label="Só lojas com produtos em estoque")
+
+    class Meta:
+        model = LojaPerfil
+        fields = []
+
+    def filtrar_com_estoque(self, queryset, name, value):
+        if value:
+            return queryset.filter(produtos_em_estoque__gt=0)
+        return queryset.filter(produtos_em_estoque=0)
+
+
+class ProdutoFilter(filters.FilterSet):
+    preco_min = filters.NumberFilter(field_name="preco", lookup_expr="gte", label="Preço mínimo")
+    preco_max = filters.NumberFilter(field_name="preco", lookup_expr="lte", label="Preço máximo")
+    loja = filters.NumberFilter(field_name="loja_id", label="ID da loja")
+    em_estoque = filters.BooleanFilter(method="filtrar_em_estoque", label="Só produtos com estoque")
+    novidades = InteiroFilter(
+        method="filtrar_novidades", label="Só produtos cadastrados nos últimos N dias",
+        validators=[MinValueValidator(1), MaxValueValidator(NOVIDADES_MAX_DIAS)],
+    )
+
+    class Meta:
+        model = Produto
+        fields = []
+
+    def filtrar_em_estoque(self, queryset, name, value):
+        if value:
+            return queryset.filter(quantidade__gt=0)
+        return queryset.filter(quantidade=0)
+
+    def filtrar_novidades(self, queryset, name, value):
+        return queryset.filter(criada_em__gte=timezone.now() - timedelta(days=value))
+
+
+def faixa_preco():
+    """
+    Índice da faixa de preço (0 = abaixo de FAIXAS_PRECO[0]), como expressão SQL.
+    """
+    return Case(
+        *[When(preco__lt=limite, then=Value(i)) for i, limite in enumerate(FAIXAS_PRECO)],
+        default=Value(len(FAIXAS_PRECO)),
+        output_field=IntegerField(),
+    )
+
+
+def facetas_produtos(queryset):
+    """
+    Contagens por loja e por faixa de preço do queryset já filtrado, a partir
+    de uma única consulta agrupada por (loja, faixa).
+    """
+    grupos = (
+        queryset.order_by()
+        .annotate(faixa=faixa_preco())
+        .values("loja_id", "loja__nome", "faixa")
+        .annotate(total=Count("id"))
+    )
+
+    lojas = {}
+    faixas = [0] * (len(FAIXAS_PRECO) + 1)
+    for grupo in grupos:
+        loja = lojas.setdefault(grupo["loja_id"], {"id": grupo["loja_id"], "nome": grupo["loja__nome"], "total": 0})
+        loja["total"] += grupo["total"]
+        faixas[grupo["faixa"]] += grupo["total"]
+
+    limites = (None, *FAIXAS_PRECO, None)
+    return {
+        "lojas": sorted(lojas.values(), key=lambda loja: (-loja["total"], loja["nome"])),
+        "faixas_preco": [
+            {
+                "de": str(limites[i]) if limites[i] is not None else None,
+                "ate": str(limites[i + 1]) if limites[i + 1] is not None else None,
+                "total": total,
+            }
+            for i, total in enumerate(faixas)
+        ],
+    }
@@ -0,0 +1,118 @@
+"""
+Geohash e distâncias para a busca de lojas próximas.
+
+Um geohash é a coordenada codificada em base 32, intercalando bits de
+longitude e latitude: pontos próximos compartilham prefixo, então um índice
+B-tree comum na coluna `geohash` responde "tudo dentro desta célula" com uma
+faixa (`geohash BETWEEN 'abc' AND 'abczzz...'`). Funciona igual no SQLite e
+no Postgres, sem extensão espacial.
+
+A busca cobre o retângulo do raio com poucas células, poda pelo retângulo em
+latitude/longitude e só então calcula a distância exata (haversine).
+"""
+import math
+
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISAO = 12
+RAIO_TERRA_KM = 6371.0088
+
+
+def codificar(latitude, longitude, precisao=PRECISAO):
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    caracteres = []
+    bits = 0
+    valor = 0
+    par = True  # bits pares são de longitude
+
+    while len(caracteres) < precisao:
+        if par:
+            meio = (lon_min + lon_max) / 2
+            if longitude >= meio:
+                valor = (valor << 1) | 1
+                lon_min = meio
+            else:
+                valor <<= 1
+                lon_max = meio
+        else:
+            meio = (lat_min + lat_max) / 2
+            if latitude >= meio:
+                valor = (valor << 1) | 1
+                lat_min = meio
+            else:
+                valor <<= 1
+                lat_max = meio
+        par = not par
+        bits += 1
+        if bits == 5:
+            caracteres.append(BASE32[valor])
+            bits = 0
+            valor = 0
+    return "".join(caracteres)
+
+
+def tamanho_celula(precisao):
+    """
+    Altura e largura, em graus, de uma célula com `precisao` caracteres.
+    """
+    bits = precisao * 5
+    bits_lon = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (1 << bits_lat), 360.0 / (1 << bits_lon)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def retangulo(latitude, longitude, raio_km):
+    """
+    (lat_min, lat_max, lon_min, lon_max) que contém o círculo do raio.
+    Não cruza o antimeridiano: os limites de longitude são truncados em ±180.
+    """
+    dlat = math.degrees(raio_km / RAIO_TERRA_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, math.degrees(raio_km / (RAIO_TERRA_KM * cos_lat)))
+    return (
+        max(-90.0, latitude - dlat),
+        min(90.0, latitude + dlat),
+        max(-180.0, longitude - dlon),
+        min(180.0, longitude + dlon),
+    )
+
+
+def celulas(caixa, max_celulas=16):
+    """
+    Prefixos geohash que cobrem o retângulo: a precisão mais fina que ainda
+    cabe em `max_celulas` células.
+    """
+    lat_min, lat_max, lon_min, lon_max = caixa
+    for precisao in range(PRECISAO, 0, -1):
+        altura, largura = tamanho_celula(precisao)
+        linhas = math.floor((lat_max + 90) / altura) - math.floor((lat_min + 90) / altura) + 1
+        colunas = math.floor((lon_max + 180) / largura) - math.floor((lon_min + 180) / largura) + 1
+        if linhas * colunas <= max_celulas:
+            break
+
+    prefixos = set()
+    linha0 = math.floor((lat_min + 90) / altura)
+    coluna0 = math.floor((lon_min + 180) / largura)
+    for i in range(linhas):
+        for j in range(colunas):
+            # Centro de cada célula da grade, preso aos limites do globo.
+            lat = min(89.999999, -90 + (linha0 + i + 0.5) * altura)
+            lon = min(179.999999, -180 + (coluna0 + j + 0.5) * largura)
+            prefixos.add(codificar(lat, lon, precisao))
+    return sorted(prefixos)
+
+
+def faixa(prefixo):
+    """
+    Limites (inclusivos) dos geohashes completos que começam com `prefixo`.
+    """
+    return prefixo, prefixo + BASE32[-1] * (PRECISAO - len(prefixo))
@@ -0,0 +1,106 @@
+"""
+CEP → coordenadas sem consultar serviços externos.
+
+A tabela `CoordenadaCep` guarda o centro aproximado de cada prefixo de CEP
+(carregada de um CSV com `manage.py carregar_ceps`); a busca usa o prefixo
+mais longo que casar. O resultado fica no cache do Django, compartilhado
+entre os workers, o que poupa o banco para CEPs repetidos (mesmo bairro,
+mesmo prédio). As chaves levam uma versão: `limpar_cache()` a troca e
+todos os workers passam a ignorar o que foi gravado antes da recarga. CEPs
+sem prefixo conhecido não são guardados, para que apareçam assim que a
+tabela for completada.
+"""
+import csv
+import time
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db.models.functions import Length
+
+from .models import CoordenadaCep
+
+
+DATASET_PADRAO = Path(__file__).resolve().parent / "dados" / "cep_prefixos.csv"
+CHAVE_VERSAO = "cep:versao"
+VALIDADE_CACHE = 24 * 60 * 60
+
+
+def normalizar_cep(cep):
+    return "".join(c for c in str(cep or "") if c.isdigit())[:8]
+
+
+def _versao():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        # Sem versão (cache novo ou despejado): um valor inédito, nunca reaproveita chaves antigas.
+        cache.add(CHAVE_VERSAO, time.time_ns(), None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def _buscar(digitos):
+    chave = f"cep:{_versao()}:{digitos}"
+    coordenada = cache.get(chave)
+    if coordenada is not None:
+        return tuple(coordenada)
+
+    prefixos = [digitos[:n] for n in range(len(digitos), 0, -1)]
+    coordenada = (
+        CoordenadaCep.objects.filter(prefixo__in=prefixos)
+        .order_by(Length("prefixo").desc())
+        .values_list("latitude", "longitude")
+        .first()
+    )
+    if coordenada is not None:
+        cache.set(chave, list(coordenada), VALIDADE_CACHE)
+    return coordenada
+
+
+def coordenadas_do_cep(cep):
+    """
+    (latitude, longitude) do CEP, ou None se nenhum prefixo for conhecido.
+    """
+    digitos = normalizar_cep(cep)
+    if not digitos:
+        return None
+    return _buscar(digitos)
+
+
+def limpar_cache():
+    """
+    Invalida as coordenadas em cache de todos os workers (após recarregar
+    a tabela de prefixos).
+    """
+    cache.set(CHAVE_VERSAO, time.time_ns(), None)
+
+
+def completar_coordenadas(dados):
+    """
+    Preenche latitude/longitude a partir do CEP quando não vieram nos dados
+    de um endereço. Coordenadas informadas pelo cliente têm precedência.
+    """
+    if dados.get("latitude") is not None and dados.get("longitude") is not None:
+        return dados
+    coordenada = coordenadas_do_cep(dados.get("cep"))
+    if coordenada is None:
+        return dados
+    return {**dados, "latitude": coordenada[0], "longitude": coordenada[1]}
+
+
+def ler_csv(caminho):
+    """
+    Linhas do CSV (prefixo, cidade, estado, latitude, longitude) como
+    instâncias não salvas de CoordenadaCep.
+    """
+    with open(caminho, newline="", encoding="utf-8") as arquivo:
+        for linha in csv.DictReader(arquivo):
+            prefixo = normalizar_cep(linha["prefixo"])
+            if not prefixo:
+                continue
+            yield CoordenadaCep(
+                prefixo=prefixo,
+                cidade=linha.get("cidade", ""),
+                estado=linha.get("estado", ""),
+                latitude=float(linha["latitude"]),
+                longitude=float(linha["longitude"]),
+            )
@@ -0,0 +1,73 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.geocodificacao import DATASET_PADRAO, coordenadas_do_cep, ler_csv, limpar_cache
+from apps.core.models import CoordenadaCep
+from apps.users.models import Endereco
+
+
+class Command(BaseCommand):
+    help = (
+        "Carrega a tabela de prefixos de CEP → coordenadas a partir de um CSV "
+        "(prefixo,cidade,estado,latitude,longitude). Sem arquivo, usa o conjunto "
+        "embutido, com uma coordenada por região de CEP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", nargs="?", default=str(DATASET_PADRAO))
+        parser.add_argument("--limpar", action="store_true", help="Apaga os prefixos existentes antes de carregar.")
+        parser.add_argument("--lote", type=int, default=2000, help="Registros por INSERT.")
+        parser.add_argument(
+            "--preencher-enderecos", action="store_true",
+            help="Preenche as coordenadas dos endereços já cadastrados que ainda não têm.",
+        )
+
+    def handle(self, *args, **opts):
+        linhas = ler_csv(opts["arquivo"])
+        carregados = 0
+
+        with transaction.atomic():
+            if opts["limpar"]:
+                CoordenadaCep.objects.all().delete()
+            while True:
+                lote = list(islice(linhas, opts["lote"]))
+                if not lote:
+                    break
+                CoordenadaCep.objects.bulk_create(
+                    lote,
+                    update_conflicts=True,
+                    unique_fields=["prefixo"],
+                    update_fields=["cidade", "estado", "latitude", "longitude"],
+                )
+                carregados += len(lote)
+        limpar_cache()
+        self.stdout.write(self.style.SUCCESS(f"{carregados} prefixo(s) de CEP carregado(s)."))
+
+        if opts["preencher_enderecos"]:
+            self.preencher_enderecos(opts["lote"])
+
+    def preencher_enderecos(self, lote):
+        pendentes = Endereco.objects.filter(latitude__isnull=True).only("id", "cep").order_by("id")
+        preenchidos = 0
+        ultimo_id = 0
+
+        while True:
+            enderecos = list(pendentes.filter(id__gt=ultimo_id)[:lote])
+            if not enderecos:
+                break
+            ultimo_id = enderecos[-1].id
+
+            alterados = []
+            for endereco in enderecos:
+                coordenada = coordenadas_do_cep(endereco.cep)
+                if coordenada is None:
+                    continue
+                endereco.latitude, endereco.longitude = coordenada
+                endereco.atualizar_geohash()
+                alterados.append(endereco)
+            Endereco.objects.bulk_update(alterados, ["latitude", "longitude", "geohash"])
+            preenchidos += len(alterados)
+
+        self.stdout.write(self.style.SUCCESS(f"{preenchidos} endereço(s) com coordenadas preenchidas."))
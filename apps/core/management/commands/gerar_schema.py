@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.schema import gerar_schema, gravar_schema, versao_codigo
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera o schema OpenAPI (JSON e YAML, com versões gzip) em OPENAPI_DIR, "
+        "para ser servido estático em /swagger.json e /swagger.yaml."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--destino", default=None, help="Diretório de saída (padrão: OPENAPI_DIR).")
+
+    def handle(self, *args, **opts):
+        destino = opts["destino"] or settings.OPENAPI_DIR
+        versao = versao_codigo()
+        if versao is None:
+            raise CommandError("Defina OPENAPI_VERSAO (sem ela, a revisão git é usada) para gravar o schema.")
+        gravar_schema(destino, gerar_schema(), versao)
+        self.stdout.write(self.style.SUCCESS(f"Schema OpenAPI ({versao}) gravado em {destino}."))
@@ -0,0 +1,284 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.models import LojaPerfil, Produto, Cardapio
+from apps.pedidos.models import Carrinho, CarrinhoItem, Pedido, PedidoItem, SequenciaPedidos
+from apps.users.models import User, Endereco, Pagamento
+
+
+PREFIXO = "bench_"
+
+# (cidade, UF, prefixo do CEP, latitude e longitude do centro)
+CIDADES = [
+    ("Recife", "PE", "50", -8.05, -34.90), ("São Paulo", "SP", "01", -23.55, -46.63),
+    ("Rio de Janeiro", "RJ", "20", -22.91, -43.17), ("Belo Horizonte", "MG", "30", -19.92, -43.94),
+    ("Salvador", "BA", "40", -12.97, -38.50), ("Fortaleza", "CE", "60", -3.73, -38.52),
+    ("Curitiba", "PR", "80", -25.43, -49.27), ("Porto Alegre", "RS", "90", -30.03, -51.23),
+]
+# Espalhamento dos endereços em torno do centro da cidade, em graus (~0,1° ≈ 11 km).
+DISPERSAO_GRAUS = 0.08
+PRATOS = [
+    "Pizza", "Hambúrguer", "Açaí", "Pastel", "Coxinha", "Tapioca", "Marmita", "Sushi",
+    "Salada", "Esfiha", "Cuscuz", "Baião de dois", "Moqueca", "Lasanha", "Torta", "Suco",
+]
+ADJETIVOS = ["da casa", "especial", "tradicional", "vegana", "grande", "pequena", "do dia", "premium"]
+
+# Distribuição de status de pedidos antigos (a maioria já foi entregue).
+STATUS_PESOS = [
+    (Pedido.ENTREGUE, 80), (Pedido.CANCELADO, 8), (Pedido.PENDENTE, 5),
+    (Pedido.PREPARANDO, 4), (Pedido.A_CAMINHO, 3),
+]
+
+
+@contextmanager
+def sem_auto_now(modelo, *campos):
+    """
+    Desliga auto_now/auto_now_add para gravar datas históricas em bulk_create.
+    """
+    originais = []
+    for nome in campos:
+        campo = modelo._meta.get_field(nome)
+        originais.append((campo, campo.auto_now, campo.auto_now_add))
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originais:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos para benchmarks (usuários, lojas, produtos, carrinhos e pedidos) "
+        f"com bulk inserts. Todos os usuários criados têm username iniciado por '{PREFIXO}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=1000)
+        parser.add_argument("--lojas", type=int, default=50)
+        parser.add_argument("--produtos-por-loja", type=int, default=40)
+        parser.add_argument("--pedidos", type=int, default=20000)
+        parser.add_argument("--max-itens-por-pedido", type=int, default=5)
+        parser.add_argument("--fracao-com-carrinho", type=float, default=0.2)
+        parser.add_argument("--senha", default="bench12345", help="Senha de todos os usuários gerados.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--lote", type=int, default=2000, help="Tamanho dos lotes de bulk_create.")
+        parser.add_argument("--limpar", action="store_true", help="Remove os dados de benchmark existentes antes.")
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts["seed"])
+        self.lote = opts["lote"]
+
+        if opts["limpar"]:
+            removidos, _ = User.objects.filter(username__startswith=PREFIXO).delete()
+            self.stdout.write(f"{removidos} registro(s) de benchmark removido(s).")
+
+        if User.objects.filter(username__startswith=PREFIXO).exists():
+            self.stderr.write("Já existem dados de benchmark. Use --limpar para recriá-los.")
+            return
+
+        with transaction.atomic():
+            senha = make_password(opts["senha"])
+            lojas = self._criar_lojas(opts["lojas"], senha)
+            produtos = self._criar_produtos(lojas, opts["produtos_por_loja"])
+            clientes = self._criar_clientes(opts["clientes"], senha)
+            self._criar_carrinhos(clientes, lojas, produtos, opts["fracao_com_carrinho"])
+            self._criar_pedidos(clientes, lojas, produtos, opts["pedidos"], opts["max_itens_por_pedido"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Gerados: {len(lojas)} lojas, {sum(len(p) for p in produtos.values())} produtos, "
+            f"{len(clientes)} clientes, {opts['pedidos']} pedidos. Senha: {opts['senha']}"
+        ))
+
+    def _bulk(self, modelo, objetos):
+        return modelo.objects.bulk_create(objetos, batch_size=self.lote)
+
+    def _endereco(self, user):
+        cidade, estado, prefixo_cep, latitude, longitude = self.rng.choice(CIDADES)
+        endereco = Endereco(
+            user=user,
+            rua=f"Rua {self.rng.randint(1, 500)}",
+            numero=str(self.rng.randint(1, 3000)),
+            bairro=f"Bairro {self.rng.randint(1, 40)}",
+            cidade=cidade,
+            estado=estado,
+            cep=f"{prefixo_cep}{self.rng.randint(0, 999):03d}-{self.rng.randint(0, 999):03d}",
+            latitude=self.rng.gauss(latitude, DISPERSAO_GRAUS),
+            longitude=self.rng.gauss(longitude, DISPERSAO_GRAUS),
+        )
+        # bulk_create não chama save().
+        endereco.atualizar_geohash()
+        return endereco
+
+    def _criar_usuarios(self, quantidade, senha, loja):
+        tipo = "l" if loja else "c"
+        self._bulk(User, [
+            User(
+                username=f"{PREFIXO}{tipo}{i}",
+                email=f"{PREFIXO}{tipo}{i}@bench.local",
+                nome=f"Benchmark {tipo.upper()}{i}",
+                password=senha,
+                loja=loja,
+            )
+            for i in range(quantidade)
+        ])
+        # bulk_create não devolve PK em todos os bancos; recarrega pela chave única.
+        return list(User.objects.filter(username__startswith=f"{PREFIXO}{tipo}").order_by("id"))
+
+    def _criar_lojas(self, quantidade, senha):
+        usuarios = self._criar_usuarios(quantidade, senha, loja=True)
+        self._bulk(Endereco, [self._endereco(u) for u in usuarios])
+        enderecos = {e.user_id: e for e in Endereco.objects.filter(user__in=usuarios)}
+
+        self._bulk(LojaPerfil, [
+            LojaPerfil(
+                user=u,
+                nome=f"{self.rng.choice(PRATOS)} {self.rng.choice(ADJETIVOS).title()} #{i}",
+                endereco=enderecos[u.id],
+                aberta=self.rng.random() < 0.85,
+            )
+            for i, u in enumerate(usuarios)
+        ])
+        lojas = list(LojaPerfil.objects.filter(user__in=usuarios).order_by("id"))
+        self._bulk(Cardapio, [Cardapio(loja=loja) for loja in lojas])
+        return lojas
+
+    def _criar_produtos(self, lojas, por_loja):
+        agora = timezone.now()
+        objetos = []
+        for loja in lojas:
+            # Cardápios de tamanhos variados em torno da média pedida.
+            for _ in range(max(1, int(self.rng.gauss(por_loja, por_loja / 3)))):
+                criada_em = agora - timedelta(days=self.rng.uniform(0, 720))
+                preco = Decimal(str(round(min(max(self.rng.lognormvariate(3.2, 0.6), 3), 400), 2)))
+                disponivel = self.rng.random() < 0.9
+                objetos.append(Produto(
+                    loja=loja,
+                    nome=f"{self.rng.choice(PRATOS)} {self.rng.choice(ADJETIVOS)}",
+                    descricao="Produto gerado para benchmark.",
+                    preco=preco,
+                    quantidade=self.rng.randint(50, 5000) if disponivel else 0,
+                    disponivel=disponivel,
+                    active=self.rng.random() < 0.97,
+                    criada_em=criada_em,
+                    atualizada_em=criada_em,
+                ))
+
+        with sem_auto_now(Produto, "criada_em", "atualizada_em"):
+            self._bulk(Produto, objetos)
+        # bulk_create não dispara os sinais que mantêm os contadores das lojas.
+        LojaPerfil.objects.filter(pk__in=[loja.pk for loja in lojas]).atualizar_contadores()
+
+        produtos = {}
+        for produto in Produto.objects.filter(loja__in=lojas).order_by("id"):
+            produtos.setdefault(produto.loja_id, []).append(produto)
+
+        Relacao = Cardapio.produtos.through
+        cardapios = dict(Cardapio.objects.filter(loja__in=lojas).values_list("loja_id", "id"))
+        self._bulk(Relacao, [
+            Relacao(cardapio_id=cardapios[loja_id], produto_id=p.id)
+            for loja_id, itens in produtos.items()
+            for p in itens
+            if p.active
+        ])
+        return produtos
+
+    def _criar_clientes(self, quantidade, senha):
+        usuarios = self._criar_usuarios(quantidade, senha, loja=False)
+        self._bulk(Endereco, [self._endereco(u) for u in usuarios])
+        self._bulk(Pagamento, [
+            Pagamento(user=u, metodo="pix", chave_pix=f"{u.username}@pix")
+            if self.rng.random() < 0.6 else
+            Pagamento(
+                user=u, metodo="cartao", nome_no_cartao=u.nome,
+                numero_cartao=f"4111{self.rng.randint(10**11, 10**12 - 1)}", validade="12/30", cvv="123",
+            )
+            for u in usuarios
+        ])
+        return usuarios
+
+    def _pesos_lojas(self, lojas):
+        # Popularidade no estilo Zipf: poucas lojas concentram a maior parte dos pedidos.
+        return [1 / (posicao + 1) for posicao in range(len(lojas))]
+
+    def _escolher_itens(self, produtos, maximo):
+        quantidade = min(len(produtos), self.rng.randint(1, maximo))
+        return [(p, self.rng.choices([1, 2, 3, 4], [60, 25, 10, 5])[0]) for p in self.rng.sample(produtos, quantidade)]
+
+    def _criar_carrinhos(self, clientes, lojas, produtos, fracao):
+        pesos = self._pesos_lojas(lojas)
+        com_carrinho = [c for c in clientes if self.rng.random() < fracao]
+        escolhas = {c.id: self.rng.choices(lojas, pesos)[0] for c in com_carrinho}
+
+        self._bulk(Carrinho, [Carrinho(user=c, loja=escolhas[c.id]) for c in com_carrinho])
+        carrinhos = Carrinho.objects.filter(user__in=com_carrinho)
+        self._bulk(CarrinhoItem, [
+            CarrinhoItem(carrinho=carrinho, produto=produto, quantidade=qtd)
+            for carrinho in carrinhos
+            for produto, qtd in self._escolher_itens(produtos[carrinho.loja_id], 4)
+        ])
+
+    def _criar_pedidos(self, clientes, lojas, produtos, quantidade, max_itens):
+        agora = timezone.now()
+        pesos = self._pesos_lojas(lojas)
+        enderecos = dict(Endereco.objects.filter(user__in=clientes).values_list("user_id", "id"))
+        pagamentos = dict(Pagamento.objects.filter(user__in=clientes).values_list("user_id", "id"))
+        status, status_pesos = zip(*STATUS_PESOS)
+        versoes = dict(SequenciaPedidos.objects.values_list("loja_id", "valor"))
+
+        for inicio in range(0, quantidade, self.lote):
+            pedidos = []
+            itens_por_pedido = []
+            for _ in range(min(self.lote, quantidade - inicio)):
+                cliente = self.rng.choice(clientes)
+                loja = self.rng.choices(lojas, pesos)[0]
+                itens = self._escolher_itens(produtos[loja.id], max_itens)
+                # Pedidos concentrados nos últimos meses.
+                criado_em = agora - timedelta(days=min(self.rng.expovariate(1 / 90), 730), minutes=self.rng.randint(0, 1440))
+                situacao = self.rng.choices(status, status_pesos)[0]
+                if criado_em < agora - timedelta(days=2) and situacao not in (Pedido.ENTREGUE, Pedido.CANCELADO):
+                    situacao = Pedido.ENTREGUE
+                versoes[loja.id] = versoes.get(loja.id, 0) + 1
+
+                pedidos.append(Pedido(
+                    user=cliente,
+                    loja=loja,
+                    status=situacao,
+                    total=sum(p.preco * q for p, q in itens),
+                    metodo_pagamento_id=pagamentos[cliente.id],
+                    endereco_id=enderecos[cliente.id],
+                    criado_em=criado_em,
+                    atualizado_em=criado_em + timedelta(minutes=self.rng.randint(0, 90)),
+                    versao=versoes[loja.id],
+                ))
+                itens_por_pedido.append(itens)
+
+            with sem_auto_now(Pedido, "criado_em", "atualizado_em"):
+                Pedido.objects.bulk_create(pedidos)
+
+            if pedidos and pedidos[0].pk is None:
+                # Bancos sem RETURNING: recupera os IDs recém-criados pela ordem de inserção.
+                ids = list(Pedido.objects.order_by("-id").values_list("id", flat=True)[:len(pedidos)])[::-1]
+                for pedido, pk in zip(pedidos, ids):
+                    pedido.pk = pedido.id = pk
+
+            self._bulk(PedidoItem, [
+                PedidoItem(
+                    pedido=pedido, produto=produto, produto_nome=produto.nome,
+                    preco=produto.preco, quantidade=qtd,
+                )
+                for pedido, itens in zip(pedidos, itens_por_pedido)
+                for produto, qtd in itens
+            ])
+
+        SequenciaPedidos.objects.bulk_create(
+            [SequenciaPedidos(loja_id=loja_id, valor=valor) for loja_id, valor in versoes.items()],
+            update_conflicts=True, unique_fields=["loja"], update_fields=["valor"],
+        )
@@ -0,0 +1,300 @@
+"""
+Métricas da API no formato de exposição de texto do Prometheus.
+
+Cada processo acumula contadores e histogramas em memória. Com
+`METRICAS_DIR` configurado, o processo grava periodicamente um snapshot em
+`METRICAS_DIR/metricas-<pid>.json` e o endpoint `/metrics` soma os snapshots
+de todos os workers, de modo que qualquer worker responde pelo conjunto.
+Na coleta, os snapshots de workers que já saíram são somados em
+`METRICAS_DIR/encerrados.json`, para que os contadores nunca diminuam.
+
+O endpoint exige `METRICAS_TOKEN` ou um usuário staff.
+"""
+import atexit
+import fcntl
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BUCKETS_QUERIES = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+ARQUIVO_ENCERRADOS = "encerrados.json"
+
+DESCRICOES = {
+    "http_requests_total": ("counter", "Total de requisições HTTP atendidas."),
+    "http_request_duration_seconds": ("histogram", "Latência das requisições HTTP em segundos."),
+    "http_response_size_bytes": ("histogram", "Tamanho do corpo das respostas HTTP em bytes, como enviado (após compressão)."),
+    "db_queries_per_request": ("histogram", "Número de queries SQL por requisição."),
+    "db_queries_total": ("counter", "Total de queries SQL executadas."),
+    "db_query_duration_seconds_total": ("counter", "Tempo total gasto em queries SQL, em segundos."),
+    "http_response_compression_seconds_total": ("counter", "Tempo de CPU gasto comprimindo respostas, em segundos."),
+    "http_response_compression_saved_bytes_total": ("counter", "Bytes economizados pela compressão das respostas."),
+}
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = defaultdict(float)
+        self.histogramas = {}
+        self._ultima_gravacao = 0.0
+
+    def incrementar(self, nome, labels, valor=1):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self.contadores[chave] += valor
+
+    def observar(self, nome, labels, valor, buckets):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            histograma = self.histogramas.get(chave)
+            if histograma is None:
+                histograma = self.histogramas[chave] = {
+                    "buckets": list(buckets),
+                    "contagens": [0] * len(buckets),
+                    "soma": 0.0,
+                    "total": 0,
+                }
+            for indice, limite in enumerate(buckets):
+                if valor <= limite:
+                    histograma["contagens"][indice] += 1
+                    break
+            histograma["soma"] += valor
+            histograma["total"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "contadores": [[nome, list(labels), valor] for (nome, labels), valor in self.contadores.items()],
+                "histogramas": [
+                    [nome, list(labels), dict(h, contagens=list(h["contagens"]))]
+                    for (nome, labels), h in self.histogramas.items()
+                ],
+            }
+
+    def talvez_gravar(self, forcar=False):
+        diretorio = getattr(settings, "METRICAS_DIR", None)
+        if not diretorio:
+            return
+
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_gravacao < getattr(settings, "METRICAS_INTERVALO_GRAVACAO", 5):
+            return
+        self._ultima_gravacao = agora
+
+        os.makedirs(diretorio, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+        with os.fdopen(fd, "w") as arquivo:
+            json.dump(self.snapshot(), arquivo)
+        os.replace(temporario, os.path.join(diretorio, f"metricas-{os.getpid()}.json"))
+
+
+registro = Registro()
+atexit.register(registro.talvez_gravar, forcar=True)
+
+
+def coletar():
+    """
+    Snapshot agregado: soma os arquivos de todos os workers ou, sem
+    `METRICAS_DIR`, devolve apenas o processo atual.
+    """
+    diretorio = getattr(settings, "METRICAS_DIR", None)
+    if not diretorio:
+        return [registro.snapshot()]
+
+    registro.talvez_gravar(forcar=True)
+    with _trava(diretorio):
+        encerrados = os.path.join(diretorio, ARQUIVO_ENCERRADOS)
+        caminhos = glob.glob(os.path.join(diretorio, "metricas-*.json"))
+        mortos = [caminho for caminho in caminhos if not _processo_vivo(caminho)]
+        if mortos:
+            _acumular(encerrados, mortos)
+
+        snapshots = []
+        for caminho in [encerrados, *(c for c in caminhos if c not in mortos)]:
+            try:
+                with open(caminho) as arquivo:
+                    snapshots.append(json.load(arquivo))
+            except (OSError, ValueError):
+                continue
+    return snapshots
+
+
+@contextmanager
+def _trava(diretorio):
+    # Dois workers coletando ao mesmo tempo não podem somar o mesmo morto.
+    with open(os.path.join(diretorio, ".trava"), "a") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _acumular(encerrados, mortos):
+    """
+    Soma os snapshots de workers que já saíram (reinício, reciclagem por
+    max_requests) ao acumulado dos encerrados e apaga os arquivos deles.
+    """
+    snapshots = []
+    for caminho in [encerrados, *mortos]:
+        try:
+            with open(caminho) as arquivo:
+                snapshots.append(json.load(arquivo))
+        except (OSError, ValueError):
+            continue
+
+    contadores, histogramas = _mesclar(snapshots)
+    acumulado = {
+        "contadores": [[nome, [list(par) for par in labels], valor] for (nome, labels), valor in contadores.items()],
+        "histogramas": [[nome, [list(par) for par in labels], h] for (nome, labels), h in histogramas.items()],
+    }
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(encerrados), suffix=".tmp")
+    with os.fdopen(fd, "w") as arquivo:
+        json.dump(acumulado, arquivo)
+    os.replace(temporario, encerrados)
+
+    for caminho in mortos:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def _processo_vivo(caminho):
+    nome = os.path.basename(caminho)
+    try:
+        pid = int(nome[len("metricas-"):-len(".json")])
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Sem permissão para sinalizar: o processo existe.
+        return True
+    return True
+
+
+def _mesclar(snapshots):
+    contadores = defaultdict(float)
+    histogramas = {}
+
+    for snapshot in snapshots:
+        for nome, labels, valor in snapshot["contadores"]:
+            contadores[(nome, tuple(map(tuple, labels)))] += valor
+        for nome, labels, h in snapshot["histogramas"]:
+            chave = (nome, tuple(map(tuple, labels)))
+            atual = histogramas.get(chave)
+            if atual is None:
+                histogramas[chave] = dict(h, contagens=list(h["contagens"]))
+                continue
+            atual["contagens"] = [a + b for a, b in zip(atual["contagens"], h["contagens"])]
+            atual["soma"] += h["soma"]
+            atual["total"] += h["total"]
+
+    return contadores, histogramas
+
+
+def _formatar_labels(labels, extra=()):
+    pares = list(labels) + list(extra)
+    if not pares:
+        return ""
+    conteudo = ",".join(
+        '{}="{}"'.format(nome, str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for nome, valor in pares
+    )
+    return "{" + conteudo + "}"
+
+
+def _formatar_numero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor)
+
+
+def exportar(snapshots):
+    contadores, histogramas = _mesclar(snapshots)
+    linhas_por_metrica = defaultdict(list)
+
+    for (nome, labels), valor in sorted(contadores.items()):
+        linhas_por_metrica[nome].append(f"{nome}{_formatar_labels(labels)} {_formatar_numero(valor)}")
+
+    for (nome, labels), h in sorted(histogramas.items()):
+        acumulado = 0
+        for limite, contagem in zip(h["buckets"], h["contagens"]):
+            acumulado += contagem
+            le = _formatar_numero(float(limite))
+            linhas_por_metrica[nome].append(
+                f"{nome}_bucket{_formatar_labels(labels, [('le', le)])} {acumulado}"
+            )
+        linhas_por_metrica[nome].append(f"{nome}_bucket{_formatar_labels(labels, [('le', '+Inf')])} {h['total']}")
+        linhas_por_metrica[nome].append(f"{nome}_sum{_formatar_labels(labels)} {_formatar_numero(h['soma'])}")
+        linhas_por_metrica[nome].append(f"{nome}_count{_formatar_labels(labels)} {h['total']}")
+
+    saida = []
+    for nome in sorted(linhas_por_metrica):
+        tipo, descricao = DESCRICOES.get(nome, ("untyped", nome))
+        saida.append(f"# HELP {nome} {descricao}")
+        saida.append(f"# TYPE {nome} {tipo}")
+        saida.extend(linhas_por_metrica[nome])
+    return "\n".join(saida) + "\n"
+
+
+def identificar_rota(request):
+    """
+    Rótulos `view` e `action` da requisição: nome do ViewSet/APIView e a action
+    do DRF (ou o método HTTP, para APIViews).
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "nao_encontrada", ""
+
+    func = match.func
+    classe = getattr(func, "cls", None) or getattr(func, "view_class", None)
+    if classe is None:
+        return match.view_name or match._func_path, ""
+
+    acoes = getattr(func, "actions", None)
+    if acoes:
+        return classe.__name__, acoes.get(request.method.lower(), "")
+    return classe.__name__, request.method.lower()
+
+
+def _autorizado(request):
+    """
+    `Authorization: Bearer <METRICAS_TOKEN>` ou um usuário staff (sessão do
+    admin ou JWT). Sem token configurado, só staff.
+    """
+    token = getattr(settings, "METRICAS_TOKEN", None)
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+
+    from .permissions import usuario_staff
+
+    return usuario_staff(request) is not None
+
+
+def metricas_view(request):
+    if not _autorizado(request):
+        return HttpResponse(status=403)
+
+    return HttpResponse(
+        exportar(coletar()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
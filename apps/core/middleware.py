@@ -1,3 +1,23 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from .compressao import comprimir, comprimivel, negociar
+from .metricas import (
+    registro, identificar_rota, BUCKETS_LATENCIA, BUCKETS_TAMANHO, BUCKETS_QUERIES,
+)
+
+
 class JWTHeaderMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -15,4 +35,235 @@ class JWTHeaderMiddleware:
             if token and "HTTP_AUTHORIZATION" not in request.META:
                 request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
         
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
+
+
+class LimiteConcorrenciaMiddleware:
+    """
+    Descarta carga quando o processo já atende `CONCORRENCIA_MAXIMA`
+    requisições ao mesmo tempo: responde 503 com `Retry-After` na hora,
+    em vez de enfileirar até estourar o tempo limite do cliente.
+
+    Long-polls (`CONCORRENCIA_LONG_POLL`) ficam parados até 10 s cada e
+    têm um limite próprio (`CONCORRENCIA_MAXIMA_LONG_POLL`), para que telas
+    de cozinha abertas não esgotem as vagas do resto do tráfego. O SSE
+    roda no ASGI antes do Django e não passa por aqui.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        maximo = getattr(settings, "CONCORRENCIA_MAXIMA", None)
+        self.vagas = threading.BoundedSemaphore(maximo) if maximo else None
+        maximo_long_poll = getattr(settings, "CONCORRENCIA_MAXIMA_LONG_POLL", None)
+        self.vagas_long_poll = threading.BoundedSemaphore(maximo_long_poll) if maximo_long_poll else None
+        self.long_poll = tuple(getattr(settings, "CONCORRENCIA_LONG_POLL", ()))
+        self.retry_after = getattr(settings, "CONCORRENCIA_RETRY_AFTER", 1)
+
+    def __call__(self, request):
+        vagas = self.vagas_long_poll if request.path.startswith(self.long_poll) else self.vagas
+        if vagas is None:
+            return self.get_response(request)
+
+        if not vagas.acquire(blocking=False):
+            response = JsonResponse(
+                {"detail": "Servidor sobrecarregado. Tente novamente em instantes."},
+                status=503,
+            )
+            response["Retry-After"] = str(self.retry_after)
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            vagas.release()
+
+
+class CompressaoMiddleware:
+    """
+    Comprime as respostas da API com brotli ou gzip, conforme o
+    Accept-Encoding do cliente. Respostas menores que `COMPRESSAO_MINIMO`
+    bytes, em streaming, já codificadas (estáticos do Whitenoise, schema
+    OpenAPI) ou de tipos não textuais passam sem alteração, assim como HTML
+    e respostas que definem cookies (BREACH, ver `compressao`).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.minimo = getattr(settings, "COMPRESSAO_MINIMO", 1024)
+        self.max_bytes_aleatorios = getattr(settings, "COMPRESSAO_MAX_BYTES_ALEATORIOS", 100)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or response.status_code in (204, 304)
+            or len(response.content) < self.minimo
+            or not comprimivel(response)
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        codificacao = negociar(request.headers.get("Accept-Encoding"))
+        if codificacao is None:
+            return response
+
+        inicio = time.process_time()
+        comprimido = comprimir(response.content, codificacao, max_bytes_aleatorios=self.max_bytes_aleatorios)
+        registro.incrementar(
+            "http_response_compression_seconds_total", {"encoding": codificacao}, time.process_time() - inicio
+        )
+        if len(comprimido) >= len(response.content):
+            return response
+
+        registro.incrementar(
+            "http_response_compression_saved_bytes_total", {"encoding": codificacao},
+            len(response.content) - len(comprimido),
+        )
+        response.content = comprimido
+        response["Content-Length"] = str(len(comprimido))
+        response["Content-Encoding"] = codificacao
+
+        # O corpo mudou: um ETag forte não vale mais byte a byte.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+
+class MetricasMiddleware:
+    """
+    Registra latência, status, tamanho da resposta e queries SQL de cada
+    requisição, rotulados pelo ViewSet/APIView e action do DRF.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = {"total": 0, "duracao": 0.0}
+
+        def medir_query(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries["total"] += 1
+                queries["duracao"] += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medir_query))
+            response = self.get_response(request)
+        duracao = time.perf_counter() - inicio
+
+        view, acao = identificar_rota(request)
+        rota = {"view": view, "action": acao}
+
+        registro.incrementar(
+            "http_requests_total",
+            dict(rota, method=request.method, status=str(response.status_code)),
+        )
+        registro.observar("http_request_duration_seconds", dict(rota, method=request.method), duracao, BUCKETS_LATENCIA)
+        if not response.streaming:
+            registro.observar("http_response_size_bytes", rota, len(response.content), BUCKETS_TAMANHO)
+        registro.observar("db_queries_per_request", rota, queries["total"], BUCKETS_QUERIES)
+        registro.incrementar("db_queries_total", rota, queries["total"])
+        registro.incrementar("db_query_duration_seconds_total", rota, queries["duracao"])
+        registro.talvez_gravar()
+
+        return response
+
+
+class PerfilamentoMiddleware:
+    """
+    Captura o perfil de chamadas (cProfile) e as queries SQL de requisições
+    selecionadas: as enviadas por usuários staff com o cabeçalho `X-Profile: 1`
+    e uma amostra aleatória de `PROFILING_AMOSTRAGEM` das demais. Os perfis
+    ficam no admin (PerfilRequisicao), limitados a `PROFILING_MAX_REGISTROS`.
+    """
+
+    perfilando = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        usuario = self._usuario_solicitante(request)
+        amostragem = getattr(settings, "PROFILING_AMOSTRAGEM", 0)
+        if usuario is None and not (amostragem and random.random() < amostragem):
+            return self.get_response(request)
+
+        queries = []
+
+        def registrar_query(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({"sql": sql[:2000], "ms": round((time.perf_counter() - inicio) * 1000, 3)})
+
+        # Um perfil por vez no processo: a partir do Python 3.12 só um
+        # profiler pode estar ativo. Com outro em curso (de outra requisição,
+        # de um debugger ou do coverage), a requisição segue sem perfil.
+        if not self.perfilando.acquire(blocking=False):
+            return self.get_response(request)
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            self.perfilando.release()
+            return self.get_response(request)
+
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(registrar_query))
+                response = self.get_response(request)
+        finally:
+            perfil.disable()
+            self.perfilando.release()
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        self._salvar(request, response, usuario, perfil, queries, duracao_ms)
+        return response
+
+    def _usuario_solicitante(self, request):
+        if request.headers.get("X-Profile") != "1":
+            return None
+
+        from .permissions import usuario_staff
+
+        return usuario_staff(request)
+
+    def _salvar(self, request, response, usuario, perfil, queries, duracao_ms):
+        from .models import PerfilRequisicao
+
+        relatorio = io.StringIO()
+        pstats.Stats(perfil, stream=relatorio).sort_stats("cumulative").print_stats(60)
+        perfil.create_stats()
+
+        view, acao = identificar_rota(request)
+        PerfilRequisicao.objects.create(
+            user=usuario,
+            metodo=request.method,
+            caminho=request.get_full_path()[:500],
+            view=f"{view}.{acao}" if acao else view,
+            status=response.status_code,
+            duracao_ms=duracao_ms,
+            total_queries=len(queries),
+            tempo_sql_ms=sum(q["ms"] for q in queries),
+            relatorio=relatorio.getvalue(),
+            queries=queries,
+            pstats=marshal.dumps(perfil.stats),
+        )
+
+        limite = getattr(settings, "PROFILING_MAX_REGISTROS", 200)
+        antigos = list(
+            PerfilRequisicao.objects.order_by("-criado_em", "-id").values_list("id", flat=True)[limite:]
+        )
+        if antigos:
+            PerfilRequisicao.objects.filter(id__in=antigos).delete()
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.26 on 2026-10-19 14:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequisicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('metodo', models.CharField(max_length=10)),
+                ('caminho', models.CharField(max_length=500)),
+                ('view', models.CharField(blank=True, max_length=255)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('duracao_ms', models.FloatField()),
+                ('total_queries', models.PositiveIntegerField(default=0)),
+                ('tempo_sql_ms', models.FloatField(default=0)),
+                ('relatorio', models.TextField(help_text='Funções ordenadas por tempo acumulado')),
+                ('queries', models.JSONField(default=list, help_text='SQL executado, com duração em ms')),
+                ('pstats', models.BinaryField(help_text='Dump do cProfile, legível com pstats.Stats')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'perfil de requisição',
+                'verbose_name_plural': 'perfis de requisição',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_perfilrequisicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoordenadaCep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefixo', models.CharField(max_length=8, unique=True)),
+                ('cidade', models.CharField(blank=True, max_length=100)),
+                ('estado', models.CharField(blank=True, max_length=2)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'coordenada de CEP',
+                'verbose_name_plural': 'coordenadas de CEP',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_coordenadacep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardapioPublicado',
+            fields=[
+                ('loja', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cardapio_publicado', serialize=False, to='core.lojaperfil')),
+                ('versao', models.PositiveIntegerField(default=1)),
+                ('versao_publicada', models.PositiveIntegerField(default=0)),
+                ('aberta', models.BooleanField(default=True)),
+                ('conteudo', models.TextField(blank=True)),
+                ('publicado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'cardápio publicado',
+                'verbose_name_plural': 'cardápios publicados',
+            },
+        ),
+    ]
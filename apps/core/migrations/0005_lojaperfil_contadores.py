@@ -0,0 +1,60 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:19
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_contadores(apps, schema_editor):
+    LojaPerfil = apps.get_model("core", "LojaPerfil")
+    Produto = apps.get_model("core", "Produto")
+    ativos = Produto.objects.filter(loja=OuterRef("pk"), active=True, disponivel=True).order_by()
+
+    def agregado(queryset, expressao):
+        return Subquery(queryset.values("loja").annotate(valor=expressao).values("valor")[:1])
+
+    LojaPerfil.objects.update(
+        produtos_ativos=Coalesce(agregado(ativos, Count("id")), Value(0)),
+        produtos_em_estoque=Coalesce(agregado(ativos.filter(quantidade__gt=0), Count("id")), Value(0)),
+        preco_minimo=agregado(ativos, Min("preco")),
+        preco_maximo=agregado(ativos, Max("preco")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_cardapiopublicado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lojaperfil',
+            name='preco_maximo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='lojaperfil',
+            name='preco_minimo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='lojaperfil',
+            name='produtos_ativos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lojaperfil',
+            name='produtos_em_estoque',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='lojaperfil',
+            index=models.Index(fields=['aberta', 'preco_minimo'], name='loja_aberta_preco_min_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lojaperfil',
+            index=models.Index(fields=['aberta', 'produtos_ativos'], name='loja_aberta_ativos_idx'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_lojaperfil_contadores'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['active', 'disponivel', 'preco'], name='produto_vitrine_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['active', 'disponivel', 'criada_em'], name='produto_vitrine_criada_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_produto_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='esgotado',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
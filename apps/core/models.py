@@ -1,4 +1,25 @@
 from django.db import models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+class LojaPerfilQuerySet(models.QuerySet):
+    def atualizar_contadores(self):
+        """
+        Recalcula, em um único UPDATE, os contadores de produtos das lojas do
+        queryset. Chamado na mesma transação das escritas em Produto.
+        """
+        ativos = Produto.objects.filter(loja=OuterRef("pk"), active=True, disponivel=True).order_by()
+
+        def agregado(queryset, expressao):
+            return Subquery(queryset.values("loja").annotate(valor=expressao).values("valor")[:1])
+
+        return self.update(
+            produtos_ativos=Coalesce(agregado(ativos, Count("id")), Value(0)),
+            produtos_em_estoque=Coalesce(agregado(ativos.filter(quantidade__gt=0), Count("id")), Value(0)),
+            preco_minimo=agregado(ativos, Min("preco")),
+            preco_maximo=agregado(ativos, Max("preco")),
+        )
 
 
 class LojaPerfil(models.Model):
@@ -7,6 +28,20 @@ class LojaPerfil(models.Model):
     endereco = models.ForeignKey("users.Endereco", on_delete=models.CASCADE, null=True, blank=True, related_name="lojas")
     aberta = models.BooleanField(default=True)
 
+    # Contadores dos produtos ativos e disponíveis, mantidos por atualizar_contadores().
+    produtos_ativos = models.PositiveIntegerField(default=0)
+    produtos_em_estoque = models.PositiveIntegerField(default=0)
+    preco_minimo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    preco_maximo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    objects = LojaPerfilQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["aberta", "preco_minimo"], name="loja_aberta_preco_min_idx"),
+            models.Index(fields=["aberta", "produtos_ativos"], name="loja_aberta_ativos_idx"),
+        ]
+
     def __str__(self):
         return self.nome
 
@@ -18,10 +53,18 @@ class Produto(models.Model):
     preco = models.DecimalField(max_digits=10, decimal_places=2)
     quantidade = models.PositiveIntegerField(default=0)  
     disponivel = models.BooleanField(default=True)
+    # Desligado pelo checkout quando o estoque zerou; só nesse caso a devolução de estoque o religa.
+    esgotado = models.BooleanField(default=False, editable=False)
     active = models.BooleanField(default=True)
     criada_em = models.DateTimeField(auto_now_add=True)
     atualizada_em = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["active", "disponivel", "preco"], name="produto_vitrine_preco_idx"),
+            models.Index(fields=["active", "disponivel", "criada_em"], name="produto_vitrine_criada_idx"),
+        ]
+
     def __str__(self):
         return f"{self.nome} — {self.loja.nome}"
 
@@ -33,3 +76,74 @@ class Cardapio(models.Model):
     def __str__(self):
         return f"Cardápio de {self.loja.nome}"
 
+
+class CardapioPublicado(models.Model):
+    """
+    JSON pronto da página pública de uma loja (o mesmo que o LojaSerializer
+    produziria), servido direto pelo detalhe da loja. `versao` sobe a cada
+    alteração que afeta a loja; o conteúdo está em dia quando
+    `versao_publicada` a alcança. Mantido por `apps.core.vitrine`.
+    """
+
+    loja = models.OneToOneField(LojaPerfil, on_delete=models.CASCADE, primary_key=True, related_name="cardapio_publicado")
+    versao = models.PositiveIntegerField(default=1)
+    versao_publicada = models.PositiveIntegerField(default=0)
+    aberta = models.BooleanField(default=True)
+    conteudo = models.TextField(blank=True)
+    publicado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "cardápio publicado"
+        verbose_name_plural = "cardápios publicados"
+
+    def __str__(self):
+        return f"Cardápio publicado de {self.loja_id} (v{self.versao_publicada})"
+
+
+class PerfilRequisicao(models.Model):
+    """
+    Perfil (cProfile + queries SQL) de uma requisição, capturado pelo
+    PerfilamentoMiddleware.
+    """
+
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey("users.User", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    metodo = models.CharField(max_length=10)
+    caminho = models.CharField(max_length=500)
+    view = models.CharField(max_length=255, blank=True)
+    status = models.PositiveSmallIntegerField()
+    duracao_ms = models.FloatField()
+    total_queries = models.PositiveIntegerField(default=0)
+    tempo_sql_ms = models.FloatField(default=0)
+    relatorio = models.TextField(help_text="Funções ordenadas por tempo acumulado")
+    queries = models.JSONField(default=list, help_text="SQL executado, com duração em ms")
+    pstats = models.BinaryField(help_text="Dump do cProfile, legível com pstats.Stats")
+
+    class Meta:
+        ordering = ["-criado_em"]
+        verbose_name = "perfil de requisição"
+        verbose_name_plural = "perfis de requisição"
+
+    def __str__(self):
+        return f"{self.metodo} {self.caminho} ({self.duracao_ms:.0f} ms)"
+
+
+class CoordenadaCep(models.Model):
+    """
+    Coordenada aproximada (centro da região) para os CEPs que começam com
+    `prefixo`. A consulta usa o prefixo mais longo cadastrado; carregada com
+    `manage.py carregar_ceps`.
+    """
+
+    prefixo = models.CharField(max_length=8, unique=True)
+    cidade = models.CharField(max_length=100, blank=True)
+    estado = models.CharField(max_length=2, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        verbose_name = "coordenada de CEP"
+        verbose_name_plural = "coordenadas de CEP"
+
+    def __str__(self):
+        return f"{self.prefixo} ({self.cidade}/{self.estado})"
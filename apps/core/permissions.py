@@ -11,3 +11,26 @@ class ELojaOuSomenteLeitura(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.loja == request.user
+
+
+def usuario_staff(request):
+    """
+    Usuário staff da requisição, pela sessão do admin ou pelo JWT, ou None.
+
+    Para código fora das views do DRF (middlewares, views Django puras), em
+    que `request.user` só conhece a sessão.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return user
+
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    try:
+        autenticado = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if autenticado and autenticado[0].is_staff:
+        return autenticado[0]
+    return None
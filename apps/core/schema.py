@@ -0,0 +1,211 @@
+"""
+Schema OpenAPI servido como arquivo estático.
+
+O drf-yasg monta o schema introspectando todos os ViewSets e serializers, o
+que é caro demais para fazer a cada requisição. Aqui ele é gerado uma vez
+(`manage.py gerar_schema` no build, ou na primeira requisição do processo),
+gravado em `OPENAPI_DIR` já comprimido com gzip e servido com ETag. Junto
+dos arquivos fica a versão do código para a qual foram gerados
+(`OPENAPI_VERSAO` ou a revisão git); se ela mudar, o schema é regenerado.
+"""
+import gzip
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.utils.cache import patch_vary_headers
+
+
+FORMATOS = {
+    "json": "application/json; charset=utf-8",
+    "yaml": "application/yaml; charset=utf-8",
+}
+ARQUIVO_VERSAO = "versao.txt"
+
+_lock = threading.Lock()
+_artefatos = {}
+_views_ui = {}
+
+
+def informacoes():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="API TRAINEE",
+        default_version="v1",
+        description="API de entrega para evitar desperdício de alimentos",
+    )
+
+
+def versao_codigo():
+    """
+    Versão do código que o schema em disco precisa acompanhar: a setting
+    `OPENAPI_VERSAO` (ex.: a tag ou o SHA do deploy) ou, sem ela, a revisão
+    git do checkout. None quando nenhuma das duas está disponível.
+    """
+    versao = getattr(settings, "OPENAPI_VERSAO", None)
+    if versao:
+        return versao
+    try:
+        revisao = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return revisao or None
+
+
+def gerar_schema():
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from django.test import RequestFactory
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from rest_framework.request import Request
+
+    # As views esperam um request (leem request.auth); um GET anônimo basta.
+    # url="" deixa o schema sem host, válido atrás de qualquer domínio.
+    request = Request(RequestFactory().get("/swagger.json"))
+    schema = OpenAPISchemaGenerator(informacoes(), url="").get_schema(request=request, public=True)
+    return {
+        "json": OpenAPICodecJson(validators=[]).encode(schema),
+        "yaml": OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def _gravar(caminho, conteudo):
+    fd, temporario = tempfile.mkstemp(dir=caminho.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def gravar_schema(diretorio, conteudos, versao):
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    for formato, conteudo in conteudos.items():
+        _gravar(diretorio / f"openapi.{formato}", conteudo)
+        _gravar(diretorio / f"openapi.{formato}.gz", gzip.compress(conteudo, compresslevel=9, mtime=0))
+    # Gravada por último: só vale quando todos os arquivos estão no lugar.
+    _gravar(diretorio / ARQUIVO_VERSAO, versao.encode())
+
+
+def _ler_do_disco(diretorio, versao):
+    diretorio = Path(diretorio)
+    try:
+        if (diretorio / ARQUIVO_VERSAO).read_text() != versao:
+            return None
+        return {
+            formato: ((diretorio / f"openapi.{formato}").read_bytes(), (diretorio / f"openapi.{formato}.gz").read_bytes())
+            for formato in FORMATOS
+        }
+    except OSError:
+        return None
+
+
+def _carregar():
+    versao = versao_codigo()
+    # Sem versão não há como saber se o arquivo em disco é deste código.
+    diretorio = getattr(settings, "OPENAPI_DIR", None) if versao else None
+
+    arquivos = _ler_do_disco(diretorio, versao) if diretorio else None
+    if arquivos is None:
+        conteudos = gerar_schema()
+        if diretorio:
+            try:
+                gravar_schema(diretorio, conteudos, versao)
+            except OSError:
+                # Sistema de arquivos somente leitura: fica só em memória.
+                pass
+        arquivos = {
+            formato: (conteudo, gzip.compress(conteudo, compresslevel=9, mtime=0))
+            for formato, conteudo in conteudos.items()
+        }
+
+    for formato, (conteudo, comprimido) in arquivos.items():
+        etag = hashlib.sha256(conteudo).hexdigest()[:32]
+        _artefatos[formato] = {
+            "conteudo": conteudo,
+            "gzip": comprimido,
+            "etag": f'"{etag}"',
+            "etag_gzip": f'"{etag}-gz"',
+        }
+
+
+def obter_artefato(formato):
+    if not _artefatos:
+        with _lock:
+            if not _artefatos:
+                _carregar()
+    return _artefatos[formato]
+
+
+def _aceita_gzip(request):
+    codificacoes = request.headers.get("Accept-Encoding", "")
+    return any(c.split(";")[0].strip() == "gzip" for c in codificacoes.split(","))
+
+
+def schema_estatico_view(request, formato):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+
+    artefato = obter_artefato(formato)
+    comprimir = _aceita_gzip(request)
+    etag = artefato["etag_gzip"] if comprimir else artefato["etag"]
+
+    enviados = [e.strip().removeprefix("W/") for e in request.headers.get("If-None-Match", "").split(",")]
+    if etag in enviados or "*" in enviados:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(
+            artefato["gzip"] if comprimir else artefato["conteudo"],
+            content_type=FORMATOS[formato],
+        )
+        if comprimir:
+            response["Content-Encoding"] = "gzip"
+
+    response["ETag"] = etag
+    # Sempre revalida: o 304 é barato e garante schema novo logo após um deploy.
+    response["Cache-Control"] = "public, no-cache"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def schema_json_view(request):
+    return schema_estatico_view(request, "json")
+
+
+def schema_yaml_view(request):
+    return schema_estatico_view(request, "yaml")
+
+
+def _view_ui(renderer):
+    """
+    View do drf-yasg para a UI, criada só na primeira requisição: as páginas
+    só renderizam o HTML e buscam o schema em SPEC_URL.
+    """
+    if renderer not in _views_ui:
+        with _lock:
+            if renderer not in _views_ui:
+                from drf_yasg.views import get_schema_view
+                from rest_framework import permissions
+
+                schema_view = get_schema_view(
+                    informacoes(),
+                    public=True,
+                    permission_classes=[permissions.AllowAny],
+                )
+                _views_ui[renderer] = schema_view.with_ui(renderer, cache_timeout=0)
+    return _views_ui[renderer]
+
+
+def swagger_ui_view(request, *args, **kwargs):
+    return _view_ui("swagger")(request, *args, **kwargs)
+
+
+def redoc_view(request, *args, **kwargs):
+    return _view_ui("redoc")(request, *args, **kwargs)
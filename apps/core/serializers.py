@@ -48,6 +48,12 @@ class ProdutoSerializer(serializers.ModelSerializer):
         validated_data["loja"] = loja
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        if "disponivel" in validated_data:
+            # Escolha da loja: a devolução de estoque não a desfaz.
+            instance.esgotado = False
+        return super().update(instance, validated_data)
+
 class ProdutoLeituraSerializer(serializers.ModelSerializer):
     loja = serializers.StringRelatedField()
     loja_nome = serializers.CharField(source="loja.nome", read_only=True)
@@ -83,4 +89,21 @@ class LojaSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = LojaPerfil
-        fields = ["id", "nome", "endereco", "aberta", "produtos", "cardapio"]
+        fields = [
+            "id", "nome", "endereco", "aberta", "produtos_ativos", "produtos_em_estoque",
+            "preco_minimo", "preco_maximo", "produtos", "cardapio",
+        ]
+
+
+class LojaProximaSerializer(LojaSerializer):
+    distancia_km = serializers.FloatField(read_only=True)
+
+    class Meta(LojaSerializer.Meta):
+        fields = LojaSerializer.Meta.fields + ["distancia_km"]
+
+
+class LojasProximasFiltroSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    raio_km = serializers.FloatField(required=False, min_value=0.1, max_value=50, default=5)
+    k = serializers.IntegerField(required=False, min_value=1, max_value=50, default=10)
@@ -0,0 +1,55 @@
+"""
+Mantém os contadores de produtos das lojas e o cardápio publicado
+(`apps.core.vitrine`) em dia com as alterações feitas pelo ORM.
+Atualizações em massa (`QuerySet.update`, `bulk_create`) não disparam
+sinais e fazem o mesmo por conta própria.
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import vitrine
+from .models import Cardapio, LojaPerfil, Produto
+
+
+def _exclusao_da_loja(sender, origin):
+    """
+    Exclusão em cascata, vinda da loja (ou do dono): a linha do cardápio
+    publicado vai junto e não deve ser recriada.
+    """
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin is not None and modelo is not sender
+
+
+@receiver([post_save, post_delete], sender=Produto)
+def produto_alterado(sender, instance, origin=None, **kwargs):
+    if _exclusao_da_loja(sender, origin):
+        return
+    LojaPerfil.objects.filter(pk=instance.loja_id).atualizar_contadores()
+    vitrine.marcar([instance.loja_id])
+
+
+@receiver(post_save, sender=LojaPerfil)
+def loja_alterada(sender, instance, **kwargs):
+    vitrine.marcar([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Cardapio)
+def cardapio_alterado(sender, instance, origin=None, **kwargs):
+    if _exclusao_da_loja(sender, origin):
+        return
+    vitrine.marcar([instance.loja_id])
+
+
+@receiver(m2m_changed, sender=Cardapio.produtos.through)
+def cardapio_produtos_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            vitrine.marcar([instance.loja_id])
+        return
+
+    # Lado do produto (produto.cardapios.add/remove/clear): pk_set são cardápios.
+    if action == "pre_clear":
+        vitrine.marcar(instance.cardapios.values_list("loja_id", flat=True))
+    elif action in ("post_add", "post_remove") and pk_set:
+        vitrine.marcar(Cardapio.objects.filter(pk__in=pk_set).values_list("loja_id", flat=True))
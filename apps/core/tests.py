@@ -1,3 +1,516 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from apps.users.serializers import CustomTokenObtainPairSerializer
+
+from . import compressao, metricas, schema, vitrine
+from .middleware import CompressaoMiddleware, PerfilamentoMiddleware
+from .models import Cardapio, CardapioPublicado, LojaPerfil, PerfilRequisicao, Produto
+from .throttling import BaldeDeTokensThrottle
+
+
+class CoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dono = User.objects.create_user(username="loja1", email="loja1@teste.com", password="senha", loja=True)
+        self.loja = LojaPerfil.objects.create(user=self.dono, nome="Loja 1")
+        self.api = APIClient()
+
+    def autenticar(self, user):
+        api = APIClient()
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return api
+
+    def criar_produtos(self, quantidade, loja=None):
+        loja = loja or self.loja
+        for indice in range(quantidade):
+            Produto.objects.create(loja=loja, nome=f"Produto {indice}", preco="10.00", quantidade=3)
+
+    def consultas(self, url, api=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = (api or self.api).get(url)
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        return resposta, contexto.captured_queries
+
+
+@override_settings(THROTTLE_CAPACIDADE={"catalogo": 3})
+class BaldeDeTokensTests(CoreTestCase):
+    url = "/api/core/produtos/"
+
+    def setUp(self):
+        super().setUp()
+        self.relogio = mock.Mock(return_value=1000.0)
+        for alvo in (
+            mock.patch.object(BaldeDeTokensThrottle, "THROTTLE_RATES", {"catalogo": "6/min"}),
+            mock.patch.object(BaldeDeTokensThrottle, "timer", self.relogio),
+        ):
+            alvo.start()
+            self.addCleanup(alvo.stop)
+
+    def avancar(self, segundos):
+        self.relogio.return_value += segundos
+
+    def status(self, vezes=1, **extra):
+        return [self.api.get(self.url, **extra).status_code for _ in range(vezes)]
+
+    def test_rajada_ate_a_capacidade(self):
+        self.assertEqual(self.status(3), [200, 200, 200])
+
+        resposta = self.api.get(self.url)
+
+        self.assertEqual(resposta.status_code, 429)
+        self.assertEqual(resposta["Retry-After"], "10")
+
+    def test_reposicao_e_recusa_sem_consumo(self):
+        self.status(3)
+        self.avancar(5)
+        self.assertEqual(self.status(2), [429, 429])
+
+        self.avancar(5)
+        self.assertEqual(self.status(2), [200, 429])
+        self.avancar(20)
+        self.assertEqual(self.status(3), [200, 200, 429])
+
+    def test_nao_acumula_alem_da_capacidade(self):
+        self.status(1)
+        self.avancar(3600)
+
+        self.assertEqual(self.status(4), [200, 200, 200, 429])
+
+    def test_balde_por_cliente(self):
+        self.status(3)
+
+        self.assertEqual(self.status(1, REMOTE_ADDR="10.0.0.2"), [200])
+        self.assertEqual(self.autenticar(self.dono).get(self.url).status_code, 200)
+        self.assertEqual(self.status(1), [429])
+
+
+class MetricasTests(CoreTestCase):
+    @override_settings(METRICAS_TOKEN=None)
+    def test_fechado_sem_token(self):
+        self.assertEqual(self.api.get("/metrics").status_code, 403)
+        self.assertEqual(self.autenticar(self.dono).get("/metrics").status_code, 403)
+
+    @override_settings(METRICAS_TOKEN=None)
+    def test_staff(self):
+        staff = User.objects.create_user(username="staff", email="staff@teste.com", password="senha", is_staff=True)
+
+        resposta = self.autenticar(staff).get("/metrics")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("# TYPE http_requests_total counter", resposta.content.decode())
+
+    @override_settings(METRICAS_TOKEN="segredo")
+    def test_token(self):
+        self.assertEqual(self.api.get("/metrics", HTTP_AUTHORIZATION="Bearer segredo").status_code, 200)
+        self.assertEqual(self.api.get("/metrics", HTTP_AUTHORIZATION="Bearer outro").status_code, 403)
+
+
+class MetricasWorkersTests(SimpleTestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+
+    def gravar(self, pid, total):
+        snapshot = {
+            "contadores": [["http_requests_total", [["status", "200"]], total]],
+            "histogramas": [
+                ["db_queries_per_request", [], {"buckets": [1, 5], "contagens": [total, 0], "soma": total, "total": total}]
+            ],
+        }
+        with open(os.path.join(self.diretorio, f"metricas-{pid}.json"), "w") as arquivo:
+            json.dump(snapshot, arquivo)
+
+    def pid_encerrado(self):
+        processo = subprocess.Popen(["true"])
+        processo.wait()
+        return processo.pid
+
+    def total(self):
+        contadores, histogramas = metricas._mesclar(metricas.coletar())
+        return (
+            contadores[("http_requests_total", (("status", "200"),))],
+            histogramas[("db_queries_per_request", ())]["total"],
+        )
+
+    def test_totais_de_workers_encerrados_sao_mantidos(self):
+        with override_settings(METRICAS_DIR=self.diretorio), mock.patch.object(metricas, "registro", metricas.Registro()):
+            self.gravar(os.getppid(), 3)
+            self.gravar(self.pid_encerrado(), 5)
+            self.assertEqual(self.total(), (8, 8))
+
+            self.gravar(self.pid_encerrado(), 2)
+            self.assertEqual(self.total(), (10, 10))
+            self.assertEqual(self.total(), (10, 10))
+
+        self.assertCountEqual(
+            os.listdir(self.diretorio),
+            [".trava", "encerrados.json", f"metricas-{os.getpid()}.json", f"metricas-{os.getppid()}.json"],
+        )
+
+
+class PerfilamentoTests(CoreTestCase):
+    url = "/api/core/produtos/"
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username="staff", email="staff@teste.com", password="senha", is_staff=True)
+
+    def test_staff_com_cabecalho(self):
+        self.criar_produtos(1)
+
+        resposta = self.autenticar(self.staff).get(self.url, HTTP_X_PROFILE="1")
+
+        self.assertEqual(resposta.status_code, 200)
+        perfil = PerfilRequisicao.objects.get()
+        self.assertEqual(perfil.user, self.staff)
+        self.assertEqual(perfil.view, "ProdutoViewSet.list")
+        self.assertGreater(perfil.total_queries, 0)
+        self.assertIn("function calls", perfil.relatorio)
+
+    def test_apenas_staff_com_cabecalho(self):
+        self.autenticar(self.dono).get(self.url, HTTP_X_PROFILE="1")
+        self.api.get(self.url, HTTP_X_PROFILE="1")
+        self.autenticar(self.staff).get(self.url)
+
+        self.assertFalse(PerfilRequisicao.objects.exists())
+
+    def test_com_outro_perfil_em_curso_segue_sem_perfil(self):
+        with PerfilamentoMiddleware.perfilando:
+            resposta = self.autenticar(self.staff).get(self.url, HTTP_X_PROFILE="1")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(PerfilRequisicao.objects.exists())
+        self.assertFalse(PerfilamentoMiddleware.perfilando.locked())
+
+    @override_settings(PROFILING_AMOSTRAGEM=1.0, PROFILING_MAX_REGISTROS=2)
+    def test_amostragem_mantem_os_mais_recentes(self):
+        for _ in range(3):
+            self.api.get(self.url)
+
+        self.assertEqual(PerfilRequisicao.objects.count(), 2)
+
+
+class SchemaEmDiscoTests(SimpleTestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        self.addCleanup(schema._artefatos.clear)
+
+    def carregar(self, versao):
+        schema._artefatos.clear()
+        conteudos = {"json": b'{"versao": "%s"}' % versao.encode(), "yaml": b"versao: x"}
+        with override_settings(OPENAPI_DIR=self.diretorio, OPENAPI_VERSAO=versao), \
+                mock.patch.object(schema, "gerar_schema", return_value=conteudos) as gerar:
+            artefato = schema.obter_artefato("json")
+        return artefato["conteudo"], gerar.call_count
+
+    def test_reaproveita_o_schema_da_mesma_versao(self):
+        self.assertEqual(self.carregar("v1"), (b'{"versao": "v1"}', 1))
+        self.assertEqual(self.carregar("v1"), (b'{"versao": "v1"}', 0))
+        self.assertEqual(self.carregar("v2"), (b'{"versao": "v2"}', 1))
+
+    def test_sem_versao_nao_usa_o_disco(self):
+        with mock.patch.object(schema, "versao_codigo", return_value=None):
+            self.assertEqual(self.carregar("")[1], 1)
+            self.assertEqual(self.carregar("")[1], 1)
+
+        self.assertEqual(os.listdir(self.diretorio), [])
+
+
+class CamposSelecionaveisTests(CoreTestCase):
+    def test_consultas_nao_crescem_com_os_produtos(self):
+        self.criar_produtos(2)
+        urls = ("/api/core/produtos/", "/api/core/produtos/?fields=id,nome", "/api/core/produtos/?fields=id,loja_nome")
+        poucos = {url: len(self.consultas(url)[1]) for url in urls}
+
+        outro = User.objects.create_user(username="loja2", email="loja2@teste.com", password="senha", loja=True)
+        self.criar_produtos(6, loja=LojaPerfil.objects.create(user=outro, nome="Loja 2"))
+
+        for url in urls:
+            resposta, consultas = self.consultas(url)
+            self.assertEqual(resposta.json()["count"], 8)
+            self.assertEqual(len(consultas), poucos[url], url)
+
+    def test_fields_limita_colunas_e_relacoes(self):
+        self.criar_produtos(2)
+
+        resposta, consultas = self.consultas("/api/core/produtos/?fields=id,nome")
+
+        self.assertEqual(set(resposta.json()["results"][0]), {"id", "nome"})
+        sql = consultas[-1]["sql"]
+        self.assertNotIn('"descricao"', sql)
+        self.assertNotIn("JOIN", sql)
+
+        resposta, consultas = self.consultas("/api/core/produtos/?fields=id,loja_nome")
+        self.assertEqual(resposta.json()["results"][0]["loja_nome"], "Loja 1")
+        self.assertIn("JOIN", consultas[-1]["sql"])
+
+    def test_exclude(self):
+        self.criar_produtos(1)
+
+        resposta = self.api.get("/api/core/produtos/?exclude=descricao,loja")
+
+        self.assertNotIn("descricao", resposta.json()["results"][0])
+        self.assertNotIn("loja", resposta.json()["results"][0])
+
+    def test_campo_desconhecido(self):
+        resposta = self.api.get("/api/core/produtos/?fields=id,senha")
+
+        self.assertEqual(resposta.status_code, 400)
+
+
+class CompressaoTests(SimpleTestCase):
+    corpo = {"itens": ["produto"] * 500}
+
+    def responder(self, response, accept_encoding="gzip"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressaoMiddleware(lambda request: response)(request)
+
+    def test_gzip_com_preenchimento_aleatorio(self):
+        tamanhos = set()
+        for _ in range(20):
+            response = self.responder(JsonResponse(self.corpo))
+
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+            self.assertEqual(json.loads(gzip.decompress(response.content)), self.corpo)
+            tamanhos.add(len(response.content))
+
+        self.assertGreater(len(tamanhos), 1)
+
+    def test_negociacao(self):
+        self.assertEqual(compressao.negociar("gzip;q=0.5, br", ("br", "gzip")), "br")
+        self.assertEqual(compressao.negociar("br;q=0.5, gzip", ("br", "gzip")), "gzip")
+        self.assertEqual(compressao.negociar("*", ("br", "gzip")), "br")
+        self.assertIsNone(compressao.negociar("gzip;q=0, identity", ("br", "gzip")))
+        self.assertIsNone(compressao.negociar(None))
+
+    def test_sem_accept_encoding(self):
+        response = self.responder(JsonResponse(self.corpo), accept_encoding="")
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_nao_comprime_pequenas_nem_nao_textuais(self):
+        pequena = self.responder(JsonResponse({"ok": True}))
+        binaria = self.responder(HttpResponse(b"x" * 5000, content_type="image/png"))
+
+        self.assertFalse(pequena.has_header("Content-Encoding"))
+        self.assertFalse(binaria.has_header("Content-Encoding"))
+
+    def test_breach_html_e_cookies_nao_sao_comprimidos(self):
+        html = self.responder(HttpResponse("<p>produto</p>" * 500))
+        com_cookie = JsonResponse(self.corpo)
+        com_cookie.set_cookie("access_token", "segredo")
+        com_cookie = self.responder(com_cookie)
+
+        self.assertFalse(html.has_header("Content-Encoding"))
+        self.assertFalse(com_cookie.has_header("Content-Encoding"))
+
+    def test_etag_forte_vira_fraco(self):
+        response = JsonResponse(self.corpo)
+        response["ETag"] = '"abc"'
+
+        self.assertEqual(self.responder(response)["ETag"], 'W/"abc"')
+
+
+class LojasProximasTests(CoreTestCase):
+    def cadastrar_loja(self, username, latitude, longitude):
+        resposta = self.api.post("/api/users/register/", {
+            "username": username,
+            "email": f"{username}@teste.com",
+            "password": "Senha-forte-123",
+            "nome": username,
+            "loja": True,
+            "endereco": {
+                "cep": "50000-000", "rua": "Rua A", "numero": "1", "bairro": "Centro",
+                "cidade": "Recife", "estado": "PE", "latitude": latitude, "longitude": longitude,
+            },
+        }, format="json")
+        self.assertEqual(resposta.status_code, 201, resposta.content)
+
+    def test_encontra_loja_cadastrada_pela_api(self):
+        self.cadastrar_loja("perto", -8.05, -34.90)
+        self.cadastrar_loja("longe", -8.30, -35.10)
+
+        resposta = self.api.get("/api/core/lojas/proximas/?latitude=-8.06&longitude=-34.90&raio_km=5")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([loja["nome"] for loja in resposta.json()], ["perto"])
+        self.assertAlmostEqual(resposta.json()[0]["distancia_km"], 1.112, places=2)
+
+
+class CardapioPublicadoTests(CoreTestCase):
+    def test_detalhe_acompanha_alteracoes(self):
+        cardapio = Cardapio.objects.create(loja=self.loja)
+        produto = Produto.objects.create(loja=self.loja, nome="Pastel", preco="10.00", quantidade=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            cardapio.produtos.add(produto)
+
+        resposta = self.api.get(f"/api/core/lojas/{self.loja.id}/")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([p["nome"] for p in resposta.json()["cardapio"]["produtos"]], ["Pastel"])
+        etag = resposta["ETag"]
+        self.assertEqual(self.api.get(f"/api/core/lojas/{self.loja.id}/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.nome = "Pastel de queijo"
+            produto.save()
+
+        resposta = self.api.get(f"/api/core/lojas/{self.loja.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["cardapio"]["produtos"][0]["nome"], "Pastel de queijo")
+
+
+class PublicacaoPorTransacaoTests(TransactionTestCase):
+    def criar_loja(self, nome):
+        dono = User.objects.create_user(username=nome, email=f"{nome}@teste.com", password="senha", loja=True)
+        return LojaPerfil.objects.create(user=dono, nome=nome)
+
+    def test_uma_publicacao_por_loja_e_transacao(self):
+        lojas = [self.criar_loja(nome) for nome in ("loja1", "loja2")]
+
+        with mock.patch.object(vitrine, "publicar") as publicar:
+            with transaction.atomic():
+                for loja in lojas:
+                    for indice in range(3):
+                        Produto.objects.create(loja=loja, nome=f"Produto {indice}", preco="10.00", quantidade=3)
+
+        self.assertEqual(sorted(c.args for c in publicar.call_args_list), [(lojas[0].id,), (lojas[1].id,)])
+        self.assertEqual(
+            sorted(CardapioPublicado.objects.values_list("loja_id", "versao")), [(lojas[0].id, 4), (lojas[1].id, 4)]
+        )
+
+    def test_rollback_descarta_a_publicacao(self):
+        loja = self.criar_loja("loja1")
+
+        with mock.patch.object(vitrine, "publicar") as publicar:
+            with self.assertRaises(ValueError), transaction.atomic():
+                Produto.objects.create(loja=loja, nome="Pastel", preco="10.00", quantidade=3)
+                raise ValueError
+            with transaction.atomic():
+                Cardapio.objects.create(loja=self.criar_loja("loja2"))
+
+        self.assertEqual([c.args for c in publicar.call_args_list], [(LojaPerfil.objects.get(nome="loja2").id,)])
+
+    def test_savepoint_desfeito_nao_perde_as_marcas_de_fora(self):
+        loja = self.criar_loja("loja1")
+
+        with mock.patch.object(vitrine, "publicar") as publicar:
+            with transaction.atomic():
+                with self.assertRaises(ValueError), transaction.atomic():
+                    Produto.objects.create(loja=loja, nome="Pastel", preco="10.00", quantidade=3)
+                    raise ValueError
+                Produto.objects.create(loja=loja, nome="Coxinha", preco="8.00", quantidade=3)
+
+        publicar.assert_called_once_with(loja.id)
+
+    def test_autocommit_reconstroi_na_leitura(self):
+        loja = self.criar_loja("loja1")
+        produto = Produto.objects.create(loja=loja, nome="Pastel", preco="10.00", quantidade=3)
+        Cardapio.objects.create(loja=loja).produtos.add(produto)
+
+        with mock.patch.object(vitrine, "_renderizar", wraps=vitrine._renderizar) as renderizar:
+            for quantidade in (2, 1, 0):
+                produto.quantidade = quantidade
+                produto.save()
+            self.assertEqual(renderizar.call_count, 0)
+
+            resposta = APIClient().get(f"/api/core/lojas/{loja.id}/")
+            APIClient().get(f"/api/core/lojas/{loja.id}/")
+
+        self.assertEqual(resposta.json()["cardapio"]["produtos"][0]["quantidade"], 0)
+        self.assertEqual(renderizar.call_count, 1)
+
+    def test_excluir_loja(self):
+        loja = self.criar_loja("loja1")
+        Cardapio.objects.create(loja=loja).produtos.add(
+            Produto.objects.create(loja=loja, nome="Pastel", preco="10.00", quantidade=3)
+        )
+        APIClient().get(f"/api/core/lojas/{loja.id}/")
+
+        loja.user.delete()
+
+        self.assertFalse(LojaPerfil.objects.exists())
+        self.assertFalse(CardapioPublicado.objects.exists())
+
+
+class ContadoresLojaTests(CoreTestCase):
+    def contadores(self):
+        self.loja.refresh_from_db()
+        return (
+            self.loja.produtos_ativos, self.loja.produtos_em_estoque,
+            self.loja.preco_minimo, self.loja.preco_maximo,
+        )
+
+    def test_acompanham_os_produtos(self):
+        self.assertEqual(self.contadores(), (0, 0, None, None))
+
+        barato = Produto.objects.create(loja=self.loja, nome="Pastel", preco="5.00", quantidade=0)
+        caro = Produto.objects.create(loja=self.loja, nome="Pizza", preco="40.00", quantidade=2)
+        Produto.objects.create(loja=self.loja, nome="Inativo", preco="1.00", quantidade=9, active=False)
+        self.assertEqual(self.contadores(), (2, 1, Decimal("5.00"), Decimal("40.00")))
+
+        barato.disponivel = False
+        barato.save()
+        self.assertEqual(self.contadores(), (1, 1, Decimal("40.00"), Decimal("40.00")))
+
+        caro.delete()
+        self.assertEqual(self.contadores(), (0, 0, None, None))
+
+    def test_atualizacao_em_massa(self):
+        self.criar_produtos(3)
+        Produto.objects.filter(loja=self.loja).update(quantidade=0)
+
+        LojaPerfil.objects.filter(pk=self.loja.pk).atualizar_contadores()
+
+        self.assertEqual(self.contadores(), (3, 0, Decimal("10.00"), Decimal("10.00")))
+
+    def test_filtros_das_lojas(self):
+        Produto.objects.create(loja=self.loja, nome="Pizza", preco="40.00", quantidade=2)
+        outro = User.objects.create_user(username="loja2", email="loja2@teste.com", password="senha", loja=True)
+        Produto.objects.create(
+            loja=LojaPerfil.objects.create(user=outro, nome="Loja 2"), nome="Pastel", preco="5.00", quantidade=2
+        )
+
+        Produto.objects.create(loja=self.loja, nome="Esgotado", preco="30.00", quantidade=0)
+
+        def nomes(filtro):
+            return sorted(loja["nome"] for loja in self.api.get(f"/api/core/lojas/?{filtro}").json()["results"])
+
+        self.assertEqual(nomes("preco_ate=10"), ["Loja 2"])
+        self.assertEqual(nomes("min_produtos=2"), ["Loja 1"])
+        self.assertEqual(nomes("com_estoque=true"), ["Loja 1", "Loja 2"])
+
+
+class NovidadesTests(CoreTestCase):
+    def test_valores_validos(self):
+        self.criar_produtos(1)
+
+        resposta = self.api.get("/api/core/produtos/?novidades=7")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["count"], 1)
+
+    def test_valores_invalidos(self):
+        for valor in ("0", "-1", "3651", "1.5", "abc", "999999999999"):
+            with self.subTest(valor=valor):
+                cache.clear()
+                self.assertEqual(self.api.get(f"/api/core/produtos/?novidades={valor}").status_code, 400)
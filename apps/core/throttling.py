@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class BaldeDeTokensThrottle(ScopedRateThrottle):
+    """
+    Token bucket por escopo (`throttle_scope` da view), identificando o
+    cliente pelo claim `user_id` do token ou, sem token, pelo IP.
+
+    A taxa do escopo em `DEFAULT_THROTTLE_RATES` é a reposição (um token a
+    cada `duração / N`) e `THROTTLE_CAPACIDADE` o tamanho do balde, isto é,
+    a rajada aceita com ele cheio (padrão: N).
+
+    O balde fica no cache compartilhado como um único inteiro: o instante,
+    em ms, em que estará cheio de novo. Consumir um token é um `incr`
+    atômico de um intervalo de reposição e os tokens disponíveis são
+    `capacidade - (cheio_em - agora) / intervalo`.
+    """
+
+    cache = default_cache
+
+    def get_cache_key(self, request, view):
+        claims = request.auth or {}
+        user_id = claims.get("user_id")
+        ident = f"user:{user_id}" if user_id else f"ip:{self.get_ident(request)}"
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        capacidade = getattr(settings, "THROTTLE_CAPACIDADE", {}).get(self.scope, self.num_requests)
+        intervalo = self.duration * 1000 // self.num_requests
+
+        chave = self.get_cache_key(request, view)
+        agora = int(self.timer() * 1000)
+
+        if self.cache.add(chave, agora + intervalo, timeout=self._validade(intervalo)):
+            return True
+        try:
+            cheio_em = self.cache.incr(chave, intervalo)
+        except ValueError:
+            # A chave expirou (balde cheio) entre o add e o incr.
+            self.cache.set(chave, agora + intervalo, timeout=self._validade(intervalo))
+            return True
+
+        if cheio_em - intervalo <= agora:
+            # O balde estava cheio: a reposição não acumula além da capacidade.
+            self.cache.set(chave, agora + intervalo, timeout=self._validade(intervalo))
+            return True
+
+        excesso = cheio_em - agora - capacidade * intervalo
+        if excesso <= 0:
+            self.cache.touch(chave, timeout=self._validade(cheio_em - agora))
+            return True
+
+        # Requisição recusada não consome token.
+        try:
+            self.cache.decr(chave, intervalo)
+        except ValueError:
+            pass
+        self.espera = excesso / 1000
+        return False
+
+    @staticmethod
+    def _validade(milissegundos):
+        # A chave só precisa existir até o balde encher de novo.
+        return milissegundos // 1000 + 1
+
+    def wait(self):
+        return self.espera
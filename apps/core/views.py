@@ -1,21 +1,40 @@
+import heapq
+
 from rest_framework import viewsets, permissions, filters, generics
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import HttpResponse
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from apps.users.models import Pagamento
 from apps.pedidos.serializers import PagamentoSerializer
 from apps.core.models import LojaPerfil, Produto
-from apps.core.serializers import LojaSerializer, ProdutoSerializer, ProdutoLeituraSerializer
+from apps.core.serializers import (
+    LojaSerializer, LojaProximaSerializer, LojasProximasFiltroSerializer, ProdutoSerializer, ProdutoLeituraSerializer,
+)
+from apps.core import geo, vitrine
 from apps.users.permissions import IsLoja
 from .pagination import DefaultPagination
+from .campos import CamposSelecionaveisMixin, Carga, PARAMETROS_CAMPOS
+from .filtros import LojaFilter, ProdutoFilter, facetas_produtos
 
-class ProdutoViewSet(viewsets.ModelViewSet):
+class ProdutoViewSet(CamposSelecionaveisMixin, viewsets.ModelViewSet):
     queryset = Produto.objects.filter(active=True, disponivel=True)
     serializer_class = ProdutoSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_class = ProdutoFilter
     pagination_class = DefaultPagination 
     search_fields = ["nome", "descricao", "loja__nome"]
     ordering_fields = ["criada_em", "nome", "preco"]
+    throttle_scope = "catalogo"
+    campos_carga = {
+        "loja": Carga("loja__nome", select_related=["loja"]),
+        "loja_nome": Carga("loja__nome", select_related=["loja"]),
+    }
 
     def get_permissions(self):
         claims = self.request.auth or {}
@@ -57,6 +76,7 @@ class ProdutoViewSet(viewsets.ModelViewSet):
             403: "Apenas lojas podem criar produtos."
         }
     )
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
@@ -65,7 +85,10 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         operation_description=(
             "Lista todos os produtos ativos e disponíveis. "
             "A busca pode ser feita por nome, descrição ou nome da loja. "
-            "A ordenação pode ser feita por data de criação, nome ou preço."
+            "A ordenação pode ser feita por data de criação, nome ou preço. "
+            "Filtros: `preco_min`, `preco_max`, `loja`, `em_estoque` e `novidades` (últimos N dias).\n\n"
+            "Com `facetas=true`, a resposta traz também o bloco `facetas`: quantos produtos do "
+            "resultado filtrado há em cada loja e em cada faixa de preço (`de` inclusive, `ate` exclusive)."
         ),
         manual_parameters=[
             openapi.Parameter(
@@ -78,12 +101,21 @@ class ProdutoViewSet(viewsets.ModelViewSet):
                 description="Ordenação por 'criada_em', 'nome' ou 'preco'",
                 type=openapi.TYPE_STRING
             ),
+            openapi.Parameter(
+                "facetas", openapi.IN_QUERY,
+                description="Inclui contagens por loja e faixa de preço",
+                type=openapi.TYPE_BOOLEAN
+            ),
+            *PARAMETROS_CAMPOS,
         ],
         tags=["Produtos"],
         responses={200: ProdutoLeituraSerializer(many=True)}
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get("facetas", "").lower() in ("1", "true"):
+            response.data["facetas"] = facetas_produtos(self.filter_queryset(self.get_queryset()))
+        return response
 
     @swagger_auto_schema(
         operation_summary="Recuperar produto",
@@ -98,6 +130,7 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         operation_description="Deleta permanentemente um produto da loja autenticada.",
         tags=["Produtos"]
     )
+    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
@@ -110,6 +143,7 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         tags=["Produtos"],
         request_body=ProdutoSerializer
     )
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
 
@@ -184,14 +218,22 @@ class PagamentoDetailView(generics.RetrieveUpdateDestroyAPIView):
         return super().destroy(request, *args, **kwargs)
 
 
-class LojaViewSet(viewsets.ReadOnlyModelViewSet):
+class LojaViewSet(CamposSelecionaveisMixin, viewsets.ReadOnlyModelViewSet):
     queryset = LojaPerfil.objects.filter(aberta=True)
     serializer_class = LojaSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_class = LojaFilter
     search_fields = ["nome", "endereco", "user__username"]
-    ordering_fields = ["nome"]
+    ordering_fields = ["nome", "preco_minimo", "produtos_ativos"]
     permission_classes = [permissions.AllowAny]
     pagination_class = DefaultPagination
+    campos_carga = {
+        # source="produto_set" não existe em LojaPerfil: o DRF omite o campo e não consulta nada.
+        "produtos": Carga(),
+        "cardapio": Carga(prefetch_related=[
+            Prefetch("cardapio__produtos", queryset=Produto.objects.select_related("loja")),
+        ]),
+    }
 
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
@@ -203,8 +245,10 @@ class LojaViewSet(viewsets.ReadOnlyModelViewSet):
         operation_description=(
             "Retorna a lista de todas as lojas que estão marcadas como abertas no sistema. "
             "É possível realizar busca por nome, endereço ou nome de usuário do dono da loja, "
-            "além de permitir ordenação por nome."
+            "além de permitir ordenação por nome, menor preço (`preco_minimo`) ou quantidade de "
+            "produtos (`produtos_ativos`) e filtros por `preco_ate`, `min_produtos` e `com_estoque`."
         ),
+        manual_parameters=PARAMETROS_CAMPOS,
         tags=["Lojas"]
     )
     def list(self, request, *args, **kwargs):
@@ -214,12 +258,86 @@ class LojaViewSet(viewsets.ReadOnlyModelViewSet):
         operation_summary="Detalhar loja por ID",
         operation_description=(
             "Retorna as informações completas de uma loja específica, desde que ela esteja aberta. "
-            "A busca é feita através do ID da loja."
+            "A busca é feita através do ID da loja.\n\n"
+            "A resposta vem do cardápio publicado (pré-calculado a cada alteração da loja), "
+            "com `ETag`: envie `If-None-Match` para receber 304 se nada mudou."
         ),
+        responses={200: LojaSerializer, 304: "Não modificado", 404: "Loja inexistente ou fechada"},
         tags=["Lojas"]
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        try:
+            loja_id = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise NotFound()
+        publicado = vitrine.obter(loja_id)
+        if publicado is None:
+            raise NotFound()
+
+        etag = f'"cardapio-{loja_id}-{publicado.versao_publicada}"'
+        enviados = [e.strip().removeprefix("W/") for e in request.headers.get("If-None-Match", "").split(",")]
+        if etag in enviados:
+            response = HttpResponse(status=304)
+        else:
+            # O JSON já está pronto: vai direto, sem passar pelo serializer nem pelo renderer.
+            response = HttpResponse(publicado.conteudo, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, no-cache"
+        return response
+
+    @swagger_auto_schema(
+        operation_summary="Lojas abertas próximas",
+        operation_description=(
+            "Retorna as `k` lojas abertas mais próximas do ponto informado, dentro de `raio_km`, "
+            "ordenadas pela distância (em km, campo `distancia_km`). "
+            "Lojas sem coordenadas no endereço não aparecem."
+        ),
+        query_serializer=LojasProximasFiltroSerializer,
+        responses={
+            200: LojaProximaSerializer(many=True),
+            400: "Parâmetros inválidos"
+        },
+        tags=["Lojas"]
+    )
+    @action(detail=False, methods=["get"], url_path="proximas")
+    def proximas(self, request):
+        filtro = LojasProximasFiltroSerializer(data=request.query_params)
+        filtro.is_valid(raise_exception=True)
+        latitude = filtro.validated_data["latitude"]
+        longitude = filtro.validated_data["longitude"]
+        raio_km = filtro.validated_data["raio_km"]
+        k = filtro.validated_data["k"]
+
+        # Poda em duas etapas no banco: células geohash (faixas no índice) e o
+        # retângulo do raio. Só as coordenadas dos candidatos são lidas.
+        caixa = geo.retangulo(latitude, longitude, raio_km)
+        celulas = Q()
+        for prefixo in geo.celulas(caixa):
+            celulas |= Q(endereco__geohash__range=geo.faixa(prefixo))
+        candidatos = (
+            self.get_queryset()
+            .filter(celulas)
+            .filter(
+                endereco__latitude__range=caixa[:2],
+                endereco__longitude__range=caixa[2:],
+            )
+            .values_list("id", "endereco__latitude", "endereco__longitude")
+        )
+
+        dentro = (
+            (geo.haversine_km(latitude, longitude, lat, lon), loja_id)
+            for loja_id, lat, lon in candidatos
+        )
+        mais_proximas = heapq.nsmallest(k, (par for par in dentro if par[0] <= raio_km))
+        distancias = {loja_id: distancia for distancia, loja_id in mais_proximas}
+
+        lojas = LojaPerfil.objects.filter(id__in=distancias).prefetch_related(
+            Prefetch("cardapio__produtos", queryset=Produto.objects.select_related("loja")),
+        )
+        lojas = sorted(lojas, key=lambda loja: distancias[loja.id])
+        for loja in lojas:
+            loja.distancia_km = round(distancias[loja.id], 3)
+        return Response(LojaProximaSerializer(lojas, many=True, context=self.get_serializer_context()).data)
 
 class CardapioViewSet(viewsets.ModelViewSet):
     serializer_class = ProdutoSerializer
@@ -271,6 +389,7 @@ class CardapioViewSet(viewsets.ModelViewSet):
         request_body=ProdutoSerializer,
         tags=["Cardápio"]
     )
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
@@ -282,6 +401,7 @@ class CardapioViewSet(viewsets.ModelViewSet):
         request_body=ProdutoSerializer,
         tags=["Cardápio"]
     )
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
 
@@ -303,5 +423,6 @@ class CardapioViewSet(viewsets.ModelViewSet):
         ),
         tags=["Cardápio"]
     )
+    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
\ No newline at end of file
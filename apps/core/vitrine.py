@@ -0,0 +1,144 @@
+"""
+Cardápio publicado: o JSON do detalhe de cada loja, pré-calculado.
+
+Alterações em produtos, no cardápio ou na própria loja chamam `marcar()`,
+que só incrementa `versao` (numa transação, junto com ela: se for desfeita,
+a marca também é). Depois do commit, `publicar()` reconstrói o JSON apenas
+das lojas marcadas, uma vez por loja e transação. Em autocommit nada é
+reconstruído na escrita: a próxima leitura reconstrói o que estiver
+atrasado, uma vez para todas as alterações feitas até ali. A publicação só
+grava se a versão lida for mais nova que a publicada, então alterações
+concorrentes nunca deixam um conteúdo velho marcado como atual.
+"""
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import CardapioPublicado, LojaPerfil, Produto
+from .serializers import LojaSerializer
+
+
+def marcar(loja_ids):
+    """
+    Marca como desatualizado o cardápio das lojas e, numa transação, agenda
+    a reconstrução para depois do commit.
+    """
+    loja_ids = {loja_id for loja_id in loja_ids if loja_id is not None}
+    if not loja_ids:
+        return
+
+    # Sem linha, o incremento não teria onde ficar: uma leitura concorrente
+    # poderia publicar o conteúdo anterior a esta transação como atual.
+    existentes = set(CardapioPublicado.objects.filter(loja_id__in=loja_ids).values_list("loja_id", flat=True))
+    faltantes = [
+        CardapioPublicado(loja_id=loja_id, versao=0)
+        for loja_id in LojaPerfil.objects.filter(pk__in=loja_ids - existentes).values_list("pk", flat=True)
+    ]
+    if faltantes:
+        CardapioPublicado.objects.bulk_create(faltantes, ignore_conflicts=True)
+    CardapioPublicado.objects.filter(loja_id__in=loja_ids).update(versao=F("versao") + 1)
+
+    lote = _lote()
+    if lote is not None:
+        lote.update(loja_ids)
+        # Registrado a cada marca: um savepoint desfeito descarta os callbacks
+        # dele, não os de fora. O primeiro a rodar publica o lote inteiro.
+        transaction.on_commit(lote)
+
+
+class _Lote(set):
+    """Lojas a publicar no commit de um bloco atômico."""
+
+    def __init__(self, bloco):
+        super().__init__()
+        self.bloco = bloco
+
+    def __call__(self):
+        if getattr(_estado, "lote", None) is self:
+            del _estado.lote
+        loja_ids = sorted(self)
+        self.clear()
+        for loja_id in loja_ids:
+            publicar(loja_id)
+
+
+_estado = threading.local()
+
+
+def _lote():
+    """
+    Lote do bloco atômico mais externo em curso nesta thread, ou None em
+    autocommit. O de um bloco já encerrado (desfeito, sem commit) é
+    descartado quando outro bloco começa a marcar.
+    """
+    conexao = transaction.get_connection()
+    if not conexao.in_atomic_block:
+        return None
+    bloco = conexao.atomic_blocks[0]
+    lote = getattr(_estado, "lote", None)
+    if lote is None or lote.bloco is not bloco:
+        lote = _estado.lote = _Lote(bloco)
+    return lote
+
+
+def _renderizar(loja_id):
+    loja = (
+        LojaPerfil.objects.filter(pk=loja_id)
+        .select_related("cardapio")
+        .prefetch_related(Prefetch("cardapio__produtos", queryset=Produto.objects.select_related("loja")))
+        .first()
+    )
+    if loja is None:
+        return None
+    return loja, JSONRenderer().render(LojaSerializer(loja).data).decode()
+
+
+def publicar(loja_id):
+    """
+    Reconstrói o cardápio da loja se ele estiver atrasado. Devolve o
+    CardapioPublicado em dia, ou None se a loja não existir mais.
+    """
+    publicado = CardapioPublicado.objects.filter(loja_id=loja_id).first()
+    if publicado is not None and publicado.versao_publicada >= publicado.versao:
+        return publicado
+
+    # A versão é lida antes do conteúdo: uma alteração no meio do caminho
+    # deixa a publicação para trás e força outra reconstrução.
+    versao = publicado.versao if publicado is not None else 1
+    renderizado = _renderizar(loja_id)
+    if renderizado is None:
+        return None
+    loja, conteudo = renderizado
+    campos = {
+        "versao_publicada": versao,
+        "aberta": loja.aberta,
+        "conteudo": conteudo,
+        "publicado_em": timezone.now(),
+    }
+
+    if publicado is None:
+        try:
+            with transaction.atomic():
+                return CardapioPublicado.objects.create(loja_id=loja_id, versao=versao, **campos)
+        except IntegrityError:
+            # Outro processo publicou primeiro; vale o que estiver no banco.
+            return CardapioPublicado.objects.filter(loja_id=loja_id).first()
+
+    CardapioPublicado.objects.filter(loja_id=loja_id, versao_publicada__lt=versao).update(**campos)
+    return CardapioPublicado.objects.filter(loja_id=loja_id).first()
+
+
+def obter(loja_id):
+    """
+    Cardápio publicado em dia da loja, reconstruído se necessário; None se
+    a loja não existir ou estiver fechada.
+    """
+    publicado = CardapioPublicado.objects.filter(loja_id=loja_id).first()
+    if publicado is None or publicado.versao_publicada < publicado.versao:
+        publicado = publicar(loja_id)
+    if publicado is None or not publicado.aberta:
+        return None
+    return publicado
@@ -0,0 +1,153 @@
+"""
+Arquivo de pedidos antigos.
+
+Pedidos encerrados (entregue ou cancelado) mais antigos que um corte saem de
+Pedido/PedidoItem para PedidoArquivado/PedidoItemArquivado, em lotes, cada
+lote em sua própria transação. Como pedidos encerrados não mudam mais de
+status, a cópia é definitiva e as tabelas quentes ficam só com o que ainda
+circula no dia a dia.
+
+As leituras que podem alcançar o arquivo:
+
+- históricos com intervalo de datas (`?desde=`/`?ate=`) juntam as duas
+  tabelas com `HistoricoComArquivo`;
+- o faturamento e o resumo do cliente somam as duas;
+- o detalhe de um pedido procura no arquivo o ID que não está na tabela quente.
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Pedido, PedidoArquivado, PedidoItem, PedidoItemArquivado
+
+
+STATUS_ENCERRADOS = (Pedido.ENTREGUE, Pedido.CANCELADO)
+
+
+def arquivar_lote(antes_de, lote):
+    """
+    Move até `lote` pedidos encerrados criados antes de `antes_de`.
+    Devolve quantos foram movidos.
+    """
+    with transaction.atomic():
+        pedidos = list(
+            Pedido.objects.filter(status__in=STATUS_ENCERRADOS, criado_em__lt=antes_de)
+            .order_by("id")
+            .select_for_update()[:lote]
+        )
+        if not pedidos:
+            return 0
+        ids = [pedido.id for pedido in pedidos]
+
+        PedidoArquivado.objects.bulk_create([
+            PedidoArquivado(**{
+                campo.attname: getattr(pedido, campo.attname)
+                for campo in Pedido._meta.concrete_fields
+            })
+            for pedido in pedidos
+        ])
+        PedidoItemArquivado.objects.bulk_create([
+            PedidoItemArquivado(**{
+                campo.attname: getattr(item, campo.attname)
+                for campo in PedidoItem._meta.concrete_fields
+            })
+            for item in PedidoItem.objects.filter(pedido_id__in=ids)
+        ])
+
+        # Itens primeiro: sem sinais nem dependentes, viram um DELETE direto, e
+        # o collector dos pedidos (no máximo `lote` linhas) não acha mais itens.
+        PedidoItem.objects.filter(pedido_id__in=ids).delete()
+        Pedido.objects.filter(id__in=ids).delete()
+        return len(ids)
+
+
+def arquivar(antes_de, lote=500):
+    total = 0
+    while True:
+        movidos = arquivar_lote(antes_de, lote)
+        if not movidos:
+            return total
+        total += movidos
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def filtrar_periodo(queryset, desde=None, ate=None):
+    """
+    Pedidos criados entre os dias `desde` e `ate`, inclusive, no fuso do
+    projeto. Os limites são instantes, não `criado_em__date`: a comparação
+    direta com a coluna usa os índices de `criado_em`.
+    """
+    if desde is not None:
+        queryset = queryset.filter(criado_em__gte=_inicio_do_dia(desde))
+    if ate is not None:
+        queryset = queryset.filter(criado_em__lt=_inicio_do_dia(ate + timedelta(days=1)))
+    return queryset
+
+
+class HistoricoComArquivo:
+    """
+    Pedidos recentes e arquivados como uma única lista ordenada por
+    (-criado_em, -id), paginável pelo Paginator do Django. Cada página lê no
+    máximo `fim` linhas de cada tabela e intercala as duas.
+    """
+
+    ordered = True
+    ORDEM = ("-criado_em", "-id")
+
+    def __init__(self, recentes, arquivados):
+        # A chave de intercalação vem como anotação: sobrevive a um `only()`
+        # que não inclua criado_em.
+        self.recentes = recentes.annotate(ordem_criado_em=F("criado_em")).order_by(*self.ORDEM)
+        self.arquivados = arquivados.annotate(ordem_criado_em=F("criado_em")).order_by(*self.ORDEM)
+
+    def count(self):
+        return self.recentes.count() + self.arquivados.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:None])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        inicio = item.start or 0
+        fim = item.stop
+        recentes = self.recentes[:fim] if fim is not None else self.recentes
+        arquivados = self.arquivados[:fim] if fim is not None else self.arquivados
+        intercalados = heapq.merge(
+            recentes,
+            arquivados,
+            key=lambda pedido: (pedido.ordem_criado_em, pedido.id),
+            reverse=True,
+        )
+        return [
+            pedido.como_pedido() if isinstance(pedido, PedidoArquivado) else pedido
+            for pedido in islice(intercalados, inicio, fim)
+        ]
+
+
+def agregar_faturamento(recentes, arquivados):
+    """
+    Soma, quantidade e ticket médio de dois querysets (quente e arquivo),
+    combinados sem perder precisão no ticket médio.
+    """
+    soma = 0
+    quantidade = 0
+    for queryset in (recentes, arquivados):
+        parcial = queryset.aggregate(soma=Sum("total"), quantidade=Count("id"))
+        soma += parcial["soma"] or 0
+        quantidade += parcial["quantidade"]
+    return {
+        "total_faturado": soma,
+        "total_pedidos": quantidade,
+        "ticket_medio": soma / quantidade if quantidade else 0,
+    }
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+PEDIDO_CRIADO = "pedido_criado"
+STATUS_ALTERADO = "status_alterado"
+
+
+class Assinatura:
+    """
+    Fila de eventos de um cliente conectado, presa ao event loop que a criou.
+    """
+
+    def __init__(self, filtro, loop, tamanho_maximo=100):
+        self.filtro = filtro
+        self.loop = loop
+        self.fila = asyncio.Queue(maxsize=tamanho_maximo)
+
+    def notificar(self, evento):
+        self.loop.call_soon_threadsafe(self.entregar, evento)
+
+    def entregar(self, evento):
+        # Chamado no thread do event loop; cliente lento perde eventos em vez de
+        # acumular memória sem limite.
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass
+
+
+class AssinaturaSincrona:
+    """
+    Assinatura para código síncrono (ex.: long-poll), que só precisa ser
+    acordado quando chega algum evento relevante.
+    """
+
+    def __init__(self, filtro):
+        self.filtro = filtro
+        self.sinal = threading.Event()
+
+    def notificar(self, evento):
+        self.sinal.set()
+
+    def aguardar(self, timeout):
+        recebido = self.sinal.wait(timeout)
+        self.sinal.clear()
+        return recebido
+
+
+class BrokerMemoria:
+    """
+    Pub/sub dentro do processo. Só entrega eventos publicados pelo próprio
+    processo; para vários workers use um backend entre processos.
+    """
+
+    def __init__(self, **options):
+        self._assinaturas = set()
+        self._lock = threading.Lock()
+
+    def assinar(self, filtro):
+        return self._registrar(Assinatura(filtro, asyncio.get_running_loop()))
+
+    def assinar_sincrono(self, filtro):
+        return self._registrar(AssinaturaSincrona(filtro))
+
+    def _registrar(self, assinatura):
+        with self._lock:
+            self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def publicar(self, evento):
+        self.distribuir(evento)
+
+    def distribuir(self, evento):
+        with self._lock:
+            assinaturas = list(self._assinaturas)
+
+        for assinatura in assinaturas:
+            if not assinatura.filtro(evento):
+                continue
+            try:
+                assinatura.notificar(evento)
+            except RuntimeError:
+                # Event loop já encerrado.
+                self.cancelar(assinatura)
+
+
+class BrokerRedis(BrokerMemoria):
+    """
+    Distribui os eventos entre processos via Redis Pub/Sub.
+
+    Requer o pacote `redis`. Opções: `url` e `canal`.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", canal="pedidos:eventos", **options):
+        super().__init__(**options)
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "BrokerRedis requer o pacote 'redis' instalado."
+            ) from exc
+
+        self._redis = redis.Redis.from_url(url)
+        self._erro_conexao = redis.ConnectionError
+        self._canal = canal
+        self._ouvinte = None
+
+    def _registrar(self, assinatura):
+        self._iniciar_ouvinte()
+        return super()._registrar(assinatura)
+
+    def publicar(self, evento):
+        self._redis.publish(self._canal, json.dumps(evento))
+
+    def _iniciar_ouvinte(self):
+        with self._lock:
+            if self._ouvinte is not None:
+                return
+            self._ouvinte = threading.Thread(target=self._ouvir, name="pedidos-eventos-redis", daemon=True)
+            self._ouvinte.start()
+
+    def _ouvir(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._canal)
+                for mensagem in pubsub.listen():
+                    try:
+                        evento = json.loads(mensagem["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self.distribuir(evento)
+            except self._erro_conexao:
+                time.sleep(1)
+
+
+def filtro_loja(loja_id):
+    """
+    Filtro de assinatura para os eventos dos pedidos de uma loja.
+
+    Os IDs são comparados como texto: pelo BrokerRedis o evento volta do
+    JSON e a claim do token pode trazer o mesmo ID com outro tipo.
+    """
+    alvo = str(loja_id)
+    return lambda evento: str(evento["loja"]) == alvo
+
+
+def filtro_usuario(user_id):
+    """
+    Filtro de assinatura para os eventos dos pedidos de um usuário.
+    """
+    alvo = str(user_id)
+    return lambda evento: str(evento["user"]) == alvo
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    config = getattr(settings, "PEDIDOS_EVENTOS", {})
+    backend = import_string(config.get("BACKEND", "apps.pedidos.eventos.BrokerMemoria"))
+    return backend(**config.get("OPTIONS", {}))
+
+
+def publicar_evento_pedido(tipo, pedido_id, user_id, loja_id, status):
+    """
+    Publica o evento somente após o commit, para que nenhum cliente veja
+    um pedido que acabou sofrendo rollback.
+    """
+    evento = {
+        "tipo": tipo,
+        "pedido": pedido_id,
+        "user": user_id,
+        "loja": loja_id,
+        "status": status,
+    }
+    transaction.on_commit(lambda: get_broker().publicar(evento))
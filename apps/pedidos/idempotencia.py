@@ -0,0 +1,107 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ChaveIdempotencia
+
+
+CABECALHO = "Idempotency-Key"
+
+
+def calcular_impressao(request):
+    corpo = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    conteudo = f"{request.method} {request.path}\n{corpo}"
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def reproduzir(registro, impressao):
+    if registro.impressao != impressao:
+        return Response(
+            {"detail": f"{CABECALHO} já utilizada com uma requisição diferente."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    if registro.status_code is None:
+        return Response(
+            {"detail": "Uma requisição com esta chave ainda está em processamento."},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    return Response(
+        registro.resposta,
+        status=registro.status_code,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def idempotente(view_func):
+    """
+    Torna uma action POST idempotente quando o cliente envia `Idempotency-Key`.
+
+    A chave é reservada numa transação própria, já confirmada antes de a view
+    rodar: uma repetição concorrente recebe 409 na hora, em vez de esperar
+    pela trava da primeira. A view e a gravação da resposta rodam juntas em
+    outra transação. Respostas 5xx e exceções não são gravadas, tudo o que a
+    view fez é desfeito e a reserva é liberada para uma nova tentativa.
+    """
+
+    @wraps(view_func)
+    def wrapper(self, request, *args, **kwargs):
+        chave = request.headers.get(CABECALHO)
+        if not chave:
+            return view_func(self, request, *args, **kwargs)
+
+        if len(chave) > 255:
+            return Response(
+                {"detail": f"{CABECALHO} deve ter no máximo 255 caracteres."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        impressao = calcular_impressao(request)
+
+        existente = ChaveIdempotencia.objects.filter(user=request.user, chave=chave).first()
+        if existente is not None:
+            if not existente.expirada and not existente.abandonada:
+                return reproduzir(existente, impressao)
+            existente.delete()
+
+        try:
+            with transaction.atomic():
+                registro = ChaveIdempotencia.objects.create(
+                    user=request.user, chave=chave, impressao=impressao
+                )
+        except IntegrityError:
+            # Outra requisição com a mesma chave reservou primeiro. Se ela já
+            # liberou a reserva (5xx ou exceção), o cliente tenta de novo.
+            concorrente = ChaveIdempotencia.objects.filter(user=request.user, chave=chave).first()
+            if concorrente is None:
+                return Response(
+                    {"detail": "Uma requisição com esta chave acabou de falhar. Tente novamente."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return reproduzir(concorrente, impressao)
+
+        try:
+            with transaction.atomic():
+                response = view_func(self, request, *args, **kwargs)
+
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                else:
+                    registro.status_code = response.status_code
+                    registro.resposta = response.data
+                    registro.save(update_fields=["status_code", "resposta"])
+        except BaseException:
+            registro.delete()
+            raise
+
+        if response.status_code >= 500:
+            registro.delete()
+        return response
+
+    return wrapper
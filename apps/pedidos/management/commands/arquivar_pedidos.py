@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.pedidos.arquivo import arquivar
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os pedidos entregues ou cancelados mais antigos que --dias "
+        "(ARQUIVO_PEDIDOS_DIAS) para as tabelas de arquivo, um lote por transação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=settings.ARQUIVO_PEDIDOS_DIAS)
+        parser.add_argument("--lote", type=int, default=500, help="Pedidos movidos por transação.")
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=options["dias"])
+        movidos = arquivar(antes_de, options["lote"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{movidos} pedido(s) criado(s) antes de {antes_de:%d/%m/%Y} arquivado(s)."
+        ))
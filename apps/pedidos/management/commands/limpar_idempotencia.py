@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.pedidos.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = "Remove as Idempotency-Keys expiradas (mais antigas que IDEMPOTENCIA_TTL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000, help="Registros removidos por transação.")
+
+    def handle(self, *args, **options):
+        limite = ChaveIdempotencia.limite_expiracao()
+        removidos = 0
+
+        while True:
+            ids = list(
+                ChaveIdempotencia.objects.filter(criado_em__lt=limite)
+                .values_list("id", flat=True)[:options["lote"]]
+            )
+            if not ids:
+                break
+            removidos += ChaveIdempotencia.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"{removidos} chave(s) de idempotência removida(s)."))
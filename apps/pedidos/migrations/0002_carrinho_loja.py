@@ -0,0 +1,54 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+
+def unificar_itens_duplicados(apps, schema_editor):
+    CarrinhoItem = apps.get_model("pedidos", "CarrinhoItem")
+
+    duplicados = (
+        CarrinhoItem.objects.values("carrinho_id", "produto_id")
+        .annotate(n=Count("id"), total=Sum("quantidade"))
+        .filter(n__gt=1)
+    )
+    for grupo in duplicados:
+        itens = CarrinhoItem.objects.filter(
+            carrinho_id=grupo["carrinho_id"], produto_id=grupo["produto_id"]
+        ).order_by("adicionado_em", "id")
+        primeiro = itens.first()
+        itens.exclude(pk=primeiro.pk).delete()
+        CarrinhoItem.objects.filter(pk=primeiro.pk).update(quantidade=grupo["total"])
+
+
+def preencher_loja_do_carrinho(apps, schema_editor):
+    Carrinho = apps.get_model("pedidos", "Carrinho")
+    CarrinhoItem = apps.get_model("pedidos", "CarrinhoItem")
+
+    loja_do_primeiro_item = (
+        CarrinhoItem.objects.filter(carrinho_id=OuterRef("pk"))
+        .order_by("adicionado_em", "id")
+        .values("produto__loja_id")[:1]
+    )
+    Carrinho.objects.update(loja_id=Subquery(loja_do_primeiro_item))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('pedidos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrinho',
+            name='loja',
+            field=models.ForeignKey(blank=True, help_text='Loja dos itens atuais do carrinho (nula quando vazio)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='carrinhos', to='core.lojaperfil'),
+        ),
+        migrations.RunPython(unificar_itens_duplicados, migrations.RunPython.noop),
+        migrations.RunPython(preencher_loja_do_carrinho, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carrinhoitem',
+            constraint=models.UniqueConstraint(fields=('carrinho', 'produto'), name='carrinhoitem_produto_unico'),
+        ),
+    ]
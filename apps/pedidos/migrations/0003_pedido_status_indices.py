@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def normalizar_status(apps, schema_editor):
+    Pedido = apps.get_model("pedidos", "Pedido")
+    Pedido.objects.update(status=Lower(Trim("status")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('pedidos', '0002_carrinho_loja'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['loja', 'status'], name='pedido_loja_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['user', 'status'], name='pedido_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def preencher_atualizado_em(apps, schema_editor):
+    Pedido = apps.get_model("pedidos", "Pedido")
+    Pedido.objects.update(atualizado_em=F("criado_em"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('pedidos', '0003_pedido_status_indices'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(preencher_atualizado_em, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['loja', 'atualizado_em', 'id'], name='pedido_loja_alterado_idx'),
+        ),
+    ]
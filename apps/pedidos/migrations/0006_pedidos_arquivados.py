@@ -0,0 +1,60 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_produto_indices_catalogo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0002_endereco_coordenadas'),
+        ('pedidos', '0005_chaveidempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('criado_em', models.DateTimeField()),
+                ('atualizado_em', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('preparando', 'Preparando'), ('a caminho', 'A caminho'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('endereco', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.endereco')),
+                ('loja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.lojaperfil')),
+                ('metodo_pagamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.pagamento')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'pedido arquivado',
+                'verbose_name_plural': 'pedidos arquivados',
+            },
+        ),
+        migrations.CreateModel(
+            name='PedidoItemArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.DateField(blank=True, null=True)),
+                ('preco', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('quantidade', models.PositiveIntegerField(default=1)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='pedidos.pedidoarquivado')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.produto')),
+            ],
+            options={
+                'verbose_name': 'item de pedido arquivado',
+                'verbose_name_plural': 'itens de pedidos arquivados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarquivado',
+            index=models.Index(fields=['user', 'criado_em'], name='arquivo_user_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarquivado',
+            index=models.Index(fields=['loja', 'status', 'criado_em'], name='arquivo_loja_status_idx'),
+        ),
+    ]
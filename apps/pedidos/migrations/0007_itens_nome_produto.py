@@ -0,0 +1,46 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copiar_nomes(apps, schema_editor):
+    Produto = apps.get_model("core", "Produto")
+    nome = Subquery(Produto.objects.filter(pk=OuterRef("produto_id")).values("nome")[:1])
+    for modelo in ("PedidoItem", "PedidoItemArquivado"):
+        apps.get_model("pedidos", modelo).objects.filter(produto__isnull=False).update(produto_nome=nome)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_produto_indices_catalogo'),
+        ('pedidos', '0006_pedidos_arquivados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedidoitem',
+            name='produto_nome',
+            field=models.CharField(default='', help_text='Nome do produto no momento da compra', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='pedidoitemarquivado',
+            name='produto_nome',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='pedidoitem',
+            name='produto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.produto'),
+        ),
+        migrations.AlterField(
+            model_name='pedidoitemarquivado',
+            name='produto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.produto'),
+        ),
+        migrations.RunPython(copiar_nomes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def numerar_alteracoes(apps, schema_editor):
+    """
+    Numera os pedidos existentes de cada loja na ordem (atualizado_em, id)
+    e deixa o contador da loja no último número.
+    """
+    Pedido = apps.get_model("pedidos", "Pedido")
+    SequenciaPedidos = apps.get_model("pedidos", "SequenciaPedidos")
+
+    lojas = Pedido.objects.order_by().values_list("loja_id", flat=True).distinct()
+    for loja_id in lojas:
+        lote = []
+        versao = 0
+        for pedido in Pedido.objects.filter(loja_id=loja_id).order_by("atualizado_em", "id").only("id").iterator():
+            versao += 1
+            pedido.versao = versao
+            lote.append(pedido)
+            if len(lote) >= 1000:
+                Pedido.objects.bulk_update(lote, ["versao"])
+                lote = []
+        Pedido.objects.bulk_update(lote, ["versao"])
+        SequenciaPedidos.objects.update_or_create(loja_id=loja_id, defaults={"valor": versao})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_produto_indices_catalogo'),
+        ('pedidos', '0007_itens_nome_produto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaPedidos',
+            fields=[
+                ('loja', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='core.lojaperfil')),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='pedido',
+            name='pedido_loja_alterado_idx',
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='versao',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Posição no feed de alterações da loja'),
+        ),
+        migrations.AddField(
+            model_name='pedidoarquivado',
+            name='versao',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['loja', 'versao', 'id'], name='pedido_loja_versao_idx'),
+        ),
+        migrations.RunPython(numerar_alteracoes, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,93 @@
 from django.conf import settings
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.utils import timezone
 from apps.users.models import User
-from apps.core.models import Produto
+from apps.core.models import LojaPerfil, Produto
+from .eventos import publicar_evento_pedido, STATUS_ALTERADO
+from .resumo import invalidar_resumo
 
 class Carrinho(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="carrinho")
+    loja = models.ForeignKey(
+        "core.LojaPerfil", on_delete=models.SET_NULL, null=True, blank=True, related_name="carrinhos",
+        help_text="Loja dos itens atuais do carrinho (nula quando vazio)"
+    )
 
     @property
     def total(self):
         return sum(item.subtotal for item in self.items.all())
 
+    def sincronizar_itens(self, itens, quantidades, loja_id):
+        """
+        Grava em lote as quantidades desejadas por produto.
+
+        `itens` são os CarrinhoItem atuais indexados por produto_id e
+        `quantidades` o estado final; quantidade 0 remove o item.
+        """
+        novos = [
+            CarrinhoItem(carrinho=self, produto_id=produto_id, quantidade=qtd)
+            for produto_id, qtd in quantidades.items()
+            if qtd > 0 and produto_id not in itens
+        ]
+        alterados = []
+        removidos = []
+        for produto_id, item in itens.items():
+            qtd = quantidades.get(produto_id, item.quantidade)
+            if qtd == 0:
+                removidos.append(produto_id)
+            elif qtd != item.quantidade:
+                item.quantidade = qtd
+                alterados.append(item)
+
+        if novos:
+            CarrinhoItem.objects.bulk_create(novos)
+        if alterados:
+            CarrinhoItem.objects.bulk_update(alterados, ["quantidade"])
+        if removidos:
+            self.items.filter(produto_id__in=removidos).delete()
+
+        if self.loja_id != loja_id:
+            self.loja_id = loja_id
+            self.save(update_fields=["loja"])
+
+    def liberar_loja_se_vazio(self):
+        if self.loja_id and not self.items.exists():
+            self.loja = None
+            self.save(update_fields=["loja"])
+
+
+class CarrinhoItemQuerySet(models.QuerySet):
+    def somar(self, carrinho, produto, quantidade):
+        """
+        Soma `quantidade` ao item de `produto` no carrinho, criando-o se não
+        existir, em um único INSERT ... ON CONFLICT. O incremento só é
+        aplicado se o total couber no estoque do produto; retorna o item
+        gravado ou None quando excederia.
+        """
+        conexao = connections[self.db]
+        opts = self.model._meta
+        tabela = conexao.ops.quote_name(opts.db_table)
+        carrinho_id, produto_id, qtd, adicionado_em, pk = (
+            conexao.ops.quote_name(opts.get_field(nome).column)
+            for nome in ("carrinho", "produto", "quantidade", "adicionado_em", "id")
+        )
+        sql = (
+            f"INSERT INTO {tabela} ({carrinho_id}, {produto_id}, {qtd}, {adicionado_em}) VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT ({carrinho_id}, {produto_id}) DO UPDATE SET {qtd} = {tabela}.{qtd} + excluded.{qtd} "
+            f"WHERE {tabela}.{qtd} + excluded.{qtd} <= %s "
+            f"RETURNING {pk}, {qtd}"
+        )
+        agora = conexao.ops.adapt_datetimefield_value(timezone.now())
+        with conexao.cursor() as cursor:
+            cursor.execute(sql, [carrinho.pk, produto.pk, quantidade, agora, produto.quantidade])
+            linha = cursor.fetchone()
+
+        if linha is None:
+            return None
+        return self.model(id=linha[0], carrinho=carrinho, produto=produto, quantidade=linha[1])
+
 
 class CarrinhoItem(models.Model):
     carrinho = models.ForeignKey(Carrinho, on_delete=models.CASCADE, related_name="items")
@@ -17,6 +95,12 @@ class CarrinhoItem(models.Model):
     quantidade = models.PositiveIntegerField(default=1)
     adicionado_em = models.DateTimeField(auto_now_add=True)
 
+    objects = CarrinhoItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["carrinho", "produto"], name="carrinhoitem_produto_unico"),
+        ]
 
     @property
     def subtotal(self):
@@ -24,37 +108,398 @@ class CarrinhoItem(models.Model):
 
 
 
+class PedidoQuerySet(models.QuerySet):
+    def com_detalhes(self):
+        """
+        Carrega o que PedidoDetalheSerializer usa: loja, endereço e pagamento
+        no mesmo SELECT e os itens (com o nome do produto gravado) em outra.
+        """
+        return self.select_related("endereco", "metodo_pagamento", "loja").prefetch_related("itens")
+
+    def transicionar(self, novo_status):
+        """
+        Move para `novo_status` os pedidos do queryset cujo status atual
+        permite a transição. Retorna os IDs efetivamente alterados.
+        """
+        origens = Pedido.origens_permitidas(novo_status)
+        if not origens:
+            return []
+
+        with transaction.atomic():
+            pedidos = list(
+                self.filter(status__in=origens)
+                .select_for_update()
+                .values_list("id", "user_id", "loja_id")
+            )
+            if not pedidos:
+                return []
+
+            ids = [pedido_id for pedido_id, _, _ in pedidos]
+            por_loja = {}
+            for pedido_id, _, loja_id in pedidos:
+                por_loja.setdefault(loja_id, []).append(pedido_id)
+            agora = timezone.now()
+            # Só lojas com pedidos travados acima consomem uma versão, em ordem
+            # de ID para não travar os contadores em ordens cruzadas.
+            for loja_id in sorted(por_loja):
+                Pedido.objects.filter(pk__in=por_loja[loja_id], status__in=origens).update(
+                    status=novo_status, atualizado_em=agora, versao=SequenciaPedidos.proxima(loja_id)
+                )
+
+            if novo_status == Pedido.CANCELADO:
+                PedidoItem.objects.filter(pedido_id__in=ids).repor_estoque()
+
+            for pedido_id, user_id, loja_id in pedidos:
+                publicar_evento_pedido(STATUS_ALTERADO, pedido_id, user_id, loja_id, novo_status)
+            invalidar_resumo(*(user_id for _, user_id, _ in pedidos))
+
+        return ids
+
+    def alterados_desde(self, cursor):
+        """
+        Pedidos criados ou alterados depois do cursor `(versao, id)`, na
+        ordem em que devem ser consumidos.
+        """
+        qs = self.order_by("versao", "id")
+        if cursor is None:
+            return qs
+
+        versao, pedido_id = cursor
+        return qs.filter(Q(versao__gt=versao) | Q(versao=versao, id__gt=pedido_id))
+
+
+class SequenciaPedidos(models.Model):
+    """
+    Contador de alterações de pedidos por loja, que numera `Pedido.versao`.
+
+    `proxima()` roda dentro da transação da alteração e o UPDATE mantém a
+    linha travada até o commit: uma alteração concorrente da mesma loja só
+    recebe o número seguinte depois que a anterior foi gravada. Assim a
+    ordem das versões é a ordem dos commits, e um cursor `(versao, id)`
+    nunca passa à frente de uma alteração ainda não visível (o que um
+    carimbo de hora do servidor de aplicação não garante).
+    """
+
+    loja = models.OneToOneField("core.LojaPerfil", on_delete=models.CASCADE, primary_key=True, related_name="+")
+    valor = models.BigIntegerField(default=0)
+
+    @classmethod
+    def proxima(cls, loja_id):
+        if not cls.objects.filter(loja_id=loja_id).update(valor=F("valor") + 1):
+            cls.objects.get_or_create(loja_id=loja_id)
+            cls.objects.filter(loja_id=loja_id).update(valor=F("valor") + 1)
+        return cls.objects.filter(loja_id=loja_id).values_list("valor", flat=True).get()
+
+
 class Pedido(models.Model):
+    PENDENTE = "pendente"
+    PREPARANDO = "preparando"
+    A_CAMINHO = "a caminho"
+    ENTREGUE = "entregue"
+    CANCELADO = "cancelado"
+
     STATUS_CHOICES = [
-        ("pendente", "Pendente"),
-        ("preparando", "Preparando"),
-        ("a caminho", "A caminho"),
-        ("entregue", "Entregue"),
-        ("cancelado", "Cancelado"),
+        (PENDENTE, "Pendente"),
+        (PREPARANDO, "Preparando"),
+        (A_CAMINHO, "A caminho"),
+        (ENTREGUE, "Entregue"),
+        (CANCELADO, "Cancelado"),
     ]
 
+    TRANSICOES = {
+        PENDENTE: {PREPARANDO, CANCELADO},
+        PREPARANDO: {A_CAMINHO, CANCELADO},
+        A_CAMINHO: {ENTREGUE},
+        ENTREGUE: set(),
+        CANCELADO: set(),
+    }
+
     user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="pedidos")
     loja = models.ForeignKey("core.LojaPerfil", on_delete=models.CASCADE, related_name="pedidos")
     criado_em = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pendente")
+    atualizado_em = models.DateTimeField(auto_now=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     metodo_pagamento = models.ForeignKey("users.Pagamento", on_delete=models.SET_NULL, null=True, blank=True)
     endereco = models.ForeignKey("users.Endereco", on_delete=models.SET_NULL, null=True, blank=True)
+    versao = models.BigIntegerField(default=0, editable=False, help_text="Posição no feed de alterações da loja")
+
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["loja", "status"], name="pedido_loja_status_idx"),
+            models.Index(fields=["user", "status"], name="pedido_user_status_idx"),
+            models.Index(fields=["loja", "versao", "id"], name="pedido_loja_versao_idx"),
+        ]
 
     def __str__(self):
-        return f"Pedido #{self.id} - {self.user.username} ({self.status}) - R$ {self.total:.2f}"
+        return f"Pedido #{self.id} ({self.status}) - R$ {self.total:.2f}"
+
+    # Campos cuja alteração entra no feed de alterações da loja.
+    CAMPOS_VERSIONADOS = ("status", "total", "metodo_pagamento_id", "endereco_id")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pedido = super().from_db(db, field_names, values)
+        pedido._versionado = pedido._valores_versionados()
+        return pedido
+
+    def _valores_versionados(self):
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_VERSIONADOS)
+
+    def save(self, *args, **kwargs):
+        """
+        Só pedidos novos ou com status/conteúdo alterado recebem uma nova
+        `versao`; as demais gravações não passam pelo contador da loja.
+        """
+        valores = self._valores_versionados()
+        if not self._state.adding and valores == getattr(self, "_versionado", None):
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            self.versao = SequenciaPedidos.proxima(self.loja_id)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "versao"}
+            super().save(*args, **kwargs)
+        self._versionado = valores
+
+    @classmethod
+    def origens_permitidas(cls, novo_status):
+        return [origem for origem, destinos in cls.TRANSICOES.items() if novo_status in destinos]
+
+    def transicionar(self, novo_status):
+        """
+        Aplica a transição com um único UPDATE condicionado ao status atual.
+        Retorna False se o pedido não estava em um status que a permita.
+        """
+        origens = self.origens_permitidas(novo_status)
+        agora = timezone.now()
+
+        with transaction.atomic():
+            # O UPDATE condicional é a verificação: o contador da loja só é
+            # travado (e uma versão consumida) se o pedido mudou de fato.
+            alterados = 0
+            if origens:
+                alterados = Pedido.objects.filter(pk=self.pk, status__in=origens).update(
+                    status=novo_status, atualizado_em=agora
+                )
+            if alterados:
+                self.versao = SequenciaPedidos.proxima(self.loja_id)
+                Pedido.objects.filter(pk=self.pk).update(versao=self.versao)
+                if novo_status == self.CANCELADO:
+                    self.itens.all().repor_estoque()
+                publicar_evento_pedido(STATUS_ALTERADO, self.pk, self.user_id, self.loja_id, novo_status)
+                invalidar_resumo(self.user_id)
+
+        if alterados:
+            self.status = novo_status
+            self.atualizado_em = agora
+        else:
+            self.refresh_from_db(fields=["status", "atualizado_em", "versao"])
+        self._versionado = self._valores_versionados()
+        return bool(alterados)
+
+
+class PedidoItemQuerySet(models.QuerySet):
+    def _quantidades_por_produto(self):
+        return dict(
+            self.filter(produto__isnull=False)
+            .order_by()
+            .values("produto_id")
+            .annotate(qtd=Sum("quantidade"))
+            .values_list("produto_id", "qtd")
+        )
+
+    def baixar_estoque(self):
+        """
+        Retira do estoque, em um único UPDATE, as quantidades dos itens.
+        Produtos que chegam a zero ficam indisponíveis (e `esgotado`).
+        """
+        baixas = self._quantidades_por_produto()
+        if not baixas:
+            return
+
+        Produto.objects.filter(pk__in=baixas).update(
+            quantidade=Case(
+                *[
+                    When(pk=produto_id, quantidade__gt=qtd, then=F("quantidade") - Value(qtd))
+                    for produto_id, qtd in baixas.items()
+                ],
+                default=Value(0),
+                output_field=models.PositiveIntegerField(),
+            ),
+            disponivel=Case(
+                *[When(pk=produto_id, quantidade__lte=qtd, then=Value(False)) for produto_id, qtd in baixas.items()],
+                default=F("disponivel"),
+            ),
+            esgotado=Case(
+                *[
+                    When(pk=produto_id, quantidade__lte=qtd, disponivel=True, then=Value(True))
+                    for produto_id, qtd in baixas.items()
+                ],
+                default=F("esgotado"),
+            ),
+        )
+        _estoque_alterado(baixas)
+
+    def repor_estoque(self):
+        """
+        Devolve ao estoque, em um único UPDATE, as quantidades dos itens.
+        Produtos que o checkout desligou por falta de estoque voltam a ficar
+        disponíveis; os que a loja desligou continuam como estão.
+        """
+        devolucoes = self._quantidades_por_produto()
+        if not devolucoes:
+            return
+
+        Produto.objects.filter(pk__in=devolucoes).update(
+            quantidade=F("quantidade") + Case(
+                *[When(pk=produto_id, then=Value(qtd)) for produto_id, qtd in devolucoes.items()],
+                output_field=models.PositiveIntegerField(),
+            ),
+            disponivel=Case(
+                When(esgotado=True, then=Value(True)),
+                default=F("disponivel"),
+            ),
+            esgotado=Value(False),
+        )
+
+        _estoque_alterado(devolucoes)
+
+
+def _estoque_alterado(produto_ids):
+    # QuerySet.update não dispara sinais: contadores e cardápio publicado são atualizados aqui.
+    from apps.core import vitrine
+    lojas = set(Produto.objects.filter(pk__in=produto_ids).values_list("loja_id", flat=True))
+    LojaPerfil.objects.filter(pk__in=lojas).atualizar_contadores()
+    vitrine.marcar(lojas)
+
 
 class PedidoItem(models.Model):
     pedido = models.ForeignKey("Pedido", on_delete=models.CASCADE, related_name="itens")
-    produto = models.ForeignKey("core.Produto", on_delete=models.CASCADE)
+    # Produto excluído não apaga o histórico: o item fica com o nome gravado na compra.
+    produto = models.ForeignKey("core.Produto", on_delete=models.SET_NULL, null=True, blank=True)
+    produto_nome = models.CharField(max_length=255, help_text="Nome do produto no momento da compra")
     data = models.DateField(
         help_text="Data de retirada/entrega", blank=True, null=True
     )
     preco = models.DecimalField(max_digits=8, decimal_places=2)
     quantidade = models.PositiveIntegerField(default=1)
 
+    objects = PedidoItemQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if not self.produto_nome and self.produto_id:
+            self.produto_nome = self.produto.nome
+        super().save(*args, **kwargs)
+
     def subtotal(self):
         return self.preco * self.quantidade
 
     def __str__(self):
-        return f"{self.quantidade}x {self.produto.nome} - R${self.preco}"
+        return f"{self.quantidade}x {self.produto_nome} - R${self.preco}"
+
+
+class ChaveIdempotencia(models.Model):
+    """
+    Resposta armazenada de uma requisição POST enviada com `Idempotency-Key`.
+    Registros com `status_code` nulo ainda estão em processamento.
+    """
+
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="+")
+    chave = models.CharField(max_length=255)
+    impressao = models.CharField(max_length=64, help_text="SHA-256 do método, caminho e corpo da requisição")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    resposta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "chave"], name="idempotencia_user_chave_unica"),
+        ]
+
+    @classmethod
+    def limite_expiracao(cls):
+        return timezone.now() - settings.IDEMPOTENCIA_TTL
+
+    @property
+    def expirada(self):
+        return self.criado_em < self.limite_expiracao()
+
+    @property
+    def abandonada(self):
+        """
+        Reserva sem resposta há mais de IDEMPOTENCIA_PROCESSAMENTO_MAXIMO: o
+        processo caiu antes do commit da view, que portanto não deixou efeito.
+        """
+        return self.status_code is None and self.criado_em < timezone.now() - settings.IDEMPOTENCIA_PROCESSAMENTO_MAXIMO
+
+
+class PedidoArquivado(models.Model):
+    """
+    Pedido encerrado (entregue ou cancelado) movido da tabela quente por
+    `manage.py arquivar_pedidos`. Mantém o mesmo ID e as mesmas colunas de
+    Pedido; ver `apps.pedidos.arquivo`.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="+")
+    loja = models.ForeignKey("core.LojaPerfil", on_delete=models.CASCADE, related_name="+")
+    criado_em = models.DateTimeField()
+    atualizado_em = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    metodo_pagamento = models.ForeignKey(
+        "users.Pagamento", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    endereco = models.ForeignKey("users.Endereco", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    versao = models.BigIntegerField(default=0)
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "criado_em"], name="arquivo_user_criado_idx"),
+            models.Index(fields=["loja", "status", "criado_em"], name="arquivo_loja_status_idx"),
+        ]
+        verbose_name = "pedido arquivado"
+        verbose_name_plural = "pedidos arquivados"
+
+    def __str__(self):
+        return f"Pedido arquivado #{self.id} ({self.status}) - R$ {self.total:.2f}"
+
+    def como_pedido(self):
+        """
+        Pedido equivalente (não salvo), para reaproveitar os serializers.
+        Só copia as colunas carregadas, para respeitar um `only()`.
+        """
+        carregados = self.__dict__
+        pedido = Pedido(**{
+            campo.attname: carregados[campo.attname]
+            for campo in Pedido._meta.concrete_fields
+            if campo.attname in carregados
+        })
+        for relacao in ("endereco", "metodo_pagamento", "loja"):
+            if PedidoArquivado._meta.get_field(relacao).is_cached(self):
+                setattr(pedido, relacao, getattr(self, relacao))
+        if "itens" in getattr(self, "_prefetched_objects_cache", {}):
+            # Itens arquivados têm os mesmos atributos; o serializer não distingue.
+            pedido._prefetched_objects_cache = {"itens": self._prefetched_objects_cache["itens"]}
+        return pedido
+
+
+class PedidoItemArquivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    pedido = models.ForeignKey(PedidoArquivado, on_delete=models.CASCADE, related_name="itens")
+    produto = models.ForeignKey("core.Produto", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    produto_nome = models.CharField(max_length=255)
+    data = models.DateField(blank=True, null=True)
+    preco = models.DecimalField(max_digits=8, decimal_places=2)
+    quantidade = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "item de pedido arquivado"
+        verbose_name_plural = "itens de pedidos arquivados"
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto_nome} - R${self.preco}"
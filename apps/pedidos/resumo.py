@@ -0,0 +1,82 @@
+"""
+Resumo dos pedidos de um cliente (contagem por status, total gasto e último
+pedido), guardado no cache por usuário.
+
+O resumo é apagado depois do commit de toda criação de pedido e mudança de
+status (`invalidar_resumo`), então a tela inicial normalmente custa um único
+acesso ao cache. O TTL (`RESUMO_PEDIDOS_TTL`) limita o tempo que um resumo
+recalculado durante uma escrita concorrente pode ficar velho.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from rest_framework import serializers
+
+
+def chave_resumo(user_id):
+    return f"pedidos:resumo:{user_id}"
+
+
+def calcular_resumo(user_id):
+    # Importado aqui: os models chamam invalidar_resumo.
+    from .models import Pedido, PedidoArquivado
+
+    fontes = [
+        Pedido.objects.filter(user_id=user_id),
+        PedidoArquivado.objects.filter(user_id=user_id),
+    ]
+    por_status = dict.fromkeys((codigo for codigo, _ in Pedido.STATUS_CHOICES), 0)
+    total_gasto = Decimal("0")
+    ultimo = None
+
+    for pedidos in fontes:
+        # Uma consulta agrupada por status; cancelados não entram no total gasto.
+        for linha in pedidos.order_by().values("status").annotate(
+            quantidade=Count("id"),
+            soma=Sum("total", filter=~Q(status=Pedido.CANCELADO)),
+        ):
+            por_status[linha["status"]] += linha["quantidade"]
+            total_gasto += linha["soma"] or 0
+
+        candidato = (
+            pedidos.order_by("-criado_em", "-id")
+            .values("id", "status", "total", "criado_em", "loja_id", "loja__nome")
+            .first()
+        )
+        if candidato and (ultimo is None or (candidato["criado_em"], candidato["id"]) > (ultimo["criado_em"], ultimo["id"])):
+            ultimo = candidato
+    # Decimais e datas já no formato dos serializers (fuso local, microssegundos):
+    # o cache guarda só tipos JSON e o resumo bate com o resto da API.
+    decimal = serializers.DecimalField(max_digits=None, decimal_places=2)
+    return {
+        "total_pedidos": sum(por_status.values()),
+        "por_status": por_status,
+        "total_gasto": decimal.to_representation(total_gasto),
+        "ultimo_pedido": ultimo and {
+            "id": ultimo["id"],
+            "status": ultimo["status"],
+            "total": decimal.to_representation(ultimo["total"]),
+            "criado_em": serializers.DateTimeField().to_representation(ultimo["criado_em"]),
+            "loja": {"id": ultimo["loja_id"], "nome": ultimo["loja__nome"]},
+        },
+    }
+
+
+def obter_resumo(user_id):
+    chave = chave_resumo(user_id)
+    resumo = cache.get(chave)
+    if resumo is None:
+        resumo = calcular_resumo(user_id)
+        cache.set(chave, resumo, getattr(settings, "RESUMO_PEDIDOS_TTL", 300))
+    return resumo
+
+
+def invalidar_resumo(*user_ids):
+    """
+    Apaga o resumo dos usuários após o commit (nada acontece em rollback).
+    """
+    chaves = [chave_resumo(user_id) for user_id in set(user_ids)]
+    transaction.on_commit(lambda: cache.delete_many(chaves))
@@ -1,7 +1,12 @@
+import re
+
+from django.db import transaction
 from rest_framework import serializers
 from .models import Carrinho, Pedido, PedidoItem, Produto
 from apps.users.models import Pagamento, Endereco
 from apps.pedidos.models import CarrinhoItem
+from apps.pedidos.eventos import publicar_evento_pedido, PEDIDO_CRIADO
+from apps.pedidos.resumo import invalidar_resumo
 
 
 class CarrinhoAdicionarItemSerializer(serializers.Serializer):
@@ -47,6 +52,29 @@ class CarrinhoAlterarQuantidadeSerializer(serializers.Serializer):
         )
 
 
+class CarrinhoOperacaoSerializer(serializers.Serializer):
+    ACAO_CHOICES = [
+        ("adicionar", "Adicionar"),
+        ("definir", "Definir quantidade"),
+        ("remover", "Remover"),
+    ]
+
+    produto = serializers.IntegerField()
+    quantidade = serializers.IntegerField(min_value=0, default=1)
+    acao = serializers.ChoiceField(choices=ACAO_CHOICES, default="adicionar")
+
+    def validate(self, attrs):
+        if attrs["acao"] == "adicionar" and attrs["quantidade"] < 1:
+            raise serializers.ValidationError(
+                {"quantidade": "A quantidade a adicionar deve ser maior que zero."}
+            )
+        return attrs
+
+
+class CarrinhoLoteSerializer(serializers.Serializer):
+    operacoes = CarrinhoOperacaoSerializer(many=True, allow_empty=False, max_length=100)
+
+
 class CarrinhoItemSerializer(serializers.ModelSerializer):
     produto_id = serializers.IntegerField(source="produto.id", read_only=True)
     produto_nome = serializers.CharField(source="produto.nome", read_only=True)
@@ -107,7 +135,8 @@ class MetodoPagamentoListaSerializer(serializers.ModelSerializer):
 class PedidoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pedido
-        fields = "__all__"
+        # `versao` é a posição interna no feed de alterações; o cursor já a expõe.
+        exclude = ["versao"]
 
     def validate_metodo_pagamento(self, value):
         user = self.context["request"].user
@@ -127,7 +156,7 @@ class CancelarPedidoSerializer(serializers.Serializer):
         if user:
             self.fields["pedido"].queryset = Pedido.objects.filter(
                 user=user,
-                status__in=["pendente", "preparando", "Pendente", "Preparando"] 
+                status__in=Pedido.origens_permitidas(Pedido.CANCELADO)
             )
         else:
             pass
@@ -135,6 +164,7 @@ class CancelarPedidoSerializer(serializers.Serializer):
 class FinalizarPagamentoSerializer(serializers.Serializer):
     metodo_pagamento_id = serializers.IntegerField()
 
+    @transaction.atomic
     def create(self, validated_data):
         user = self.context["request"].user
 
@@ -159,9 +189,10 @@ class FinalizarPagamentoSerializer(serializers.Serializer):
             raise serializers.ValidationError("Adicione um endereço antes de finalizar o pedido.")
 
         pedidos_criados = []
+        itens_pedidos = []
         lojas = {}
 
-        for item in carrinho.items.all():
+        for item in carrinho.items.select_related("produto__loja"):
             loja = item.produto.loja
 
             if loja.id not in lojas:
@@ -169,7 +200,8 @@ class FinalizarPagamentoSerializer(serializers.Serializer):
 
             lojas[loja.id].append(item)
 
-        for loja_id, itens in lojas.items():
+        # Em ordem de loja: os contadores de versão de cada loja travam até o commit.
+        for loja_id, itens in sorted(lojas.items()):
             loja = itens[0].produto.loja
             total = sum(item.produto.preco * item.quantidade for item in itens)
 
@@ -180,28 +212,28 @@ class FinalizarPagamentoSerializer(serializers.Serializer):
                 metodo_pagamento=metodo_pagamento,
                 endereco=endereco  
             )
+            publicar_evento_pedido(PEDIDO_CRIADO, pedido.id, user.id, loja.id, pedido.status)
+            invalidar_resumo(user.id)
 
             for item in itens:
                 produto = item.produto
 
-                PedidoItem.objects.create(
+                itens_pedidos.append(PedidoItem(
                     pedido=pedido,
                     produto=produto,
+                    produto_nome=produto.nome,
                     quantidade=item.quantidade,
                     preco=produto.preco
-                )
-
-                produto.quantidade -= item.quantidade
-
-                if produto.quantidade <= 0:
-                    produto.quantidade = 0
-                    produto.disponivel = False
-
-                produto.save()
+                ))
 
             pedidos_criados.append(pedido)
 
+        # Itens de todos os pedidos em um único INSERT, e o estoque em um único UPDATE.
+        PedidoItem.objects.bulk_create(itens_pedidos)
+        PedidoItem.objects.filter(pedido__in=pedidos_criados).baixar_estoque()
+
         carrinho.items.all().delete()
+        carrinho.liberar_loja_se_vazio()
 
         return pedidos_criados
 
@@ -215,6 +247,20 @@ class AtualizarStatusPedidoSerializer(serializers.ModelSerializer):
             "status": {"style": {"base_template": "select.html"}}
         }
 
+class AtualizarStatusLoteSerializer(serializers.Serializer):
+    MAXIMO_PEDIDOS = 100
+
+    pedidos = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAXIMO_PEDIDOS,
+    )
+    status = serializers.ChoiceField(choices=Pedido.STATUS_CHOICES)
+
+    def validate_pedidos(self, value):
+        # Mantém a ordem enviada, sem repetições.
+        return list(dict.fromkeys(value))
+
 class EnderecoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Endereco
@@ -224,7 +270,7 @@ class EnderecoSerializer(serializers.ModelSerializer):
 class EnderecoCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Endereco
-        fields = ["rua", "numero", "bairro", "cidade", "estado", "cep", "complemento"]
+        fields = ["rua", "numero", "bairro", "cidade", "estado", "cep", "complemento", "latitude", "longitude"]
 
 
 class PedidoLojaSerializer(serializers.ModelSerializer):
@@ -235,6 +281,7 @@ class PedidoLojaSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "criado_em",
+            "atualizado_em",
             "status",
             "total",
             "user",
@@ -244,6 +291,47 @@ class PedidoLojaSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+class PedidoItemDetalheSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PedidoItem
+        fields = ["id", "produto", "produto_nome", "preco", "quantidade", "data"]
+        read_only_fields = fields
+
+
+class PagamentoPedidoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Pagamento
+        fields = ["id", "metodo"]
+        read_only_fields = fields
+
+
+class PedidoDetalheSerializer(serializers.ModelSerializer):
+    """
+    Pedido com itens, endereço e pagamento. Espera o queryset de
+    `PedidoQuerySet.com_detalhes()` (ou as cargas equivalentes).
+    """
+    loja_nome = serializers.CharField(source="loja.nome", read_only=True)
+    metodo_pagamento = PagamentoPedidoSerializer(read_only=True)
+    endereco = EnderecoSerializer(read_only=True)
+    itens = PedidoItemDetalheSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Pedido
+        fields = [
+            "id",
+            "criado_em",
+            "atualizado_em",
+            "status",
+            "total",
+            "user",
+            "loja",
+            "loja_nome",
+            "metodo_pagamento",
+            "endereco",
+            "itens",
+        ]
+        read_only_fields = fields
+
 class PagamentoSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())    
     class Meta:
@@ -285,4 +373,35 @@ class PagamentoSerializer(serializers.ModelSerializer):
 
 class FaturamentoFiltroSerializer(serializers.Serializer):
     data_inicial = serializers.DateField(required=True)
-    data_final = serializers.DateField(required=True)
\ No newline at end of file
+    data_final = serializers.DateField(required=True)
+
+
+class PeriodoHistoricoSerializer(serializers.Serializer):
+    desde = serializers.DateField(required=False)
+    ate = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if "desde" in attrs and "ate" in attrs and attrs["desde"] > attrs["ate"]:
+            raise serializers.ValidationError({"ate": "A data final deve ser igual ou posterior à inicial."})
+        return attrs
+
+
+class AlteracoesPedidoFiltroSerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    # Cada espera ocupa um thread do worker WSGI: curta, e o cliente repete.
+    espera = serializers.IntegerField(required=False, min_value=0, max_value=10, default=5)
+
+    CURSOR_INICIAL = "v0-0"
+    FORMATO_CURSOR = re.compile(r"v(\d+)-(\d+)")
+
+    def validate_cursor(self, value):
+        if not value:
+            return None
+        encontrado = self.FORMATO_CURSOR.fullmatch(value)
+        if encontrado is None:
+            raise serializers.ValidationError("Cursor inválido.")
+        return int(encontrado[1]), int(encontrado[2])
+
+    @staticmethod
+    def gerar_cursor(pedido):
+        return f"v{pedido.versao}-{pedido.id}"
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .eventos import filtro_loja, filtro_usuario, get_broker
+
+
+class EventosPedidoASGI:
+    """
+    Stream Server-Sent Events de criação e mudança de status de pedidos.
+
+    Roda direto no servidor ASGI, antes do Django: cada conexão aberta é só
+    uma fila no event loop, sem ocupar um thread do pool síncrono. A loja
+    recebe os eventos dos seus pedidos (claim `loja_id`) e o cliente os dos
+    próprios pedidos (claim `user_id`). Quando o token expira, o stream envia
+    `token_expirado` e é encerrado; o cliente reconecta com um token novo.
+    """
+
+    INTERVALO_HEARTBEAT = 15
+
+    def __init__(self, app, path="/api/pedidos/eventos/"):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+
+        if scope["method"] != "GET":
+            return await self._responder(send, 405, {"detail": "Método não permitido."})
+
+        claims = self._autenticar(scope)
+        if claims is None:
+            return await self._responder(send, 401, {"detail": "Token inválido ou ausente."})
+
+        await self._transmitir(claims, receive, send)
+
+    def _autenticar(self, scope):
+        headers = dict(scope.get("headers", []))
+        token = None
+
+        autorizacao = headers.get(b"authorization", b"").decode("latin-1")
+        if autorizacao.startswith("Bearer "):
+            token = autorizacao[len("Bearer "):]
+        elif b"cookie" in headers:
+            cookie = SimpleCookie()
+            cookie.load(headers[b"cookie"].decode("latin-1"))
+            if "access_token" in cookie:
+                token = cookie["access_token"].value
+
+        if not token:
+            return None
+
+        try:
+            return AccessToken(token).payload
+        except TokenError:
+            return None
+
+    def _filtro(self, claims):
+        loja_id = claims.get("loja_id")
+        if claims.get("is_loja") and loja_id:
+            return filtro_loja(loja_id)
+
+        return filtro_usuario(claims.get("user_id"))
+
+    async def _transmitir(self, claims, receive, send):
+        broker = get_broker()
+        assinatura = broker.assinar(self._filtro(claims))
+        desconectado = asyncio.ensure_future(self._aguardar_desconexao(receive))
+
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await self._enviar(send, b"retry: 5000\n\n")
+
+            while not desconectado.done():
+                restante = claims["exp"] - time.time()
+                if restante <= 0:
+                    await self._enviar(send, b"event: token_expirado\ndata: {}\n\n")
+                    break
+
+                proximo = asyncio.ensure_future(assinatura.fila.get())
+                await asyncio.wait(
+                    [proximo, desconectado],
+                    timeout=min(self.INTERVALO_HEARTBEAT, restante),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if not proximo.done():
+                    proximo.cancel()
+                    if not desconectado.done():
+                        await self._enviar(send, b": ping\n\n")
+                    continue
+
+                evento = proximo.result()
+                mensagem = f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+                await self._enviar(send, mensagem.encode())
+
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            pass
+        finally:
+            broker.cancelar(assinatura)
+            desconectado.cancel()
+
+    async def _aguardar_desconexao(self, receive):
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "http.disconnect":
+                return
+
+    async def _enviar(self, send, corpo):
+        await send({"type": "http.response.body", "body": corpo, "more_body": True})
+
+    async def _responder(self, send, status, dados):
+        corpo = json.dumps(dados).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(corpo)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": corpo})
@@ -1,3 +1,891 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.core.models import CoordenadaCep, LojaPerfil, Produto
+from apps.users.models import Endereco, Pagamento, User
+from apps.users.serializers import CustomTokenObtainPairSerializer
+
+from .eventos import STATUS_ALTERADO, BrokerMemoria, filtro_loja, filtro_usuario, publicar_evento_pedido
+from .models import Carrinho, CarrinhoItem, ChaveIdempotencia, Pedido, PedidoArquivado, PedidoItem, SequenciaPedidos
+from .sse import EventosPedidoASGI
+
+
+class PedidosTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dono, self.loja = self.criar_loja("loja1")
+        self.cliente, self.pagamento = self.criar_cliente("cliente1")
+        self.api_loja = self.autenticar(self.dono)
+        self.api_cliente = self.autenticar(self.cliente)
+        self.produto = Produto.objects.create(loja=self.loja, nome="Pastel", preco="10.00", quantidade=5)
+
+    def criar_loja(self, nome):
+        user = User.objects.create_user(username=nome, email=f"{nome}@teste.com", password="senha", loja=True)
+        return user, LojaPerfil.objects.create(user=user, nome=nome)
+
+    def criar_cliente(self, nome):
+        user = User.objects.create_user(username=nome, email=f"{nome}@teste.com", password="senha")
+        Endereco.objects.create(user=user, rua="Rua A", cidade="Recife", estado="PE", cep="50000-000")
+        return user, Pagamento.objects.create(user=user, metodo="pix", chave_pix="chave")
+
+    def autenticar(self, user):
+        api = APIClient()
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return api
+
+    def comprar(self, produto=None, quantidade=1, api=None, pagamento=None):
+        api = api or self.api_cliente
+        pagamento = pagamento or self.pagamento
+        resposta = api.post(
+            "/api/pedidos/carrinho/", {"produto": (produto or self.produto).id, "quantidade": quantidade}, format="json"
+        )
+        self.assertEqual(resposta.status_code, 201, resposta.content)
+        resposta = api.post("/api/pedidos/pagamento/pagar/", {"metodo_pagamento_id": pagamento.id}, format="json")
+        self.assertEqual(resposta.status_code, 201, resposta.content)
+        cache.clear()
+        return resposta.json()["pedidos"][0]
+
+    def alterar_status(self, pedido_id, dados):
+        return self.api_loja.patch(f"/api/pedidos/historico-loja/{pedido_id}/", dados, format="json")
+
+
+class TransicaoStatusTests(PedidosTestCase):
+    def test_fluxo_completo(self):
+        pedido_id = self.comprar()
+
+        for novo_status in (Pedido.PREPARANDO, Pedido.A_CAMINHO, Pedido.ENTREGUE):
+            resposta = self.alterar_status(pedido_id, {"status": novo_status})
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(resposta.json()["status"], novo_status)
+
+    def test_transicao_proibida(self):
+        pedido_id = self.comprar()
+
+        resposta = self.alterar_status(pedido_id, {"status": Pedido.ENTREGUE})
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(Pedido.objects.get(pk=pedido_id).status, Pedido.PENDENTE)
+
+    def test_sem_status_ou_com_o_atual_nao_altera(self):
+        pedido_id = self.comprar()
+        versao = Pedido.objects.get(pk=pedido_id).versao
+
+        for dados in ({}, {"status": Pedido.PENDENTE}):
+            resposta = self.alterar_status(pedido_id, dados)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(resposta.json()["status"], Pedido.PENDENTE)
+        self.assertEqual(Pedido.objects.get(pk=pedido_id).versao, versao)
+
+    def test_cancelamento_devolve_estoque(self):
+        pedido_id = self.comprar(quantidade=2)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 3)
+
+        resposta = self.alterar_status(pedido_id, {"status": Pedido.CANCELADO})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 5)
+
+    def test_cancelamento_religa_produto_esgotado_no_checkout(self):
+        pedido_id = self.comprar(quantidade=5)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 0)
+        self.assertFalse(self.produto.disponivel)
+
+        self.alterar_status(pedido_id, {"status": Pedido.CANCELADO})
+
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 5)
+        self.assertTrue(self.produto.disponivel)
+
+    def test_cancelamento_nao_religa_produto_desligado_pela_loja(self):
+        pedido_id = self.comprar(quantidade=5)
+        resposta = self.api_loja.patch(f"/api/core/produtos/{self.produto.id}/", {"disponivel": False}, format="json")
+        self.assertEqual(resposta.status_code, 200)
+
+        self.alterar_status(pedido_id, {"status": Pedido.CANCELADO})
+
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 5)
+        self.assertFalse(self.produto.disponivel)
+
+    def test_pedido_entregue_nao_devolve_estoque(self):
+        pedido_id = self.comprar(quantidade=2)
+        Pedido.objects.filter(pk=pedido_id).update(status=Pedido.ENTREGUE)
+
+        resposta = self.alterar_status(pedido_id, {"status": Pedido.CANCELADO})
+
+        self.assertEqual(resposta.status_code, 400)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 3)
+
+
+class VersaoPedidoTests(PedidosTestCase):
+    def sequencia(self):
+        return SequenciaPedidos.objects.get(loja=self.loja).valor
+
+    def test_transicao_rejeitada_nao_consome_versao(self):
+        pedido = Pedido.objects.get(pk=self.comprar())
+        valor = self.sequencia()
+
+        self.assertFalse(pedido.transicionar(Pedido.ENTREGUE))
+        self.assertFalse(pedido.transicionar(Pedido.PENDENTE))
+        self.assertEqual(Pedido.objects.filter(pk=pedido.pk).transicionar(Pedido.A_CAMINHO), [])
+
+        self.assertEqual(self.sequencia(), valor)
+
+    def test_transicao_aceita_consome_uma_versao(self):
+        pedido = Pedido.objects.get(pk=self.comprar())
+        valor = self.sequencia()
+
+        self.assertTrue(pedido.transicionar(Pedido.PREPARANDO))
+
+        self.assertEqual(self.sequencia(), valor + 1)
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).versao, valor + 1)
+
+    def test_save_so_versiona_alteracoes_de_conteudo(self):
+        pedido = Pedido.objects.get(pk=self.comprar())
+        valor = self.sequencia()
+
+        pedido.save()
+        pedido.save(update_fields=["atualizado_em"])
+        self.assertEqual(self.sequencia(), valor)
+
+        pedido.total = "99.00"
+        pedido.save()
+        self.assertEqual(self.sequencia(), valor + 1)
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).versao, valor + 1)
+
+
+class CarrinhoTests(PedidosTestCase):
+    def adicionar(self, produto=None, quantidade=1):
+        return self.api_cliente.post(
+            "/api/pedidos/carrinho/", {"produto": (produto or self.produto).id, "quantidade": quantidade}, format="json"
+        )
+
+    def test_adicionar_soma_em_uma_escrita(self):
+        self.adicionar(quantidade=2)
+
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.adicionar(quantidade=3)
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()["quantidade"], 5)
+        self.assertEqual(CarrinhoItem.objects.get().quantidade, 5)
+        consultas_itens = [q["sql"] for q in contexto.captured_queries if "pedidos_carrinhoitem" in q["sql"]]
+        self.assertEqual(len(consultas_itens), 1)
+
+    def test_soma_acima_do_estoque(self):
+        self.adicionar(quantidade=4)
+
+        resposta = self.adicionar(quantidade=2)
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(CarrinhoItem.objects.get().quantidade, 4)
+
+    def test_uma_loja_por_vez(self):
+        _, loja2 = self.criar_loja("loja2")
+        produto2 = Produto.objects.create(loja=loja2, nome="Coxinha", preco="5.00", quantidade=5)
+        self.adicionar()
+
+        self.assertEqual(self.adicionar(produto2).status_code, 400)
+
+        self.api_cliente.post("/api/pedidos/carrinho/remover-item/", {"produto": self.produto.id}, format="json")
+        self.assertEqual(self.adicionar(produto2).status_code, 201)
+        self.assertEqual(Carrinho.objects.get(user=self.cliente).loja_id, loja2.id)
+
+
+class CarrinhoLoteTests(PedidosTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outro = Produto.objects.create(loja=self.loja, nome="Coxinha", preco="5.00", quantidade=5)
+        self.terceiro = Produto.objects.create(loja=self.loja, nome="Empada", preco="6.00", quantidade=5)
+
+    def lote(self, *operacoes):
+        return self.api_cliente.post("/api/pedidos/carrinho/lote/", {"operacoes": list(operacoes)}, format="json")
+
+    def itens(self):
+        return dict(CarrinhoItem.objects.values_list("produto_id", "quantidade"))
+
+    def test_aplica_todas_as_acoes(self):
+        self.lote({"produto": self.produto.id, "quantidade": 2}, {"produto": self.outro.id, "quantidade": 1})
+
+        resposta = self.lote(
+            {"produto": self.produto.id, "quantidade": 1},
+            {"produto": self.produto.id, "quantidade": 2},
+            {"produto": self.outro.id, "acao": "remover"},
+            {"produto": self.terceiro.id, "acao": "definir", "quantidade": 4},
+        )
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.itens(), {self.produto.id: 5, self.terceiro.id: 4})
+        self.assertEqual(len(resposta.json()["items"]), 2)
+        self.assertEqual(Carrinho.objects.get(user=self.cliente).loja_id, self.loja.id)
+
+    def test_falha_nao_aplica_nada(self):
+        self.lote({"produto": self.produto.id, "quantidade": 2})
+
+        resposta = self.lote(
+            {"produto": self.outro.id, "quantidade": 1},
+            {"produto": self.produto.id, "acao": "definir", "quantidade": 6},
+            {"produto": 999999},
+        )
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual([erro["indice"] for erro in resposta.json()["erros"]], [1, 2])
+        self.assertEqual(self.itens(), {self.produto.id: 2})
+
+    def test_uma_loja_por_vez(self):
+        _, loja2 = self.criar_loja("loja2")
+        produto2 = Produto.objects.create(loja=loja2, nome="Pastel", preco="5.00", quantidade=5)
+        self.lote({"produto": self.produto.id})
+
+        self.assertEqual(self.lote({"produto": produto2.id}).status_code, 400)
+
+        resposta = self.lote({"produto": self.produto.id, "acao": "remover"}, {"produto": produto2.id})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(Carrinho.objects.get(user=self.cliente).loja_id, loja2.id)
+
+    def test_esvaziar_libera_a_loja(self):
+        self.lote({"produto": self.produto.id})
+
+        resposta = self.lote({"produto": self.produto.id, "acao": "definir", "quantidade": 0})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.itens(), {})
+        self.assertIsNone(Carrinho.objects.get(user=self.cliente).loja_id)
+
+
+class RepetirPedidoTests(PedidosTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pedido_id = self.comprar(quantidade=2)
+
+    def repetir(self, sufixo=""):
+        return self.api_cliente.post(f"/api/pedidos/historico-pedidos/{self.pedido_id}/repetir/{sufixo}")
+
+    def itens(self):
+        return dict(CarrinhoItem.objects.values_list("produto_id", "quantidade"))
+
+    def test_copia_os_itens(self):
+        resposta = self.repetir()
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["avisos"], [])
+        self.assertEqual(self.itens(), {self.produto.id: 2})
+
+    def test_ajusta_ao_estoque_e_ignora_indisponiveis(self):
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade=1)
+
+        resposta = self.repetir()
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()["avisos"]), 1)
+        self.assertEqual(self.itens(), {self.produto.id: 1})
+
+        CarrinhoItem.objects.all().delete()
+        Produto.objects.filter(pk=self.produto.pk).update(disponivel=False)
+        resposta = self.repetir()
+        self.assertEqual(resposta.json()["avisos"][0]["detail"], "Produto indisponível.")
+        self.assertEqual(self.itens(), {})
+
+    def test_carrinho_de_outra_loja(self):
+        _, loja2 = self.criar_loja("loja2")
+        produto2 = Produto.objects.create(loja=loja2, nome="Coxinha", preco="5.00", quantidade=5)
+        self.api_cliente.post("/api/pedidos/carrinho/", {"produto": produto2.id, "quantidade": 1}, format="json")
+
+        resposta = self.repetir()
+        self.assertEqual(resposta.status_code, 409)
+        self.assertIn("loja2", resposta.json()["aviso"])
+        self.assertEqual(self.itens(), {produto2.id: 1})
+
+        resposta = self.repetir("?substituir=true")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.itens(), {self.produto.id: 2})
+        self.assertEqual(Carrinho.objects.get(user=self.cliente).loja_id, self.loja.id)
+
+    def test_nada_a_adicionar_mantem_o_carrinho(self):
+        _, loja2 = self.criar_loja("loja2")
+        produto2 = Produto.objects.create(loja=loja2, nome="Coxinha", preco="5.00", quantidade=5)
+        self.api_cliente.post("/api/pedidos/carrinho/", {"produto": produto2.id, "quantidade": 1}, format="json")
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade=0)
+
+        resposta = self.repetir("?substituir=true")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.itens(), {produto2.id: 1})
+
+    def test_pedido_de_outro_usuario(self):
+        outro, _ = self.criar_cliente("cliente2")
+
+        resposta = self.autenticar(outro).post(f"/api/pedidos/historico-pedidos/{self.pedido_id}/repetir/")
+
+        self.assertEqual(resposta.status_code, 404)
+
+
+class EventosSSETests(SimpleTestCase):
+    def token(self, duracao=timedelta(minutes=5), **claims):
+        token = AccessToken()
+        token.set_exp(lifetime=duracao)
+        for chave, valor in claims.items():
+            token[chave] = valor
+        return str(token)
+
+    def evento(self, **campos):
+        # Como chega pelo BrokerRedis: IDs passados pelo JSON.
+        evento = {"tipo": STATUS_ALTERADO, "pedido": 1, "user": 9, "loja": 7, "status": Pedido.PREPARANDO}
+        evento.update(campos)
+        return json.loads(json.dumps(evento))
+
+    async def conectar(self, broker, token=None, method="GET"):
+        enviados = []
+        desconectar = asyncio.Event()
+
+        async def receive():
+            await desconectar.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(mensagem):
+            enviados.append(mensagem)
+
+        headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+        scope = {"type": "http", "path": "/api/pedidos/eventos/", "method": method, "headers": headers}
+        with mock.patch("apps.pedidos.sse.get_broker", return_value=broker):
+            tarefa = asyncio.ensure_future(EventosPedidoASGI(None)(scope, receive, send))
+            for _ in range(100):
+                if tarefa.done() or broker._assinaturas:
+                    break
+                await asyncio.sleep(0.01)
+        return tarefa, desconectar, enviados
+
+    def corpo(self, enviados):
+        return b"".join(mensagem.get("body", b"") for mensagem in enviados).decode()
+
+    async def test_sem_token(self):
+        tarefa, _, enviados = await self.conectar(BrokerMemoria())
+        await tarefa
+
+        self.assertEqual(enviados[0]["status"], 401)
+
+    async def test_loja_recebe_so_os_seus_eventos(self):
+        broker = BrokerMemoria()
+        tarefa, desconectar, enviados = await self.conectar(broker, self.token(is_loja=True, loja_id=7))
+
+        broker.distribuir(self.evento(loja="7"))
+        broker.distribuir(self.evento(loja=8, pedido=2))
+        await asyncio.sleep(0.05)
+        desconectar.set()
+        await tarefa
+
+        self.assertEqual(enviados[0]["status"], 200)
+        corpo = self.corpo(enviados)
+        self.assertEqual(corpo.count("event: status_alterado"), 1)
+        self.assertIn('"pedido": 1', corpo)
+        self.assertFalse(broker._assinaturas)
+
+    async def test_cliente_recebe_os_proprios_pedidos(self):
+        broker = BrokerMemoria()
+        tarefa, desconectar, enviados = await self.conectar(broker, self.token(user_id="9"))
+
+        broker.distribuir(self.evento())
+        broker.distribuir(self.evento(user=10, pedido=2))
+        await asyncio.sleep(0.05)
+        desconectar.set()
+        await tarefa
+
+        self.assertEqual(self.corpo(enviados).count("event: status_alterado"), 1)
+
+    async def test_encerra_quando_o_token_expira(self):
+        broker = BrokerMemoria()
+        tarefa, _, enviados = await self.conectar(broker, self.token(duracao=timedelta(seconds=2), user_id=9))
+
+        await asyncio.wait_for(tarefa, timeout=5)
+
+        self.assertIn("event: token_expirado", self.corpo(enviados))
+        self.assertFalse(enviados[-1]["more_body"])
+        self.assertFalse(broker._assinaturas)
+
+
+class BrokerEventosTests(TestCase):
+    def test_filtros_comparam_ids_como_texto(self):
+        self.assertTrue(filtro_loja(7)({"loja": "7"}))
+        self.assertTrue(filtro_loja("7")({"loja": 7}))
+        self.assertFalse(filtro_loja(7)({"loja": 70}))
+        self.assertTrue(filtro_usuario(9)({"user": "9"}))
+
+    def test_distribui_para_as_assinaturas_do_filtro(self):
+        broker = BrokerMemoria()
+        da_loja = broker.assinar_sincrono(filtro_loja(7))
+        de_outra = broker.assinar_sincrono(filtro_loja(8))
+
+        broker.publicar({"loja": 7, "user": 1})
+
+        self.assertTrue(da_loja.aguardar(0))
+        self.assertFalse(de_outra.aguardar(0))
+
+        broker.cancelar(da_loja)
+        broker.publicar({"loja": 7, "user": 1})
+        self.assertFalse(da_loja.aguardar(0))
+
+    def test_publica_apos_o_commit(self):
+        broker = BrokerMemoria()
+        assinatura = broker.assinar_sincrono(filtro_loja(7))
+
+        with mock.patch("apps.pedidos.eventos.get_broker", return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                publicar_evento_pedido(STATUS_ALTERADO, 1, 9, 7, Pedido.PREPARANDO)
+                self.assertFalse(assinatura.aguardar(0))
+
+        self.assertTrue(assinatura.aguardar(0))
+
+
+class AlteracoesPedidoTests(PedidosTestCase):
+    url = "/api/pedidos/historico-loja/alteracoes/"
+
+    def alteracoes(self, **params):
+        return self.api_loja.get(self.url, {"espera": 0, **params})
+
+    def test_sem_cursor_devolve_o_atual(self):
+        self.assertEqual(self.alteracoes().json(), {"cursor": "v0-0", "mais": False, "pedidos": []})
+
+        pedido_id = self.comprar()
+
+        self.assertEqual(self.alteracoes().json()["cursor"], f"v{Pedido.objects.get(pk=pedido_id).versao}-{pedido_id}")
+
+    def test_alteracoes_desde_o_cursor(self):
+        primeiro = self.comprar()
+        cursor = self.alteracoes().json()["cursor"]
+        segundo = self.comprar()
+        self.alterar_status(primeiro, {"status": Pedido.PREPARANDO})
+
+        dados = self.alteracoes(cursor=cursor).json()
+
+        self.assertEqual([pedido["id"] for pedido in dados["pedidos"]], [segundo, primeiro])
+        self.assertNotIn("versao", dados["pedidos"][0])
+        self.assertFalse(dados["mais"])
+        self.assertEqual(self.alteracoes(cursor=dados["cursor"]).json()["pedidos"], [])
+
+    def test_pagina_as_alteracoes(self):
+        cursor = self.alteracoes().json()["cursor"]
+        ids = [self.comprar() for _ in range(3)]
+
+        with mock.patch("apps.pedidos.views.HistoricoLojaViewSet.LIMITE_ALTERACOES", 2):
+            primeira = self.alteracoes(cursor=cursor).json()
+            segunda = self.alteracoes(cursor=primeira["cursor"]).json()
+
+        self.assertTrue(primeira["mais"])
+        self.assertEqual([p["id"] for p in primeira["pedidos"] + segunda["pedidos"]], ids)
+        self.assertFalse(segunda["mais"])
+
+    def test_parametros_invalidos(self):
+        for params in ({"cursor": "12345"}, {"cursor": "v1-x"}, {"cursor": "v-1-2"}, {"espera": 11}):
+            with self.subTest(params=params):
+                self.assertEqual(self.api_loja.get(self.url, params).status_code, 400)
+
+    def test_apenas_lojas(self):
+        self.assertEqual(self.api_cliente.get(self.url, {"espera": 0}).status_code, 403)
+
+
+class IdempotenciaTests(PedidosTestCase):
+    def adicionar(self, chave, quantidade=1):
+        return self.api_cliente.post(
+            "/api/pedidos/carrinho/",
+            {"produto": self.produto.id, "quantidade": quantidade},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=chave,
+        )
+
+    def test_repeticao_devolve_a_resposta_gravada(self):
+        primeira = self.adicionar("chave-1")
+        segunda = self.adicionar("chave-1")
+
+        self.assertEqual(primeira.status_code, 201)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(segunda["Idempotent-Replayed"], "true")
+        self.assertEqual(CarrinhoItem.objects.get().quantidade, 1)
+
+    def test_chave_reusada_com_outro_corpo(self):
+        self.adicionar("chave-1")
+
+        resposta = self.adicionar("chave-1", quantidade=2)
+
+        self.assertEqual(resposta.status_code, 422)
+        self.assertEqual(CarrinhoItem.objects.get().quantidade, 1)
+
+    def test_chave_em_processamento(self):
+        self.adicionar("chave-1")
+        ChaveIdempotencia.objects.filter(chave="chave-1").update(status_code=None, resposta=None)
+
+        resposta = self.adicionar("chave-1")
+
+        self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(CarrinhoItem.objects.get().quantidade, 1)
+
+    def test_reserva_abandonada_e_reaproveitada(self):
+        self.adicionar("chave-1")
+        ChaveIdempotencia.objects.filter(chave="chave-1").update(
+            status_code=None, resposta=None, criado_em=timezone.now() - timedelta(hours=1)
+        )
+
+        resposta = self.adicionar("chave-1")
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", resposta)
+        self.assertEqual(CarrinhoItem.objects.get().quantidade, 2)
+
+    def test_excecao_libera_a_reserva(self):
+        with mock.patch.object(CarrinhoItem.objects, "somar", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.adicionar("chave-1")
+
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+        self.assertEqual(self.adicionar("chave-1").status_code, 201)
+
+    def test_reserva_concorrente_ja_liberada(self):
+        # A outra requisição reservou a chave e a liberou antes desta lê-la.
+        with mock.patch.object(ChaveIdempotencia.objects, "create", side_effect=IntegrityError):
+            resposta = self.adicionar("chave-1")
+
+        self.assertEqual(resposta.status_code, 409)
+        self.assertFalse(CarrinhoItem.objects.exists())
+
+
+class ConsultasListagemTests(PedidosTestCase):
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.api_cliente.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, contexto.captured_queries
+
+    def test_consultas_nao_crescem_com_os_pedidos(self):
+        self.produto.quantidade = 100
+        self.produto.save()
+        self.comprar()
+        urls = (
+            "/api/pedidos/historico-pedidos/",
+            "/api/pedidos/historico-pedidos/?fields=id,status",
+            "/api/pedidos/historico-pedidos/?detalhes=true",
+        )
+        poucos = {url: len(self.consultas(url)[1]) for url in urls}
+
+        for _ in range(4):
+            self.comprar()
+
+        for url in urls:
+            resposta, consultas = self.consultas(url)
+            self.assertEqual(resposta.json()["count"], 5)
+            self.assertEqual(len(consultas), poucos[url], url)
+
+    def test_fields_limita_colunas_e_relacoes(self):
+        self.comprar()
+
+        resposta, consultas = self.consultas("/api/pedidos/historico-pedidos/?fields=id,status")
+
+        self.assertEqual(set(resposta.json()["results"][0]), {"id", "status"})
+        sql = consultas[-1]["sql"]
+        self.assertIn('"status"', sql)
+        self.assertNotIn('"total"', sql)
+        self.assertNotIn("JOIN", sql)
+
+    def test_detalhes_carrega_relacoes_sem_n_mais_1(self):
+        self.comprar()
+
+        resposta, consultas = self.consultas("/api/pedidos/historico-pedidos/?detalhes=true")
+
+        pedido = resposta.json()["results"][0]
+        self.assertEqual(pedido["loja_nome"], "loja1")
+        self.assertEqual(pedido["itens"][0]["produto_nome"], "Pastel")
+        self.assertIn("JOIN", consultas[-2]["sql"])
+        self.assertIn("pedidos_pedidoitem", consultas[-1]["sql"])
+
+    def test_detalhe_mantem_formato_sem_parametro(self):
+        pedido_id = self.comprar()
+
+        simples = self.api_cliente.get(f"/api/pedidos/historico-pedidos/{pedido_id}/").json()
+        detalhado = self.api_cliente.get(f"/api/pedidos/historico-pedidos/{pedido_id}/?detalhes=true").json()
+
+        self.assertNotIn("itens", simples)
+        self.assertEqual(len(detalhado["itens"]), 1)
+
+
+class GeocodificacaoEnderecoTests(PedidosTestCase):
+    def setUp(self):
+        super().setUp()
+        CoordenadaCep.objects.create(prefixo="500", cidade="Recife", estado="PE", latitude=-8.05, longitude=-34.9)
+        CoordenadaCep.objects.create(prefixo="010", cidade="São Paulo", estado="SP", latitude=-23.55, longitude=-46.63)
+        self.usuario = User.objects.create_user(username="sem_endereco", email="sem@teste.com", password="senha")
+        self.api = self.autenticar(self.usuario)
+
+    def criar(self, **dados):
+        dados = {"rua": "Rua A", "numero": "1", "bairro": "Centro", "cidade": "Recife", "estado": "PE",
+                 "cep": "50010-000", **dados}
+        resposta = self.api.post("/api/pedidos/enderecos/", dados, format="json")
+        self.assertEqual(resposta.status_code, 201, resposta.content)
+        return Endereco.objects.get(user=self.usuario)
+
+    def alterar(self, endereco, dados):
+        resposta = self.api.patch(f"/api/pedidos/enderecos/{endereco.id}/", dados, format="json")
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        endereco.refresh_from_db()
+        return endereco
+
+    def test_criacao_completa_pelo_cep(self):
+        endereco = self.criar()
+
+        self.assertEqual((endereco.latitude, endereco.longitude), (-8.05, -34.9))
+        self.assertTrue(endereco.geohash)
+
+    def test_coordenadas_informadas_tem_precedencia(self):
+        endereco = self.criar(latitude=-8.1, longitude=-34.95)
+        self.assertEqual((endereco.latitude, endereco.longitude), (-8.1, -34.95))
+
+        endereco = self.alterar(endereco, {"cep": "01000-000", "latitude": -23.5, "longitude": -46.6})
+        self.assertEqual((endereco.latitude, endereco.longitude), (-23.5, -46.6))
+
+    def test_novo_cep_atualiza_coordenadas(self):
+        endereco = self.alterar(self.criar(), {"cep": "01000-000", "cidade": "São Paulo", "estado": "SP"})
+
+        self.assertEqual((endereco.latitude, endereco.longitude), (-23.55, -46.63))
+
+    def test_outra_alteracao_de_endereco_tambem_geocodifica(self):
+        endereco = self.criar(latitude=-8.1, longitude=-34.95)
+
+        endereco = self.alterar(endereco, {"rua": "Rua B"})
+
+        self.assertEqual((endereco.latitude, endereco.longitude), (-8.05, -34.9))
+
+    def test_endereco_sem_coordenadas_e_completado(self):
+        endereco = self.criar(cep="99999-999")
+        self.assertIsNone(endereco.latitude)
+        CoordenadaCep.objects.create(prefixo="999", cidade="X", estado="RS", latitude=-30.0, longitude=-51.0)
+
+        endereco = self.alterar(endereco, {"complemento": "Apto 2"})
+
+        self.assertEqual((endereco.latitude, endereco.longitude), (-30.0, -51.0))
+
+    def test_cep_desconhecido_limpa_coordenadas_antigas(self):
+        endereco = self.alterar(self.criar(), {"cep": "99999-999"})
+
+        self.assertIsNone(endereco.latitude)
+        self.assertEqual(endereco.geohash, "")
+
+
+class ResumoPedidosTests(PedidosTestCase):
+    url = "/api/pedidos/historico-pedidos/resumo/"
+
+    def resumo(self):
+        resposta = self.api_cliente.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_vem_do_cache(self):
+        self.comprar(quantidade=2)
+        self.assertEqual(self.resumo()["total_gasto"], "20.00")
+
+        with CaptureQueriesContext(connection) as contexto:
+            resumo = self.resumo()
+
+        self.assertEqual(resumo["por_status"][Pedido.PENDENTE], 1)
+        self.assertFalse([q for q in contexto.captured_queries if "pedidos_pedido" in q["sql"]])
+
+    def test_novo_pedido_atualiza_apos_o_commit(self):
+        self.assertEqual(self.resumo()["total_pedidos"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_cliente.post("/api/pedidos/carrinho/", {"produto": self.produto.id, "quantidade": 1}, format="json")
+            self.api_cliente.post(
+                "/api/pedidos/pagamento/pagar/", {"metodo_pagamento_id": self.pagamento.id}, format="json"
+            )
+            self.assertEqual(self.resumo()["total_pedidos"], 0)
+
+        resumo = self.resumo()
+        self.assertEqual(resumo["total_pedidos"], 1)
+        self.assertEqual(resumo["ultimo_pedido"]["loja"]["nome"], "loja1")
+
+    def test_mudancas_de_status_atualizam(self):
+        pedido_id, cancelado_pelo_cliente = self.comprar(), self.comprar()
+        cancelado_pela_loja = self.comprar()
+        self.resumo()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alterar_status(pedido_id, {"status": Pedido.PREPARANDO})
+        self.assertEqual(self.resumo()["por_status"][Pedido.PREPARANDO], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_cliente.post(
+                "/api/pedidos/historico-pedidos/cancelar/", {"pedido": cancelado_pelo_cliente}, format="json"
+            )
+        self.assertEqual(self.resumo()["por_status"][Pedido.CANCELADO], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_loja.patch(
+                "/api/pedidos/historico-loja/status/",
+                {"pedidos": [cancelado_pela_loja], "status": Pedido.CANCELADO},
+                format="json",
+            )
+        resumo = self.resumo()
+        self.assertEqual(resumo["por_status"][Pedido.CANCELADO], 2)
+        self.assertEqual(resumo["total_gasto"], "10.00")
+
+
+class ArquivoTests(PedidosTestCase):
+    def setUp(self):
+        super().setUp()
+        self.produto.quantidade = 100
+        self.produto.save()
+        self.pedidos = [self.comprar(quantidade=i + 1) for i in range(4)]
+        agora = timezone.now()
+        for dias, pedido_id in zip((500, 450, 420, 10), self.pedidos):
+            Pedido.objects.filter(pk=pedido_id).update(
+                criado_em=agora - timedelta(days=dias), status=Pedido.ENTREGUE
+            )
+        Pedido.objects.filter(pk=self.pedidos[1]).update(status=Pedido.CANCELADO)
+
+    def faturamento(self):
+        return self.api_loja.get(
+            "/api/pedidos/faturamento/periodo/", {"data_inicial": "2000-01-01", "data_final": "2100-01-01"}
+        ).json()
+
+    def resumo(self):
+        cache.clear()
+        return self.api_cliente.get("/api/pedidos/historico-pedidos/resumo/").json()
+
+    def test_arquivar_preserva_faturamento_e_resumo(self):
+        faturamento, resumo = self.faturamento(), self.resumo()
+
+        call_command("arquivar_pedidos", "--lote", "2", stdout=StringIO())
+
+        self.assertEqual(PedidoArquivado.objects.count(), 3)
+        self.assertEqual(list(Pedido.objects.values_list("id", flat=True)), [self.pedidos[3]])
+        self.assertEqual(self.faturamento(), faturamento)
+        self.assertEqual(self.resumo(), resumo)
+
+    def test_historico_com_periodo_inclui_arquivados(self):
+        antes = self.api_cliente.get("/api/pedidos/historico-pedidos/", {"desde": "2000-01-01"}).json()
+
+        call_command("arquivar_pedidos", stdout=StringIO())
+
+        depois = self.api_cliente.get("/api/pedidos/historico-pedidos/", {"desde": "2000-01-01"}).json()
+        self.assertEqual(depois, antes)
+        self.assertEqual(self.api_cliente.get("/api/pedidos/historico-pedidos/").json()["count"], 1)
+
+    def test_detalhe_de_pedido_arquivado(self):
+        call_command("arquivar_pedidos", stdout=StringIO())
+
+        resposta = self.api_cliente.get(f"/api/pedidos/historico-pedidos/{self.pedidos[0]}/?detalhes=true")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([item["produto_nome"] for item in resposta.json()["itens"]], ["Pastel"])
+        self.assertEqual(self.api_loja.get(f"/api/pedidos/historico-loja/{self.pedidos[0]}/").status_code, 200)
+        outro, _ = self.criar_cliente("cliente2")
+        resposta = self.autenticar(outro).get(f"/api/pedidos/historico-pedidos/{self.pedidos[0]}/")
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_repetir_pedido_arquivado(self):
+        call_command("arquivar_pedidos", stdout=StringIO())
+
+        resposta = self.api_cliente.post(f"/api/pedidos/historico-pedidos/{self.pedidos[1]}/repetir/")
+
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertEqual(resposta.json()["avisos"], [])
+        self.assertEqual(dict(CarrinhoItem.objects.values_list("produto_id", "quantidade")), {self.produto.id: 2})
+
+    def test_meus_pedidos_paginado_e_com_arquivo(self):
+        call_command("arquivar_pedidos", stdout=StringIO())
+
+        recentes = self.api_cliente.get("/api/pedidos/meus-pedidos/").json()
+        com_arquivo = self.api_cliente.get("/api/pedidos/meus-pedidos/", {"desde": "2000-01-01"}).json()
+
+        self.assertEqual([pedido["id"] for pedido in recentes["results"]], [self.pedidos[3]])
+        self.assertEqual([pedido["id"] for pedido in com_arquivo["results"]], self.pedidos[::-1])
+        self.assertEqual(self.api_cliente.get(f"/api/pedidos/meus-pedidos/{self.pedidos[0]}/").status_code, 200)
+
+    def test_periodo_pelo_dia_local(self):
+        # 02:30 UTC de 2024-03-02 ainda é 2024-03-01 em São Paulo.
+        Pedido.objects.filter(pk=self.pedidos[3]).update(
+            criado_em=datetime(2024, 3, 2, 2, 30, tzinfo=dt_timezone.utc)
+        )
+
+        def ids(**periodo):
+            resposta = self.api_cliente.get("/api/pedidos/historico-pedidos/", periodo)
+            return [pedido["id"] for pedido in resposta.json()["results"]]
+
+        self.assertEqual(ids(desde="2024-03-01", ate="2024-03-01"), [self.pedidos[3]])
+        self.assertEqual(ids(desde="2024-03-02", ate="2024-03-02"), [])
+
+
+class StatusLoteTests(PedidosTestCase):
+    def test_resultado_por_pedido(self):
+        pendente = self.comprar()
+        entregue = self.comprar()
+        Pedido.objects.filter(pk=entregue).update(status=Pedido.ENTREGUE)
+        _, loja2 = self.criar_loja("loja2")
+        produto2 = Produto.objects.create(loja=loja2, nome="Coxinha", preco="5.00", quantidade=5)
+        de_outra_loja = self.comprar(produto=produto2)
+
+        resposta = self.api_loja.patch(
+            "/api/pedidos/historico-loja/status/",
+            {"pedidos": [entregue, pendente, de_outra_loja, 999999, pendente], "status": Pedido.CANCELADO},
+            format="json",
+        )
+
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados["alterados"], 1)
+        self.assertEqual(
+            [(r["id"], r["sucesso"], r["status"]) for r in dados["resultados"]],
+            [
+                (entregue, False, Pedido.ENTREGUE),
+                (pendente, True, Pedido.CANCELADO),
+                (de_outra_loja, False, None),
+                (999999, False, None),
+            ],
+        )
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 4)
+        self.assertEqual(Pedido.objects.get(pk=de_outra_loja).status, Pedido.PENDENTE)
+
+    def test_apenas_lojas(self):
+        resposta = self.api_cliente.patch(
+            "/api/pedidos/historico-loja/status/", {"pedidos": [1], "status": Pedido.CANCELADO}, format="json"
+        )
+        self.assertEqual(resposta.status_code, 403)
+
+
+class NomeProdutoItemTests(PedidosTestCase):
+    def itens(self, pedido_id):
+        resposta = self.api_cliente.get(f"/api/pedidos/historico-pedidos/{pedido_id}/?detalhes=true")
+        self.assertEqual(resposta.status_code, 200)
+        return [(item["produto"], item["produto_nome"]) for item in resposta.json()["itens"]]
+
+    def test_guarda_o_nome_da_compra(self):
+        pedido_id = self.comprar()
+
+        self.produto.nome = "Pastel de vento"
+        self.produto.save()
+        self.assertEqual(self.itens(pedido_id), [(self.produto.id, "Pastel")])
+
+        self.produto.delete()
+        self.assertEqual(self.itens(pedido_id), [(None, "Pastel")])
+
+    def test_save_preenche_o_nome(self):
+        pedido = Pedido.objects.get(pk=self.comprar())
+
+        item = PedidoItem.objects.create(pedido=pedido, produto=self.produto, preco="10.00")
+
+        self.assertEqual(item.produto_nome, "Pastel")
@@ -1,16 +1,25 @@
+import time
 from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Pedido, Carrinho, CarrinhoItem, PedidoItem
+from .models import Pedido, Carrinho, CarrinhoItem, PedidoArquivado
 from apps.users.permissions import IsDonoeReadOnly
 from apps.users.models import Pagamento, Endereco
 from apps.core.models import Produto
-from .serializers import PedidoSerializer, CarrinhoSerializer, CarrinhoItemSerializer, CarrinhoAdicionarItemSerializer, MetodoPagamentoSerializer, PagamentoSerializer, AtualizarStatusPedidoSerializer, PedidoLojaSerializer, PagamentoSerializer, FinalizarPagamentoSerializer, FaturamentoFiltroSerializer, EnderecoSerializer, EnderecoCreateSerializer, CarrinhoRemoverItemSerializer, CarrinhoAlterarQuantidadeSerializer, CancelarPedidoSerializer
+from .serializers import PedidoSerializer, CarrinhoSerializer, CarrinhoItemSerializer, CarrinhoAdicionarItemSerializer, MetodoPagamentoSerializer, PagamentoSerializer, AtualizarStatusPedidoSerializer, PedidoLojaSerializer, PagamentoSerializer, FinalizarPagamentoSerializer, FaturamentoFiltroSerializer, EnderecoSerializer, EnderecoCreateSerializer, CarrinhoRemoverItemSerializer, CarrinhoAlterarQuantidadeSerializer, CancelarPedidoSerializer, CarrinhoLoteSerializer, AlteracoesPedidoFiltroSerializer, PeriodoHistoricoSerializer, AtualizarStatusLoteSerializer, PedidoDetalheSerializer
+from .eventos import filtro_loja, get_broker
+from .idempotencia import idempotente
+from .resumo import obter_resumo
+from .arquivo import HistoricoComArquivo, agregar_faturamento, filtrar_periodo
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from apps.core.pagination import DefaultPagination
+from apps.core.campos import CamposSelecionaveisMixin, Carga, PARAMETROS_CAMPOS
+from apps.core.geocodificacao import completar_coordenadas
 from rest_framework.decorators import action
-from django.db.models import Sum, Count, Avg
-from drf_yasg.utils import swagger_auto_schema
+from rest_framework.generics import get_object_or_404
+from django.http import Http404
+from drf_yasg.utils import swagger_auto_schema, no_body
 from drf_yasg import openapi
 
 @swagger_auto_schema(tags=["Carrinho"])
@@ -50,6 +59,9 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
         if self.action == "atualizar_quantidade":
             return CarrinhoAlterarQuantidadeSerializer
 
+        if self.action == "lote":
+            return CarrinhoLoteSerializer
+
         return CarrinhoSerializer
 
 
@@ -88,6 +100,7 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
             404: "Produto não encontrado"
         }
     )
+    @idempotente
     def create(self, request, *args, **kwargs):
         carrinho = self.get_object()
 
@@ -97,18 +110,17 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
         produto = serializer.validated_data["produto"]
         quantidade = serializer.validated_data["quantidade"]
 
-        if carrinho.items.exists():
-            item_existente = carrinho.items.first()
-            if item_existente.produto.loja != produto.loja:
-                return Response(
-                    {
-                        "detail": (
-                            "Você só pode adicionar itens de uma loja por vez. "
-                            f"Seu carrinho atual contém itens da loja '{item_existente.produto.loja.nome}'. "
-                            f"Esvazie o carrinho para comprar em '{produto.loja.nome}'."
-                        )
-                    }
-                )
+        if carrinho.loja_id and carrinho.loja_id != produto.loja_id and carrinho.items.exists():
+            return Response(
+                {
+                    "detail": (
+                        "Você só pode adicionar itens de uma loja por vez. "
+                        f"Seu carrinho atual contém itens da loja '{carrinho.loja.nome}'. "
+                        f"Esvazie o carrinho para comprar em '{produto.loja.nome}'."
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         if quantidade > produto.quantidade:
             return Response(
@@ -116,20 +128,17 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        item, created = CarrinhoItem.objects.get_or_create(
-            carrinho=carrinho,
-            produto=produto,
-            defaults={"quantidade": quantidade}
-        )
-
-        if not created:
-            if item.quantidade + quantidade > produto.quantidade:
+        with transaction.atomic():
+            item = CarrinhoItem.objects.somar(carrinho, produto, quantidade)
+            if item is None:
                 return Response(
                     {"detail": f"Quantidade total excede o estoque. Disponível: {produto.quantidade}."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            item.quantidade += quantidade
-            item.save()
+
+            if carrinho.loja_id != produto.loja_id:
+                carrinho.loja_id = produto.loja_id
+                carrinho.save(update_fields=["loja"])
 
         return Response(
             CarrinhoItemSerializer(item, context={"request": request}).data,
@@ -148,6 +157,7 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
         }
     )
     @action(detail=False, methods=["post"], url_path="remover-item")
+    @idempotente
     def remover_item(self, request):
         carrinho = self.get_object()
 
@@ -165,6 +175,7 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
             )
 
         item.delete()
+        carrinho.liberar_loja_se_vazio()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -183,6 +194,7 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
         }
     )
     @action(detail=False, methods=["post"], url_path="atualizar-quantidade")
+    @idempotente
     def atualizar_quantidade(self, request):
         carrinho = self.get_object()
 
@@ -212,103 +224,77 @@ class CarrinhoViewSet(viewsets.ModelViewSet):
         return Response(
             CarrinhoItemSerializer(item, context={"request": request}).data
         )
-    
-
-@swagger_auto_schema(tags=["Pedidos"])
-class PedidoViewSet(viewsets.ModelViewSet):
-    """
-    Endpoint responsável por listar e criar pedidos do usuário autenticado.
-
-    Operações:
-    - GET /pedidos/ → lista todos os pedidos do usuário.
-    - POST /pedidos/ → cria um novo pedido a partir do carrinho.
-    - GET /pedidos/{id}/ → visualiza os detalhes de um pedido.
-    """
-
-    serializer_class = PedidoSerializer
-    permission_classes = [IsAuthenticated]
-
-
-    @swagger_auto_schema(
-        tags=["Pedidos"],
-        operation_summary="Listar pedidos do usuário autenticado",
-        operation_description="Retorna a lista de pedidos feitos pelo usuário, ordenados do mais recente para o mais antigo.",
-        responses={200: PedidoSerializer(many=True)}
-    )
-    def get_queryset(self):
-        return Pedido.objects.filter(user=self.request.user).order_by("-criado_em")
-
 
     @swagger_auto_schema(
-        tags=["Pedidos"],
-        operation_summary="Criar pedido a partir do carrinho",
-        operation_description="Gera um pedido com base nos itens do carrinho do usuário autenticado. "
-                              "Após criar o pedido, o carrinho é esvaziado.",
-        request_body=openapi.Schema(
-            type=openapi.TYPE_OBJECT,
-            properties={
-                "metodo_pagamento": openapi.Schema(
-                    type=openapi.TYPE_INTEGER,
-                    description="ID do método de pagamento escolhido."
-                )
-            },
-            required=["metodo_pagamento"]
+        tags=["Carrinho"],
+        method="post",
+        operation_description=(
+            "Aplica várias operações no carrinho em uma única requisição.\n\n"
+            "- `adicionar`: soma a quantidade à já existente no carrinho\n"
+            "- `definir`: substitui a quantidade (0 remove o item)\n"
+            "- `remover`: retira o produto do carrinho\n\n"
+            "As operações são validadas em conjunto (estoque e **uma loja por vez**) "
+            "e aplicadas de forma atômica: se alguma falhar, nenhuma é aplicada."
         ),
+        request_body=CarrinhoLoteSerializer,
         responses={
-            201: openapi.Response("Pedido criado com sucesso", PedidoSerializer),
-            400: "Carrinho vazio ou método de pagamento inválido"
+            200: openapi.Response("Carrinho atualizado", CarrinhoSerializer),
+            400: "Operações inválidas, estoque insuficiente ou lojas diferentes"
         }
     )
-    @transaction.atomic
-    def create(self, request, *args, **kwargs):
-        user = request.user
-        metodo_pagamento_id = request.data.get("metodo_pagamento")
-        try:
-            endereco = Endereco.objects.get(user=user)
-        except Endereco.DoesNotExist:
-            return Response(
-                {"detail": "É necessário cadastrar um endereço de entrega antes de finalizar o pedido."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        carrinho = Carrinho.objects.filter(user=user).first()
-        if not carrinho or not carrinho.items.exists():
-            return Response(
-                {"detail": "Carrinho vazio."},
-                status=status.HTTP_400_BAD_REQUEST
+    @action(detail=False, methods=["post"], url_path="lote")
+    @idempotente
+    def lote(self, request):
+        carrinho = self.get_object()
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operacoes = serializer.validated_data["operacoes"]
+
+        with transaction.atomic():
+            itens = {item.produto_id: item for item in carrinho.items.all()}
+            produtos = Produto.objects.in_bulk(
+                {op["produto"] for op in operacoes} | set(itens)
             )
 
-        loja = carrinho.items.first().produto.loja
+            quantidades = {produto_id: item.quantidade for produto_id, item in itens.items()}
+            erros = []
 
-        pedido = Pedido.objects.create(
-            user=user,
-            loja=loja,
-            metodo_pagamento_id=metodo_pagamento_id,
-            total=carrinho.total
-        )
+            for indice, op in enumerate(operacoes):
+                produto = produtos.get(op["produto"])
+                if produto is None:
+                    erros.append({"indice": indice, "produto": op["produto"], "detail": "Produto não encontrado."})
+                    continue
 
-        for item in carrinho.items.all():
-            PedidoItem.objects.create(
-                pedido=pedido,
-                produto=item.produto,
-                preco=item.produto.preco,
-                quantidade=item.quantidade
-            )
+                if op["acao"] == "remover":
+                    nova_qtd = 0
+                elif op["acao"] == "definir":
+                    nova_qtd = op["quantidade"]
+                else:
+                    nova_qtd = quantidades.get(produto.id, 0) + op["quantidade"]
 
-        carrinho.items.all().delete()
+                if nova_qtd > produto.quantidade:
+                    erros.append({
+                        "indice": indice,
+                        "produto": produto.id,
+                        "detail": f"Estoque insuficiente. Disponível: {produto.quantidade}.",
+                    })
+                    continue
 
-        return Response(
-            PedidoSerializer(pedido).data,
-            status=status.HTTP_201_CREATED
-        )
+                quantidades[produto.id] = nova_qtd
+
+            lojas = {produtos[produto_id].loja_id for produto_id, qtd in quantidades.items() if qtd > 0}
+            if len(lojas) > 1:
+                erros.append({"detail": "Você só pode adicionar itens de uma loja por vez."})
+
+            if erros:
+                return Response({"erros": erros}, status=status.HTTP_400_BAD_REQUEST)
+
+            carrinho.sincronizar_itens(itens, quantidades, next(iter(lojas), None))
+
+        carrinho = Carrinho.objects.prefetch_related("items__produto").get(pk=carrinho.pk)
+        return Response(CarrinhoSerializer(carrinho, context={"request": request}).data)
 
-    @swagger_auto_schema(
-        tags=["Pedidos"],
-        operation_summary="Detalhes de um pedido",
-        operation_description="Retorna todas as informações de um pedido específico do usuário.",
-        responses={200: PedidoSerializer()}
-    )
-    def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
 
 @swagger_auto_schema(tags=["Pagamento"])
 class MetodoPagamentoViewSet(viewsets.ReadOnlyModelViewSet):
@@ -350,8 +336,218 @@ class MetodoPagamentoViewSet(viewsets.ReadOnlyModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
         
+class RepetirPedidoMixin:
+    """
+    Copia os itens de um pedido anterior do usuário para o carrinho.
+    """
+
+    @swagger_auto_schema(
+        tags=["Histórico Usuário"],
+        method="post",
+        operation_summary="Repetir pedido",
+        operation_description=(
+            "Copia os itens de um pedido anterior para o carrinho do usuário, em uma única operação.\n\n"
+            "- Os preços considerados são os **atuais** de cada produto\n"
+            "- Produtos indisponíveis ou sem estoque são ignorados\n"
+            "- Quantidades acima do estoque são ajustadas ao disponível\n"
+            "- Se o carrinho tiver itens de outra loja, a resposta é 409 e nada muda; "
+            "envie `?substituir=true` para trocá-los pelos itens do pedido\n"
+            "- Se nenhum item puder ser adicionado, o carrinho fica como estava\n\n"
+            "Retorna o carrinho e os avisos dos itens ignorados ou ajustados."
+        ),
+        request_body=no_body,
+        manual_parameters=[
+            openapi.Parameter(
+                "substituir", openapi.IN_QUERY,
+                description="Com `true`, esvazia um carrinho de outra loja antes de copiar os itens",
+                type=openapi.TYPE_BOOLEAN
+            ),
+        ],
+        responses={
+            200: openapi.Response("Carrinho atualizado", CarrinhoSerializer),
+            404: "Pedido não encontrado",
+            409: "O carrinho tem itens de outra loja"
+        }
+    )
+    @action(detail=True, methods=["post"], url_path="repetir")
+    @idempotente
+    def repetir(self, request, pk=None):
+        pedido = self.get_object()
+        substituir = request.query_params.get("substituir", "").lower() in ("1", "true")
+        avisos = []
+        adicionados = 0
+
+        with transaction.atomic():
+            carrinho, _ = Carrinho.objects.select_related("loja").get_or_create(user=request.user)
+            itens = {item.produto_id: item for item in carrinho.items.all()}
+
+            outra_loja = carrinho.loja_id not in (None, pedido.loja_id)
+            if outra_loja and not substituir:
+                return Response(
+                    {
+                        "detail": "O carrinho tem itens de outra loja.",
+                        "aviso": (
+                            f"Seu carrinho atual contém itens da loja '{carrinho.loja.nome}'. "
+                            "Repita com substituir=true para trocá-los pelos itens deste pedido."
+                        ),
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            if outra_loja:
+                quantidades = {produto_id: 0 for produto_id in itens}
+            else:
+                quantidades = {produto_id: item.quantidade for produto_id, item in itens.items()}
+
+            # Um pedido arquivado já traz os itens do arquivo; só os produtos são buscados.
+            prefetch_related_objects([pedido], "itens__produto")
+            for linha in pedido.itens.all():
+                produto = linha.produto
+                if produto is None or not (produto.active and produto.disponivel) or produto.quantidade == 0:
+                    avisos.append({
+                        "produto": linha.produto_id,
+                        "produto_nome": linha.produto_nome,
+                        "detail": "Produto indisponível.",
+                    })
+                    continue
+
+                desejada = quantidades.get(produto.id, 0) + linha.quantidade
+                if desejada > produto.quantidade:
+                    avisos.append({
+                        "produto": produto.id,
+                        "produto_nome": produto.nome,
+                        "detail": f"Quantidade ajustada ao estoque. Disponível: {produto.quantidade}.",
+                    })
+                quantidades[produto.id] = min(desejada, produto.quantidade)
+                adicionados += 1
+
+            # Nada a adicionar: o carrinho atual (mesmo o de outra loja) fica intacto.
+            if adicionados:
+                carrinho.sincronizar_itens(itens, quantidades, pedido.loja_id)
+
+        carrinho = Carrinho.objects.prefetch_related("items__produto").get(pk=carrinho.pk)
+        return Response({
+            "carrinho": CarrinhoSerializer(carrinho, context={"request": request}).data,
+            "avisos": avisos,
+        })
+
+
+PARAMETROS_PERIODO = [
+    openapi.Parameter(
+        "desde", openapi.IN_QUERY,
+        description="Pedidos criados a partir desta data (AAAA-MM-DD). Inclui pedidos arquivados.",
+        type=openapi.TYPE_STRING, format="date"
+    ),
+    openapi.Parameter(
+        "ate", openapi.IN_QUERY,
+        description="Pedidos criados até esta data (AAAA-MM-DD). Inclui pedidos arquivados.",
+        type=openapi.TYPE_STRING, format="date"
+    ),
+]
+
+
+PARAMETRO_DETALHES = openapi.Parameter(
+    "detalhes", openapi.IN_QUERY,
+    description="Com `true`, o pedido vem com itens, endereço e pagamento (PedidoDetalhe).",
+    type=openapi.TYPE_BOOLEAN
+)
+
+
+class PedidoDetalheMixin:
+    """
+    Com `?detalhes=true`, o detalhe e a listagem usam PedidoDetalheSerializer,
+    carregado com um SELECT com as relações e uma consulta para os itens,
+    não importa quantos pedidos haja na página. Sem o parâmetro, o formato
+    é o de sempre.
+    """
+
+    campos_carga_detalhe = {
+        "loja_nome": Carga("loja__nome", select_related=["loja"]),
+        "metodo_pagamento": Carga("metodo_pagamento__metodo", select_related=["metodo_pagamento"]),
+        "endereco": Carga(select_related=["endereco"]),
+        "itens": Carga(prefetch_related=["itens"]),
+    }
+
+    def detalhado(self):
+        if self.action not in ("list", "retrieve"):
+            return False
+        return self.request.query_params.get("detalhes", "").lower() in ("1", "true")
+
+    def get_serializer_class(self):
+        if self.detalhado():
+            return PedidoDetalheSerializer
+        return super().get_serializer_class()
+
+    def get_campos_carga(self):
+        if self.detalhado():
+            return self.campos_carga_detalhe
+        return super().get_campos_carga()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "retrieve" and self.detalhado():
+            queryset = queryset.com_detalhes()
+        return queryset
+
+
+class HistoricoArquivoMixin:
+    """
+    Listagem com `?desde=`/`?ate=`: filtra pelo período e, só nesse caso,
+    junta os pedidos arquivados (`get_queryset_arquivo`) aos recentes. Sem
+    período, a listagem lê apenas a tabela quente. O detalhe (e as actions
+    de `acoes_arquivo`) procura no arquivo o ID que não estiver na tabela
+    quente, para que todo ID listado possa ser aberto.
+    """
+
+    acoes_arquivo = ("retrieve", "repetir")
+
+    def get_queryset_arquivo(self):
+        """
+        Pedidos arquivados visíveis para o usuário, com o mesmo recorte de
+        `get_queryset`. Sem sobrescrever, a view não enxerga o arquivo.
+        """
+        return PedidoArquivado.objects.none()
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action not in self.acoes_arquivo:
+                raise
+
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        arquivado = get_object_or_404(
+            self.get_queryset_arquivo()
+            .select_related("endereco", "metodo_pagamento", "loja")
+            .prefetch_related("itens"),
+            pk=self.kwargs[lookup],
+        )
+        pedido = arquivado.como_pedido()
+        self.check_object_permissions(self.request, pedido)
+        return pedido
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != "list":
+            return queryset
+
+        serializer = PeriodoHistoricoSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            return queryset
+
+        periodo = serializer.validated_data
+        arquivados = filtrar_periodo(self.get_queryset_arquivo(), periodo.get("desde"), periodo.get("ate"))
+        if hasattr(self, "carregar_campos"):
+            arquivados = self.carregar_campos(arquivados)
+        return HistoricoComArquivo(
+            filtrar_periodo(queryset, periodo.get("desde"), periodo.get("ate")),
+            arquivados,
+        )
+
+
 @swagger_auto_schema(tags=["Histórico Usuário"])
-class HistoricoPedidoViewSet(viewsets.ReadOnlyModelViewSet):
+class HistoricoPedidoViewSet(HistoricoArquivoMixin, PedidoDetalheMixin, CamposSelecionaveisMixin, RepetirPedidoMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = DefaultPagination
@@ -359,37 +555,71 @@ class HistoricoPedidoViewSet(viewsets.ReadOnlyModelViewSet):
         if getattr(self, "swagger_fake_view", False):
             return Pedido.objects.none()
 
-        status_visiveis = [
-            "entregue", "Entregue", 
-            "cancelado", "Cancelado", 
-            "pendente", "Pendente", 
-            "a caminho", "A caminho", "A Caminho",
-            "preparando", "Preparando"
-        ]
+        return Pedido.objects.filter(user=self.request.user).order_by("-criado_em")
 
-        return Pedido.objects.filter(
-            user=self.request.user,
-            status__in=status_visiveis
-        ).order_by("-criado_em")
+    def get_queryset_arquivo(self):
+        return PedidoArquivado.objects.filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action == "cancelar":
             return CancelarPedidoSerializer
-        return PedidoSerializer
+        return super().get_serializer_class()
 
     def get_serializer(self, *args, **kwargs):
         if self.action == "cancelar":
             kwargs.setdefault("user", self.request.user)
         return super().get_serializer(*args, **kwargs)
 
+    @swagger_auto_schema(
+        tags=["Histórico Usuário"],
+        operation_summary="Listar pedidos do usuário",
+        operation_description="Com `desde`/`ate`, a lista inclui os pedidos já arquivados do período.",
+        manual_parameters=PARAMETROS_CAMPOS + PARAMETROS_PERIODO + [PARAMETRO_DETALHES],
+        responses={200: PedidoSerializer(many=True)}
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @swagger_auto_schema(
         tags=["Histórico Usuário"],
         operation_summary="Detalhar pedido específico",
+        operation_description=(
+            "Com `?detalhes=true`, a resposta segue PedidoDetalhe: inclui os itens "
+            "(com o nome do produto), o endereço de entrega e o pagamento."
+        ),
+        manual_parameters=[PARAMETRO_DETALHES],
         responses={200: PedidoSerializer}
     )
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        tags=["Histórico Usuário"],
+        method="get",
+        operation_summary="Resumo dos pedidos do usuário",
+        operation_description=(
+            "Quantidade de pedidos por status, total gasto (sem os cancelados) e o último pedido. "
+            "Vem do cache e é atualizado a cada novo pedido ou mudança de status."
+        ),
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "total_pedidos": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "por_status": openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        additional_properties=openapi.Schema(type=openapi.TYPE_INTEGER)
+                    ),
+                    "total_gasto": openapi.Schema(type=openapi.TYPE_STRING),
+                    "ultimo_pedido": openapi.Schema(type=openapi.TYPE_OBJECT, x_nullable=True),
+                }
+            )
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="resumo")
+    def resumo(self, request):
+        return Response(obter_resumo(request.user.id))
+
     @swagger_auto_schema(
         tags=["Histórico Usuário"],
         method="post",
@@ -402,26 +632,37 @@ class HistoricoPedidoViewSet(viewsets.ReadOnlyModelViewSet):
         }
     )
     @action(detail=False, methods=["post"], url_path="cancelar")
+    @idempotente
     def cancelar(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         pedido = serializer.validated_data["pedido"]
-        pedido.status = "cancelado" 
-        pedido.save()
+        if not pedido.transicionar(Pedido.CANCELADO):
+            return Response(
+                {"detail": "Este pedido não pode mais ser cancelado."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         return Response(PedidoSerializer(pedido).data)
     
 @swagger_auto_schema(tags=["Histórico Loja"])
-class HistoricoLojaViewSet(mixins.ListModelMixin,mixins.RetrieveModelMixin,mixins.UpdateModelMixin,viewsets.GenericViewSet):
+class HistoricoLojaViewSet(HistoricoArquivoMixin, PedidoDetalheMixin, CamposSelecionaveisMixin, mixins.ListModelMixin,mixins.RetrieveModelMixin,mixins.UpdateModelMixin,viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
     http_method_names = ["get", "patch", "put", "head", "options"]
+    serializer_class = PedidoLojaSerializer
     pagination_class = DefaultPagination
+    LIMITE_ALTERACOES = 100
+    campos_carga = {
+        "endereco": Carga(select_related=["endereco"]),
+    }
 
     def get_serializer_class(self):
         if self.action in ["partial_update", "update"]:
             return AtualizarStatusPedidoSerializer
-        return PedidoLojaSerializer
+        if self.action == "atualizar_status_lote":
+            return AtualizarStatusLoteSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         payload = self.request.auth or {}
@@ -432,9 +673,17 @@ class HistoricoLojaViewSet(mixins.ListModelMixin,mixins.RetrieveModelMixin,mixin
 
         return Pedido.objects.filter(loja_id=loja_id).order_by("-criado_em")
 
+    def get_queryset_arquivo(self):
+        loja_id = (self.request.auth or {}).get("loja_id")
+        if not loja_id:
+            return PedidoArquivado.objects.none()
+        return PedidoArquivado.objects.filter(loja_id=loja_id)
+
     @swagger_auto_schema(
         tags = ["Histórico Loja"],
         operation_summary="Listar pedidos da loja",
+        operation_description="Com `desde`/`ate`, a lista inclui os pedidos já arquivados do período.",
+        manual_parameters=PARAMETROS_CAMPOS + PARAMETROS_PERIODO + [PARAMETRO_DETALHES],
         responses={200: PedidoLojaSerializer(many=True)}
     )
     def list(self, request, *args, **kwargs):
@@ -443,6 +692,11 @@ class HistoricoLojaViewSet(mixins.ListModelMixin,mixins.RetrieveModelMixin,mixin
     @swagger_auto_schema(
         tags = ["Histórico Loja"],
         operation_summary="Detalhar um pedido",
+        operation_description=(
+            "Com `?detalhes=true`, a resposta segue PedidoDetalhe: inclui os itens "
+            "(com o nome do produto), o endereço de entrega e o pagamento."
+        ),
+        manual_parameters=[PARAMETRO_DETALHES],
         responses={200: PedidoLojaSerializer()}
     )
     def retrieve(self, request, *args, **kwargs):
@@ -451,9 +705,14 @@ class HistoricoLojaViewSet(mixins.ListModelMixin,mixins.RetrieveModelMixin,mixin
     @swagger_auto_schema(
         tags=["Histórico Loja"],
         operation_summary="Atualizar status do pedido (parcial)",
-        operation_description="Permite atualizar parcialmente o status de um pedido da loja.",
+        operation_description=(
+            "Permite atualizar parcialmente o status de um pedido da loja.\n\n"
+            "**Transições permitidas:** `pendente` → `preparando` → `a caminho` → `entregue`. "
+            "Pedidos `pendente` ou `preparando` também podem ser `cancelado` (o estoque é devolvido). "
+            "Sem `status`, ou com o status atual, o pedido é devolvido sem alteração."
+        ),
         request_body=AtualizarStatusPedidoSerializer,
-        responses={200: PedidoLojaSerializer()}
+        responses={200: PedidoLojaSerializer(), 400: "Transição de status não permitida"}
     )
     def partial_update(self, request, *args, **kwargs):
         pedido = self.get_object()
@@ -469,8 +728,15 @@ class HistoricoLojaViewSet(mixins.ListModelMixin,mixins.RetrieveModelMixin,mixin
         serializer = AtualizarStatusPedidoSerializer(pedido, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
 
-        pedido.status = serializer.validated_data["status"]
-        pedido.save()
+        novo_status = serializer.validated_data.get("status", pedido.status)
+        if novo_status == pedido.status:
+            # Sem status ou com o atual: nada a fazer.
+            return Response(PedidoLojaSerializer(pedido).data)
+        if not pedido.transicionar(novo_status):
+            return Response(
+                {"detail": f"Não é possível alterar o status de '{pedido.status}' para '{novo_status}'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         return Response(PedidoLojaSerializer(pedido).data)
     
@@ -484,6 +750,173 @@ class HistoricoLojaViewSet(mixins.ListModelMixin,mixins.RetrieveModelMixin,mixin
     def update(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        tags=["Histórico Loja"],
+        method="patch",
+        operation_summary="Atualizar o status de vários pedidos",
+        operation_description=(
+            "Aplica a mesma transição a até 100 pedidos da loja do token (`loja_id`) "
+            "em uma única requisição. Cada pedido é alterado só se o status atual "
+            "permitir a transição; os demais são informados em `resultados`, "
+            "na ordem enviada, sem afetar os outros."
+        ),
+        request_body=AtualizarStatusLoteSerializer,
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "status": openapi.Schema(type=openapi.TYPE_STRING),
+                    "alterados": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "resultados": openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                "id": openapi.Schema(type=openapi.TYPE_INTEGER),
+                                "sucesso": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                                "status": openapi.Schema(type=openapi.TYPE_STRING, x_nullable=True),
+                                "detail": openapi.Schema(type=openapi.TYPE_STRING),
+                            }
+                        )
+                    ),
+                }
+            ),
+            400: "Dados inválidos",
+            403: "Apenas lojas podem alterar pedidos"
+        }
+    )
+    @action(detail=False, methods=["patch"], url_path="status")
+    def atualizar_status_lote(self, request):
+        loja_id = (request.auth or {}).get("loja_id")
+        if not loja_id:
+            return Response(
+                {"detail": "Apenas lojas podem alterar pedidos."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["pedidos"]
+        novo_status = serializer.validated_data["status"]
+
+        # Um UPDATE condicionado ao status atual para todos os pedidos elegíveis.
+        alterados = set(Pedido.objects.filter(loja_id=loja_id, pk__in=ids).transicionar(novo_status))
+        restantes = dict(
+            Pedido.objects.filter(loja_id=loja_id, pk__in=set(ids) - alterados).values_list("id", "status")
+        )
+
+        resultados = []
+        for pedido_id in ids:
+            if pedido_id in alterados:
+                resultados.append({"id": pedido_id, "sucesso": True, "status": novo_status})
+            elif pedido_id in restantes:
+                resultados.append({
+                    "id": pedido_id,
+                    "sucesso": False,
+                    "status": restantes[pedido_id],
+                    "detail": f"Não é possível alterar o status de '{restantes[pedido_id]}' para '{novo_status}'.",
+                })
+            else:
+                resultados.append({
+                    "id": pedido_id, "sucesso": False, "status": None, "detail": "Pedido não encontrado.",
+                })
+
+        return Response({"status": novo_status, "alterados": len(alterados), "resultados": resultados})
+
+    @swagger_auto_schema(
+        tags=["Histórico Loja"],
+        method="get",
+        operation_summary="Alterações nos pedidos da loja (long-poll)",
+        operation_description=(
+            "Retorna apenas os pedidos criados ou alterados depois do `cursor` informado, "
+            "junto com o novo cursor a ser enviado na próxima chamada.\n\n"
+            "- Sem `cursor`, retorna imediatamente o cursor atual (use após carregar a lista)\n"
+            "- Se não houver alterações, a requisição aguarda até `espera` segundos antes de responder\n"
+            "- `mais = true` indica que há mais alterações pendentes; chame de novo sem esperar"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                "cursor", openapi.IN_QUERY,
+                description="Cursor retornado pela chamada anterior",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                "espera", openapi.IN_QUERY,
+                description="Tempo máximo de espera em segundos (0 a 10, padrão 5)",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "cursor": openapi.Schema(type=openapi.TYPE_STRING),
+                    "mais": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    "pedidos": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                }
+            ),
+            400: "Cursor inválido",
+            403: "Apenas lojas podem acessar"
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="alteracoes")
+    def alteracoes(self, request):
+        filtro = AlteracoesPedidoFiltroSerializer(data=request.query_params)
+        filtro.is_valid(raise_exception=True)
+        cursor = filtro.validated_data.get("cursor")
+        espera = filtro.validated_data["espera"]
+
+        loja_id = (request.auth or {}).get("loja_id")
+        if not loja_id:
+            return Response(
+                {"detail": "Apenas lojas podem acessar as alterações de pedidos."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        pedidos = Pedido.objects.filter(loja_id=loja_id)
+
+        if cursor is None:
+            ultimo = pedidos.order_by("-versao", "-id").only("id", "versao").first()
+            return Response({
+                "cursor": (
+                    AlteracoesPedidoFiltroSerializer.gerar_cursor(ultimo)
+                    if ultimo else AlteracoesPedidoFiltroSerializer.CURSOR_INICIAL
+                ),
+                "mais": False,
+                "pedidos": [],
+            })
+
+        limite = self.LIMITE_ALTERACOES
+        prazo = time.monotonic() + espera
+        broker = get_broker()
+        # Assina antes da primeira consulta para não perder eventos entre as duas.
+        assinatura = broker.assinar_sincrono(filtro_loja(loja_id))
+        try:
+            while True:
+                alterados = list(
+                    pedidos.alterados_desde(cursor).select_related("endereco")[:limite + 1]
+                )
+                restante = prazo - time.monotonic()
+                if alterados or restante <= 0:
+                    break
+                # Reconsulta periodicamente: eventos de outros processos podem não
+                # chegar pelo broker em memória.
+                assinatura.aguardar(min(restante, 2))
+        finally:
+            broker.cancelar(assinatura)
+
+        mais = len(alterados) > limite
+        alterados = alterados[:limite]
+
+        return Response({
+            "cursor": (
+                AlteracoesPedidoFiltroSerializer.gerar_cursor(alterados[-1])
+                if alterados else request.query_params["cursor"]
+            ),
+            "mais": mais,
+            "pedidos": PedidoLojaSerializer(alterados, many=True).data,
+        })
+
         
 @swagger_auto_schema(tags=["Pedidos"])
 class PedidoLojaViewSet(viewsets.ReadOnlyModelViewSet):
@@ -535,7 +968,8 @@ class PedidoLojaViewSet(viewsets.ReadOnlyModelViewSet):
         operation_summary="Atualizar status do pedido",
         operation_description=(
             "Atualiza o status de um pedido pertencente à loja identificada pelo token JWT (`loja_id`). "
-            "O corpo da requisição deve conter apenas o novo status."
+            "O corpo da requisição deve conter apenas o novo status, que precisa ser "
+            "uma transição válida a partir do status atual."
         ),
         request_body=AtualizarStatusPedidoSerializer,
         responses={
@@ -543,7 +977,7 @@ class PedidoLojaViewSet(viewsets.ReadOnlyModelViewSet):
                 type=openapi.TYPE_OBJECT,
                 properties={"mensagem": openapi.Schema(type=openapi.TYPE_STRING)}
             ),
-            400: "Dados inválidos",
+            400: "Dados inválidos ou transição de status não permitida",
             403: "Acesso negado",
             404: "Pedido não encontrado"
         }
@@ -563,29 +997,46 @@ class PedidoLojaViewSet(viewsets.ReadOnlyModelViewSet):
 
         serializer = AtualizarStatusPedidoSerializer(pedido, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+
+        novo_status = serializer.validated_data.get("status", pedido.status)
+        if novo_status == pedido.status:
+            # Sem status ou com o atual: nada a fazer.
+            return Response(PedidoLojaSerializer(pedido).data)
+        if not pedido.transicionar(novo_status):
+            return Response(
+                {"erro": f"Não é possível alterar o status de '{pedido.status}' para '{novo_status}'."},
+                status=400
+            )
 
         return Response({"mensagem": "Status atualizado com sucesso."})
     
 @swagger_auto_schema(tags=["Pedidos"])
-class MeusPedidosViewSet(viewsets.ReadOnlyModelViewSet):
+class MeusPedidosViewSet(HistoricoArquivoMixin, PedidoDetalheMixin, CamposSelecionaveisMixin, RepetirPedidoMixin, viewsets.ReadOnlyModelViewSet):
     """
     Endpoints do cliente para visualizar e cancelar pedidos.
     """
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DefaultPagination
+
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return Pedido.objects.none()
+
+        return Pedido.objects.filter(user=self.request.user).order_by("-criado_em")
+
+    def get_queryset_arquivo(self):
+        return PedidoArquivado.objects.filter(user=self.request.user)
 
     @swagger_auto_schema(
         tags = ["Pedidos"],
         operation_summary="Listar pedidos do cliente",
+        operation_description="Com `desde`/`ate`, a lista inclui os pedidos já arquivados do período.",
+        manual_parameters=PARAMETROS_CAMPOS + PARAMETROS_PERIODO + [PARAMETRO_DETALHES],
         responses={200: PedidoSerializer(many=True)}
     )
-
-    def get_queryset(self):
-        if getattr(self, "swagger_fake_view", False):
-            return Pedido.objects.none()
-
-        return Pedido.objects.filter(user=self.request.user)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     @swagger_auto_schema(
         tags = ["Pedidos"],
@@ -605,23 +1056,19 @@ class MeusPedidosViewSet(viewsets.ReadOnlyModelViewSet):
     def cancelar(self, request, *, pk=None):
         pedido = self.get_object()
 
-        status_cancelaveis = ["pendente", "preparando"]
-
-        if pedido.status not in status_cancelaveis:
+        if not pedido.transicionar(Pedido.CANCELADO):
             return Response(
                 {"erro": "Este pedido não pode mais ser cancelado."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        pedido.status = "cancelado"
-        pedido.save()
-
         return Response(PedidoSerializer(pedido).data)
 
 
 @swagger_auto_schema(tags=["Endereço"])
 class EnderecoViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsDonoeReadOnly]
+    campos_localizacao = ("cep", "rua", "numero", "bairro", "cidade", "estado")
 
 
     @swagger_auto_schema(
@@ -656,6 +1103,7 @@ class EnderecoViewSet(viewsets.ModelViewSet):
             400: "Erro na validação dos dados"
         }
     )
+    @idempotente
     def create(self, request, *args, **kwargs):
         if Endereco.objects.filter(user=request.user).exists():
                     return Response(
@@ -668,7 +1116,28 @@ class EnderecoViewSet(viewsets.ModelViewSet):
         return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user=self.request.user, **completar_coordenadas(serializer.validated_data))
+
+    def perform_update(self, serializer):
+        dados = serializer.validated_data
+        endereco = serializer.instance
+        if "latitude" in dados or "longitude" in dados:
+            serializer.save()
+            return
+
+        alterado = any(
+            dados.get(campo, getattr(endereco, campo)) != getattr(endereco, campo)
+            for campo in self.campos_localizacao
+        )
+        if not alterado and endereco.latitude is not None:
+            serializer.save()
+            return
+
+        # Endereço alterado (ou ainda sem coordenadas): as antigas não valem mais.
+        coordenadas = completar_coordenadas(
+            {"cep": dados.get("cep", endereco.cep), "latitude": None, "longitude": None}
+        )
+        serializer.save(latitude=coordenadas["latitude"], longitude=coordenadas["longitude"])
 
 
     @swagger_auto_schema(
@@ -721,6 +1190,7 @@ class EnderecoViewSet(viewsets.ModelViewSet):
 class PagamentoViewSet(viewsets.ModelViewSet):
     serializer_class = PagamentoSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = None
 
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
@@ -743,6 +1213,7 @@ class PagamentoViewSet(viewsets.ModelViewSet):
         request_body=PagamentoSerializer,
         responses={201: PagamentoSerializer},
     )
+    @idempotente
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
@@ -817,7 +1288,9 @@ class PagamentoViewSet(viewsets.ModelViewSet):
         methods=["POST"],
         url_path="pagar",
         serializer_class=FinalizarPagamentoSerializer,
+        throttle_scope="pagamento",
     )
+    @idempotente
     def pagar(self, request):
         serializer = FinalizarPagamentoSerializer(
             data=request.data,
@@ -945,16 +1418,15 @@ class FaturamentoViewSet(viewsets.ViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        pedidos = Pedido.objects.filter(
-            loja_id=loja_id,
-            status="entregue",
-            criado_em__date__range=[data_inicial, data_final]
-        )
-
-        resumo = pedidos.aggregate(
-            total_faturado=Sum("total"),
-            total_pedidos=Count("id"),
-            ticket_medio=Avg("total")
+        filtro = {
+            "loja_id": loja_id,
+            "status": Pedido.ENTREGUE,
+            "criado_em__date__range": [data_inicial, data_final],
+        }
+        # Pedidos antigos podem já ter ido para o arquivo; as duas tabelas contam.
+        resumo = agregar_faturamento(
+            Pedido.objects.filter(**filtro),
+            PedidoArquivado.objects.filter(**filtro),
         )
 
         return Response({
@@ -962,9 +1434,5 @@ class FaturamentoViewSet(viewsets.ViewSet):
                 "data_inicial": data_inicial,
                 "data_final": data_final
             },
-            "resumo": {
-                "total_faturado": resumo["total_faturado"] or 0,
-                "total_pedidos": resumo["total_pedidos"],
-                "ticket_medio": resumo["ticket_medio"] or 0
-            }
+            "resumo": resumo
         })
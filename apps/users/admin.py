@@ -22,6 +22,8 @@ class PedidoItemInline(admin.TabularInline):
     model = PedidoItem
     extra = 1
     autocomplete_fields = ("produto",)
+    # Gravado a partir do produto ao salvar (PedidoItem.save).
+    readonly_fields = ("produto_nome",)
 
 
 @admin.register(Pedido)
@@ -36,9 +38,10 @@ class PedidoAdmin(admin.ModelAdmin):
 
 @admin.register(PedidoItem)
 class PedidoItemAdmin(admin.ModelAdmin):
-    list_display = ("id", "pedido", "produto", "preco", "quantidade", "subtotal")
-    search_fields = ("pedido__id", "produto__nome")
+    list_display = ("id", "pedido", "produto_nome", "preco", "quantidade", "subtotal")
+    search_fields = ("pedido__id", "produto_nome")
     autocomplete_fields = ("pedido", "produto")
+    readonly_fields = ("produto_nome",)
 
     def subtotal(self, obj):
         return obj.preco * obj.quantidade
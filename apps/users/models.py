@@ -1,6 +1,9 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from apps.core import geo
+
 class User(AbstractUser):
     username = models.CharField(max_length=16, unique=True)
     nome = models.CharField(max_length=100, blank=True)
@@ -41,6 +44,27 @@ class Endereco(models.Model):
     estado = models.CharField(max_length=50)
     cep = models.CharField(max_length=10)
     complemento = models.CharField(max_length=255, blank=True)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    # Derivado de latitude/longitude em save(); é o índice da busca por proximidade.
+    geohash = models.CharField(max_length=geo.PRECISAO, blank=True, default="", db_index=True, editable=False)
 
     def __str__(self):
-        return f"{self.rua}, {self.numero} - {self.cidade}/{self.estado}"
\ No newline at end of file
+        return f"{self.rua}, {self.numero} - {self.cidade}/{self.estado}"
+
+    def atualizar_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ""
+        else:
+            self.geohash = geo.codificar(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.atualizar_geohash()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+        super().save(*args, **kwargs)
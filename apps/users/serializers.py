@@ -2,18 +2,22 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from .models import User, Endereco
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from apps.core.geocodificacao import completar_coordenadas
 
 class EnderecoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Endereco
-        fields = ["cep", "rua", "numero", "bairro", "cidade", "estado"]
+        fields = ["cep", "rua", "numero", "bairro", "cidade", "estado", "latitude", "longitude"]
+        # Nome distinto do EnderecoSerializer de pedidos no schema OpenAPI.
+        ref_name = "EnderecoCadastro"
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, style={'input_type': 'password'}, required=True)
+    endereco = EnderecoSerializer(write_only=True, required=False)
 
     class Meta:
         model = User
-        fields = ("id", "username", "email", "password", "loja", "nome")
+        fields = ("id", "username", "email", "password", "loja", "nome", "endereco")
 
     def validate_password(self, value):
         validate_password(value)
@@ -32,13 +36,14 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         user.set_password(validated_data['password'])
         user.save()
 
+        endereco = None
         if endereco_data:
-            from apps.users.models import Endereco
-            Endereco.objects.create(user=user, **endereco_data)
+            endereco = Endereco.objects.create(user=user, **completar_coordenadas(endereco_data))
 
         if user.loja:
             from apps.core.models import LojaPerfil
-            LojaPerfil.objects.get_or_create(user=user, nome=user.username)
+            # O endereço do cadastro é o da loja: sem ele, a busca por proximidade não a encontra.
+            LojaPerfil.objects.get_or_create(user=user, nome=user.username, defaults={"endereco": endereco})
 
         return user
 
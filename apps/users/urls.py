@@ -11,7 +11,7 @@ urlpatterns = [
     path("", ApiRootView.as_view(), name="api-root"),
     path("login/", LoginView.as_view(), name="login"),
     path("logout/", LogoutView.as_view(), name="logout"),
-    path("register/", UserViewSet.as_view({"post": "register"}), name="register"),
+    path("register/", UserViewSet.as_view({"post": "register"}, **UserViewSet.register.kwargs), name="register"),
     path("painel/usuario/", PainelUsuarioView.as_view(), name="painel-usuario"),
     path("painel/loja/", PainelLojaView.as_view(), name="painel-loja"),
 ]
@@ -53,6 +53,7 @@ class LoginView(APIView):
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
     authentication_classes = []  
+    throttle_scope = "login"
 
     @swagger_auto_schema(
         tags=["Autenticação"],
@@ -139,6 +140,7 @@ class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ["username", "nome"]
+    throttle_scope = None
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -160,7 +162,7 @@ class UserViewSet(viewsets.ModelViewSet):
         request_body=UserRegisterSerializer,
         responses={201: UserSerializer, 400: "Dados inválidos"}
     )
-    @action(detail=False, methods=["post"], permission_classes=[AllowAny])
+    @action(detail=False, methods=["post"], permission_classes=[AllowAny], throttle_scope="registro")
     def register(self, request):
         serializer = UserRegisterSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
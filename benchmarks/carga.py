@@ -0,0 +1,232 @@
+"""
+Cenário de carga HTTP contra um servidor local.
+
+Clientes e lojas virtuais (usuários `bench_c<N>` e `bench_l<N>` gerados por
+`manage.py seed_benchmark`) rodam em threads. Clientes fazem login, navegam
+no catálogo e nas lojas, montam o carrinho e finalizam a compra. Lojas
+consultam o painel: histórico, alterações e faturamento. O relatório traz
+latência por etapa, vazão e contagem de status HTTP. Respostas 429 do
+throttling aparecem separadas dos erros.
+
+    python manage.py runserver --noreload  # ou gunicorn/uvicorn
+    python -m benchmarks.carga --url http://127.0.0.1:8000 --clientes 20 --lojas 4 --duracao 60 --saida carga.json
+
+Só usa a biblioteca padrão, então pode rodar de outra máquina.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+from http.cookiejar import CookieJar
+
+from .relatorio import gravar, metadados, resumir_latencias
+
+
+class SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    # O login responde com redirect para o painel; só a resposta do login interessa.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Coletor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.status = defaultdict(lambda: defaultdict(int))
+
+    def registrar(self, etapa, duracao_ms, codigo):
+        with self._lock:
+            if codigo is not None and codigo < 400:
+                self.latencias[etapa].append(duracao_ms)
+            self.status[etapa][str(codigo)] += 1
+
+    def resumo(self):
+        cenarios = {}
+        for etapa in sorted(self.status):
+            contagem = dict(self.status[etapa])
+            falhas = sum(n for codigo, n in contagem.items() if codigo == "None" or int(codigo) >= 400)
+            limitadas = contagem.get("429", 0)
+            total = sum(contagem.values())
+            cenarios[etapa] = dict(
+                resumir_latencias(self.latencias[etapa]),
+                requisicoes=total,
+                limitadas=limitadas,
+                erros=falhas - limitadas,
+                status=contagem,
+            )
+        return cenarios
+
+
+class UsuarioVirtual(threading.Thread):
+    def __init__(self, url, username, senha, coletor, prazo, timeout):
+        super().__init__(daemon=True)
+        self.url = url.rstrip("/")
+        self.username = username
+        self.senha = senha
+        self.coletor = coletor
+        self.prazo = prazo
+        self.timeout = timeout
+        self.rng = random.Random(username)
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), SemRedirecionamento()
+        )
+
+    def requisitar(self, etapa, metodo, caminho, corpo=None):
+        dados = json.dumps(corpo).encode() if corpo is not None else None
+        pedido = urllib.request.Request(self.url + caminho, data=dados, method=metodo)
+        pedido.add_header("Accept", "application/json")
+        if dados is not None:
+            pedido.add_header("Content-Type", "application/json")
+
+        inicio = time.perf_counter()
+        try:
+            with self.opener.open(pedido, timeout=self.timeout) as response:
+                codigo, conteudo = response.status, response.read()
+        except urllib.error.HTTPError as erro:
+            codigo, conteudo = erro.code, erro.read()
+        except (urllib.error.URLError, OSError):
+            codigo, conteudo = None, b""
+        self.coletor.registrar(etapa, (time.perf_counter() - inicio) * 1000, codigo)
+
+        try:
+            return codigo, json.loads(conteudo) if conteudo else None
+        except ValueError:
+            return codigo, None
+
+    def login(self):
+        codigo, _ = self.requisitar(
+            "login", "POST", "/api/users/login/", {"username": self.username, "password": self.senha}
+        )
+        return codigo in (200, 302)
+
+    def run(self):
+        if not self.login():
+            return
+        self.preparar()
+        while time.monotonic() < self.prazo:
+            self.iteracao()
+
+
+class ClienteVirtual(UsuarioVirtual):
+    def esvaziar_carrinho(self):
+        _, carrinho = self.requisitar("carrinho_ver", "GET", "/api/pedidos/carrinho/")
+        itens = (carrinho or {}).get("items", [])
+        if itens:
+            self.requisitar("carrinho_lote", "POST", "/api/pedidos/carrinho/lote/", {
+                "operacoes": [{"produto": i["produto_id"], "acao": "remover"} for i in itens]
+            })
+
+    def preparar(self):
+        # Começa com o carrinho vazio para não misturar lojas com o carrinho do seed.
+        self.esvaziar_carrinho()
+        _, metodos = self.requisitar("pagamento_listar", "GET", "/api/pedidos/pagamento/listar/")
+        self.metodo_id = metodos[0]["id"] if metodos else None
+
+    def iteracao(self):
+        pagina = self.rng.randint(1, 5)
+        _, produtos = self.requisitar("catalogo_listar", "GET", f"/api/core/produtos/?page={pagina}")
+        self.requisitar("catalogo_buscar", "GET", "/api/core/produtos/?search=" + self.rng.choice(["pizza", "suco", "acai"]))
+        self.requisitar("lojas_listar", "GET", "/api/core/lojas/")
+
+        resultados = (produtos or {}).get("results", [])
+        if not resultados:
+            return
+        # Carrinho de uma loja só: escolhe a loja de um produto e itens dela.
+        loja = self.rng.choice(resultados)["loja_nome"]
+        escolhidos = [p for p in resultados if p["loja_nome"] == loja][:3]
+        for produto in escolhidos:
+            self.requisitar("carrinho_adicionar", "POST", "/api/pedidos/carrinho/", {
+                "produto": produto["id"], "quantidade": 1
+            })
+        self.requisitar("carrinho_ver", "GET", "/api/pedidos/carrinho/")
+
+        if self.metodo_id is not None:
+            codigo, _ = self.requisitar("checkout", "POST", "/api/pedidos/pagamento/pagar/", {
+                "metodo_pagamento_id": self.metodo_id
+            })
+            if codigo != 201:
+                # Sem esvaziar, a próxima iteração pode cair em outra loja e falhar no carrinho.
+                self.esvaziar_carrinho()
+        self.requisitar("historico_cliente", "GET", "/api/pedidos/historico-pedidos/")
+
+
+class LojaVirtual(UsuarioVirtual):
+    def preparar(self):
+        hoje = date.today()
+        self.periodo = f"data_inicial={hoje - timedelta(days=30)}&data_final={hoje}"
+
+    def iteracao(self):
+        self.requisitar("historico_loja", "GET", "/api/pedidos/historico-loja/")
+        self.requisitar("alteracoes_loja", "GET", "/api/pedidos/historico-loja/alteracoes/?espera=0")
+        self.requisitar("faturamento_30_dias", "GET", f"/api/pedidos/faturamento/periodo/?{self.periodo}")
+        time.sleep(self.rng.uniform(0.5, 1.5))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clientes", type=int, default=10, help="Clientes virtuais simultâneos.")
+    parser.add_argument("--lojas", type=int, default=2, help="Lojas virtuais simultâneas.")
+    parser.add_argument("--duracao", type=float, default=30, help="Segundos de carga.")
+    parser.add_argument("--senha", default="bench12345")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--saida", default="-", help="Arquivo JSON do relatório (padrão: stdout).")
+    args = parser.parse_args(argv)
+
+    coletor = Coletor()
+    inicio = time.monotonic()
+    prazo = inicio + args.duracao
+    usuarios = [
+        ClienteVirtual(args.url, f"bench_c{i}", args.senha, coletor, prazo, args.timeout)
+        for i in range(args.clientes)
+    ] + [
+        LojaVirtual(args.url, f"bench_l{i}", args.senha, coletor, prazo, args.timeout)
+        for i in range(args.lojas)
+    ]
+
+    for usuario in usuarios:
+        usuario.start()
+    for usuario in usuarios:
+        usuario.join()
+    decorrido = time.monotonic() - inicio
+
+    cenarios = coletor.resumo()
+    total = sum(c["requisicoes"] for c in cenarios.values())
+    for nome, c in cenarios.items():
+        print(
+            f"{nome:<22} {c['requisicoes']:>6} req  p50 {c.get('p50_ms', 0):>8.2f} ms  "
+            f"p95 {c.get('p95_ms', 0):>8.2f} ms  erros {c['erros']}  429 {c['limitadas']}",
+            file=sys.stderr,
+        )
+    print(f"{total} requisições em {decorrido:.1f}s ({total / decorrido:.1f} req/s)", file=sys.stderr)
+
+    gravar(
+        {
+            "meta": metadados(
+                "carga",
+                url=args.url,
+                clientes=args.clientes,
+                lojas=args.lojas,
+                duracao_s=args.duracao,
+            ),
+            "totais": {
+                "requisicoes": total,
+                "duracao_s": round(decorrido, 3),
+                "vazao_rps": round(total / decorrido, 3) if decorrido else None,
+                "erros": sum(c["erros"] for c in cenarios.values()),
+                "limitadas": sum(c["limitadas"] for c in cenarios.values()),
+            },
+            "cenarios": cenarios,
+        },
+        args.saida,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compara dois relatórios JSON de benchmark (micro ou carga).
+
+    python -m benchmarks.comparar base.json novo.json --limite 10
+
+Mostra a variação de p50, p95, queries e bytes por cenário e termina com
+código 1 se algum p95 piorar mais que `--limite` por cento ou se o número
+de queries de algum cenário aumentar.
+"""
+import argparse
+import sys
+
+from .relatorio import carregar
+
+
+METRICAS = ("p50_ms", "p95_ms", "queries", "bytes")
+
+
+def variacao(antes, depois):
+    if antes in (None, 0) or depois is None:
+        return None
+    return (depois - antes) / antes * 100
+
+
+def _formatar(valor):
+    if valor is None:
+        return "-"
+    return f"{valor:.2f}" if isinstance(valor, float) else str(valor)
+
+
+def comparar(base, novo, limite):
+    regressoes = []
+    linhas = []
+
+    for nome in sorted(set(base["cenarios"]) | set(novo["cenarios"])):
+        antes = base["cenarios"].get(nome)
+        depois = novo["cenarios"].get(nome)
+        if antes is None or depois is None:
+            linhas.append(f"{nome:<26} {'só no novo' if antes is None else 'só na base'}")
+            continue
+
+        colunas = []
+        for metrica in METRICAS:
+            a, d = antes.get(metrica), depois.get(metrica)
+            v = variacao(a, d)
+            colunas.append(f"{metrica} {_formatar(a)} -> {_formatar(d)}" + (f" ({v:+.1f}%)" if v is not None else ""))
+
+        v95 = variacao(antes.get("p95_ms"), depois.get("p95_ms"))
+        if v95 is not None and v95 > limite:
+            regressoes.append(f"{nome}: p95 {v95:+.1f}%")
+        if (antes.get("queries") or 0) < (depois.get("queries") or 0):
+            regressoes.append(f"{nome}: queries {antes['queries']} -> {depois['queries']}")
+
+        linhas.append(f"{nome:<26} " + " | ".join(colunas))
+
+    return linhas, regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("novo")
+    parser.add_argument("--limite", type=float, default=10, help="Piora aceitável do p95, em %%.")
+    args = parser.parse_args(argv)
+
+    base, novo = carregar(args.base), carregar(args.novo)
+    if base["meta"]["tipo"] != novo["meta"]["tipo"]:
+        sys.exit(f"Relatórios de tipos diferentes: {base['meta']['tipo']} e {novo['meta']['tipo']}.")
+
+    print(f"base: {base['meta'].get('commit')}  novo: {novo['meta'].get('commit')}")
+    linhas, regressoes = comparar(base, novo, args.limite)
+    print("\n".join(linhas))
+
+    if regressoes:
+        print("\nRegressões:")
+        print("\n".join(f"  {r}" for r in regressoes))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
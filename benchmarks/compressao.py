@@ -0,0 +1,97 @@
+"""
+Bytes no fio e CPU de compressão por resposta, para os endpoints mais pesados.
+
+Para cada endpoint, busca a resposta sem compressão e mede cada codec/nível
+(gzip 1/5/9 e, com o pacote `brotli`, brotli 1/4/6): tamanho, razão e tempo
+de CPU por resposta. Também faz a requisição com `Accept-Encoding: br, gzip`
+e registra o que o CompressaoMiddleware escolheu. Roda em processo, contra o
+banco populado por `manage.py seed_benchmark`.
+
+    python -m benchmarks.compressao --repeticoes 200 --saida compressao.json
+"""
+import argparse
+import sys
+import time
+
+from .micro import _cliente_com_carrinho, _clientes_http, _loja
+from .relatorio import gravar, metadados, resumir_latencias
+
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from apps.core.compressao import codecs_disponiveis, comprimir  # noqa: E402
+from apps.core.throttling import BaldeDeTokensThrottle  # noqa: E402
+
+
+NIVEIS = {"gzip": (1, 5, 9), "br": (1, 4, 6)}
+
+
+def endpoints(loja):
+    return [
+        ("catalogo_10", "anonimo", "/api/core/produtos/"),
+        ("lojas_listar", "anonimo", "/api/core/lojas/"),
+        ("loja_detalhe", "anonimo", f"/api/core/lojas/{loja.lojaperfil.id}/"),
+        ("historico_loja", "loja", "/api/pedidos/historico-loja/"),
+        ("catalogo_compacto", "anonimo", "/api/core/produtos/?fields=id,nome,preco"),
+    ]
+
+
+def medir_codec(corpo, codificacao, nivel, repeticoes):
+    tempos = []
+    comprimido = b""
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        comprimido = comprimir(corpo, codificacao, nivel)
+        tempos.append((time.process_time() - inicio) * 1000)
+    estatisticas = resumir_latencias(tempos)
+    # Aqui os "_ms" são tempo de CPU por resposta.
+    return dict(estatisticas, bytes=len(comprimido), razao=round(len(comprimido) / len(corpo), 4))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=100)
+    parser.add_argument("--saida", default="-", help="Arquivo JSON do relatório (padrão: stdout).")
+    args = parser.parse_args(argv)
+
+    setup_test_environment()
+    BaldeDeTokensThrottle.THROTTLE_RATES = dict.fromkeys(BaldeDeTokensThrottle.THROTTLE_RATES)
+    loja = _loja()
+    http = _clientes_http(_cliente_com_carrinho(), loja)
+
+    cenarios = {}
+    for nome, perfil, caminho in endpoints(loja):
+        corpo = http[perfil].get(caminho, HTTP_ACCEPT_ENCODING="identity").content
+        cenarios[f"{nome}/identidade"] = {"bytes": len(corpo)}
+
+        for codificacao in codecs_disponiveis():
+            for nivel in NIVEIS[codificacao]:
+                resultado = medir_codec(corpo, codificacao, nivel, args.repeticoes)
+                cenarios[f"{nome}/{codificacao}-{nivel}"] = resultado
+
+        negociada = http[perfil].get(caminho, HTTP_ACCEPT_ENCODING="br, gzip")
+        cenarios[f"{nome}/negociado"] = {
+            "bytes": len(negociada.content),
+            "codificacao": negociada.get("Content-Encoding", "identidade"),
+        }
+
+        print(f"{nome}: {len(corpo)} B sem compressão", file=sys.stderr)
+        for chave, resultado in cenarios.items():
+            if chave.startswith(f"{nome}/") and "razao" in resultado:
+                print(
+                    f"    {chave.split('/')[1]:<8} {resultado['bytes']:>8} B  razão {resultado['razao']:.3f}  "
+                    f"CPU {resultado['media_ms']:.3f} ms",
+                    file=sys.stderr,
+                )
+        print(f"    negociado {cenarios[f'{nome}/negociado']}", file=sys.stderr)
+
+    gravar(
+        {
+            "meta": metadados("compressao", repeticoes=args.repeticoes, codecs=list(codecs_disponiveis())),
+            "cenarios": cenarios,
+        },
+        args.saida,
+    )
+
+
+if __name__ == "__main__":
+    main()
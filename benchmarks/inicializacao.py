@@ -0,0 +1,116 @@
+"""
+Tempo de boot de um worker, com e sem a documentação da API montada.
+
+Cada amostra é um processo Python novo que faz o que um worker faz antes da
+primeira requisição: `django.setup()`, monta o WSGIHandler (middlewares) e
+carrega o URLconf (todas as views e serializers). Uma execução extra com
+`-X importtime` mostra quanto cada pacote custa na importação.
+
+    python -m benchmarks.inicializacao --amostras 10 --saida boot.json
+
+Rodado em dois commits, os relatórios se comparam com `benchmarks.comparar`.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from .relatorio import RAIZ, gravar, metadados, resumir_latencias
+
+
+BOOT = """
+import json, sys
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({"drf_yasg": sorted(m for m in sys.modules if m.startswith("drf_yasg"))}))
+"""
+
+MODOS = {
+    "boot_com_documentacao": "1",
+    "boot_sem_documentacao": "0",
+}
+
+LINHA_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def _ambiente(documentacao):
+    ambiente = dict(os.environ, DJANGO_SETTINGS_MODULE="venda.settings", DOCUMENTACAO_API=documentacao)
+    ambiente["PYTHONPATH"] = os.pathsep.join(filter(None, [RAIZ, ambiente.get("PYTHONPATH")]))
+    return ambiente
+
+
+def medir_boot(documentacao, amostras):
+    latencias = []
+    modulos = []
+    for _ in range(amostras):
+        inicio = time.perf_counter()
+        saida = subprocess.run(
+            [sys.executable, "-c", BOOT], cwd=RAIZ, env=_ambiente(documentacao),
+            capture_output=True, text=True, check=True,
+        )
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        modulos = json.loads(saida.stdout.strip().splitlines()[-1])["drf_yasg"]
+    return dict(resumir_latencias(latencias), modulos_drf_yasg=len(modulos))
+
+
+def perfil_importacao(documentacao, top):
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT], cwd=RAIZ, env=_ambiente(documentacao),
+        capture_output=True, text=True, check=True,
+    )
+    por_pacote = defaultdict(int)
+    total = 0
+    for linha in saida.stderr.splitlines():
+        casamento = LINHA_IMPORTTIME.match(linha)
+        if not casamento:
+            continue
+        proprio = int(casamento.group(1))
+        por_pacote[casamento.group(3).split(".")[0]] += proprio
+        total += proprio
+
+    maiores = sorted(por_pacote.items(), key=lambda item: -item[1])[:top]
+    return {
+        "total_importacao_ms": round(total / 1000, 1),
+        "pacotes_ms": {pacote: round(us / 1000, 1) for pacote, us in maiores},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--amostras", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="Pacotes listados no perfil de importação.")
+    parser.add_argument("--saida", default="-", help="Arquivo JSON do relatório (padrão: stdout).")
+    args = parser.parse_args(argv)
+
+    cenarios = {}
+    importacao = {}
+    for nome, documentacao in MODOS.items():
+        cenarios[nome] = medir_boot(documentacao, args.amostras)
+        importacao[nome] = perfil_importacao(documentacao, args.top)
+        print(
+            f"{nome:<24} p50 {cenarios[nome]['p50_ms']:>8.1f} ms  p95 {cenarios[nome]['p95_ms']:>8.1f} ms  "
+            f"importação {importacao[nome]['total_importacao_ms']:>7.1f} ms  "
+            f"módulos drf_yasg {cenarios[nome]['modulos_drf_yasg']}",
+            file=sys.stderr,
+        )
+
+    gravar(
+        {
+            "meta": metadados("inicializacao", amostras=args.amostras),
+            "cenarios": cenarios,
+            "importacao": importacao,
+        },
+        args.saida,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Microbenchmarks em processo, com o test client do Django.
+
+Roda contra o banco configurado em `venda.settings` (popule-o antes com
+`python manage.py seed_benchmark`). Cada cenário mede latência, número de
+queries SQL e tamanho da resposta; cenários de escrita rodam dentro de uma
+transação desfeita ao final de cada iteração, então o banco não muda.
+
+    python -m benchmarks.micro --iteracoes 200 --saida micro.json
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from .relatorio import RAIZ, gravar, metadados, resumir_latencias
+
+
+sys.path.insert(0, RAIZ)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "venda.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+
+from apps.core.models import Produto  # noqa: E402
+from apps.core.throttling import BaldeDeTokensThrottle  # noqa: E402
+from apps.pedidos.models import Carrinho  # noqa: E402
+from apps.users.models import User  # noqa: E402
+from apps.users.serializers import CustomTokenObtainPairSerializer  # noqa: E402
+
+
+class Cenario:
+    def __init__(self, nome, perfil, metodo, caminho, corpo=None, escrita=False):
+        self.nome = nome
+        self.perfil = perfil
+        self.metodo = metodo
+        self.caminho = caminho
+        self.corpo = corpo
+        self.escrita = escrita
+
+
+def _cliente_com_carrinho():
+    carrinho = (
+        Carrinho.objects
+        .filter(user__username__startswith="bench_c", items__isnull=False)
+        .select_related("user")
+        .first()
+    )
+    if carrinho is None:
+        sys.exit("Nenhum cliente de benchmark com carrinho. Rode `manage.py seed_benchmark` antes.")
+    return carrinho.user
+
+
+def _loja():
+    loja = User.objects.filter(username__startswith="bench_l", lojaperfil__isnull=False).first()
+    if loja is None:
+        sys.exit("Nenhuma loja de benchmark. Rode `manage.py seed_benchmark` antes.")
+    return loja
+
+
+def montar_cenarios(cliente, loja):
+    carrinho = Carrinho.objects.get(user=cliente)
+    produto_carrinho = Produto.objects.filter(loja_id=carrinho.loja_id, quantidade__gt=10).first()
+    metodo = cliente.pagamentos.filter(ativo=True).first()
+    hoje = date.today()
+    periodo = f"data_inicial={hoje - timedelta(days=30)}&data_final={hoje}"
+
+    return [
+        Cenario("catalogo_listar", "anonimo", "get", "/api/core/produtos/"),
+        Cenario("catalogo_pagina_10", "anonimo", "get", "/api/core/produtos/?page=10"),
+        Cenario("catalogo_buscar", "anonimo", "get", "/api/core/produtos/?search=pizza"),
+        Cenario("catalogo_ordenar_preco", "anonimo", "get", "/api/core/produtos/?ordering=preco"),
+        Cenario("lojas_listar", "anonimo", "get", "/api/core/lojas/"),
+        Cenario("loja_detalhe", "anonimo", "get", f"/api/core/lojas/{loja.lojaperfil.id}/"),
+        Cenario("carrinho_ver", "cliente", "get", "/api/pedidos/carrinho/"),
+        Cenario(
+            "carrinho_adicionar", "cliente", "post", "/api/pedidos/carrinho/",
+            corpo={"produto": produto_carrinho.id, "quantidade": 1}, escrita=True,
+        ),
+        Cenario(
+            "checkout", "cliente", "post", "/api/pedidos/pagamento/pagar/",
+            corpo={"metodo_pagamento_id": metodo.id}, escrita=True,
+        ),
+        Cenario("historico_cliente", "cliente", "get", "/api/pedidos/historico-pedidos/"),
+        Cenario("historico_cliente_detalhes", "cliente", "get", "/api/pedidos/historico-pedidos/?detalhes=true"),
+        Cenario("historico_loja", "loja", "get", "/api/pedidos/historico-loja/"),
+        Cenario("historico_loja_detalhes", "loja", "get", "/api/pedidos/historico-loja/?detalhes=true"),
+        Cenario("alteracoes_loja", "loja", "get", "/api/pedidos/historico-loja/alteracoes/?espera=0"),
+        Cenario("faturamento_30_dias", "loja", "get", f"/api/pedidos/faturamento/periodo/?{periodo}"),
+    ]
+
+
+def _clientes_http(cliente, loja):
+    clientes = {"anonimo": Client()}
+    for perfil, user in (("cliente", cliente), ("loja", loja)):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        clientes[perfil] = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return clientes
+
+
+def executar_uma(cenario, http):
+    requisitar = getattr(http, cenario.metodo)
+    argumentos = {"content_type": "application/json"} if cenario.corpo is not None else {}
+
+    with CaptureQueriesContext(connection) as queries:
+        inicio = time.perf_counter()
+        response = requisitar(cenario.caminho, cenario.corpo, **argumentos)
+        duracao = (time.perf_counter() - inicio) * 1000
+
+    corpo = b"".join(response.streaming_content) if response.streaming else response.content
+    return duracao, len(queries), len(corpo), response.status_code
+
+
+def medir(cenario, http, iteracoes, aquecimento):
+    latencias = []
+    queries = tamanho = None
+    status = {}
+
+    for indice in range(aquecimento + iteracoes):
+        if cenario.escrita:
+            with transaction.atomic():
+                resultado = executar_uma(cenario, http)
+                transaction.set_rollback(True)
+        else:
+            resultado = executar_uma(cenario, http)
+
+        if indice < aquecimento:
+            continue
+        duracao, queries, tamanho, codigo = resultado
+        latencias.append(duracao)
+        status[str(codigo)] = status.get(str(codigo), 0) + 1
+
+    return dict(resumir_latencias(latencias), queries=queries, bytes=tamanho, status=status)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iteracoes", type=int, default=100)
+    parser.add_argument("--aquecimento", type=int, default=5)
+    parser.add_argument("--cenario", action="append", help="Roda só os cenários cujo nome contém o texto.")
+    parser.add_argument("--saida", default="-", help="Arquivo JSON do relatório (padrão: stdout).")
+    args = parser.parse_args(argv)
+
+    setup_test_environment()
+    # Throttling não é o que está sendo medido: taxa None desliga todos os escopos.
+    BaldeDeTokensThrottle.THROTTLE_RATES = dict.fromkeys(BaldeDeTokensThrottle.THROTTLE_RATES)
+
+    cliente, loja = _cliente_com_carrinho(), _loja()
+    http = _clientes_http(cliente, loja)
+
+    cenarios = montar_cenarios(cliente, loja)
+    if args.cenario:
+        cenarios = [c for c in cenarios if any(filtro in c.nome for filtro in args.cenario)]
+
+    resultados = {}
+    for cenario in cenarios:
+        resultados[cenario.nome] = medir(cenario, http[cenario.perfil], args.iteracoes, args.aquecimento)
+        r = resultados[cenario.nome]
+        print(
+            f"{cenario.nome:<26} p50 {r['p50_ms']:>8.2f} ms  p95 {r['p95_ms']:>8.2f} ms  "
+            f"{r['queries']:>3} queries  {r['bytes']:>7} B  {r['status']}",
+            file=sys.stderr,
+        )
+
+    gravar(
+        {
+            "meta": metadados(
+                "micro",
+                iteracoes=args.iteracoes,
+                aquecimento=args.aquecimento,
+                banco=connection.vendor,
+                produtos=Produto.objects.count(),
+            ),
+            "cenarios": resultados,
+        },
+        args.saida,
+    )
+
+
+if __name__ == "__main__":
+    main()
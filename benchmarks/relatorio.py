@@ -0,0 +1,83 @@
+"""
+Formato comum dos relatórios JSON de benchmark.
+
+Um relatório tem `meta` (commit, versões, parâmetros da execução) e
+`cenarios`, um dicionário nome -> estatísticas. `comparar.py` só depende
+desse formato, então relatórios de commits diferentes podem ser comparados
+diretamente.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir_latencias(latencias_ms):
+    if not latencias_ms:
+        return {"n": 0}
+    return {
+        "n": len(latencias_ms),
+        "media_ms": round(statistics.fmean(latencias_ms), 3),
+        "p50_ms": round(percentil(latencias_ms, 50), 3),
+        "p95_ms": round(percentil(latencias_ms, 95), 3),
+        "p99_ms": round(percentil(latencias_ms, 99), 3),
+        "min_ms": round(min(latencias_ms), 3),
+        "max_ms": round(max(latencias_ms), 3),
+    }
+
+
+def commit_atual():
+    try:
+        saida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+        )
+        sujo = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return saida.stdout.strip() + ("-sujo" if sujo.stdout.strip() else "")
+
+
+def metadados(tipo, **parametros):
+    return {
+        "tipo": tipo,
+        "commit": commit_atual(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": parametros,
+    }
+
+
+def gravar(relatorio, caminho):
+    conteudo = json.dumps(relatorio, indent=2, ensure_ascii=False, sort_keys=True)
+    if caminho in (None, "-"):
+        sys.stdout.write(conteudo + "\n")
+        return
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        arquivo.write(conteudo + "\n")
+    print(f"Relatório gravado em {caminho}", file=sys.stderr)
+
+
+def carregar(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
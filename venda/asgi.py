@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'venda.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from apps.pedidos.sse import EventosPedidoASGI  # noqa: E402  (requer django.setup())
+
+application = EventosPedidoASGI(django_application)
@@ -31,13 +31,21 @@ INSTALLED_APPS = [
     'apps.users',
     'apps.pedidos',
     'apps.core',
-    'drf_yasg',
 ]
 
+# Swagger/ReDoc e /swagger.json|yaml. Desligado (DOCUMENTACAO_API=0), as rotas
+# não são montadas; o gerador de schema e a UI do drf-yasg só são importados por elas.
+DOCUMENTACAO_API = os.environ.get("DOCUMENTACAO_API", "1") != "0"
+if DOCUMENTACAO_API:
+    INSTALLED_APPS.append('drf_yasg')
+
 AUTH_USER_MODEL = 'users.User'
 AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
 
 MIDDLEWARE = [
+    'apps.core.middleware.MetricasMiddleware',
+    'apps.core.middleware.LimiteConcorrenciaMiddleware',
+    'apps.core.middleware.CompressaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -47,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'apps.core.middleware.JWTHeaderMiddleware',
+    'apps.core.middleware.PerfilamentoMiddleware',
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -99,6 +108,62 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Cache compartilhado entre os workers (usado pelo throttling). Sem REDIS_URL,
+# cai no cache em memória, que é por processo.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Validade (s) do resumo de pedidos por usuário no cache; ele também é
+# apagado a cada novo pedido ou mudança de status.
+RESUMO_PEDIDOS_TTL = 300
+
+# Máximo de requisições simultâneas por processo antes de responder 503
+# (None desativa).
+CONCORRENCIA_MAXIMA = 64
+CONCORRENCIA_RETRY_AFTER = 1
+# Long-polls contam num limite à parte (None desativa o limite deles).
+CONCORRENCIA_LONG_POLL = ("/api/pedidos/historico-loja/alteracoes/",)
+CONCORRENCIA_MAXIMA_LONG_POLL = 16
+
+# Métricas em /metrics, só para staff ou com `Authorization: Bearer
+# <METRICAS_TOKEN>`. Com vários workers, aponte METRICAS_DIR para um
+# diretório local compartilhado por eles.
+METRICAS_DIR = os.environ.get("METRICAS_DIR")
+METRICAS_INTERVALO_GRAVACAO = 5
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN")
+
+# Compressão das respostas da API (brotli, se o pacote estiver instalado, ou
+# gzip). Abaixo de COMPRESSAO_MINIMO bytes o ganho não paga o CPU.
+COMPRESSAO_MINIMO = 1024
+COMPRESSAO_NIVEL_GZIP = 5
+COMPRESSAO_QUALIDADE_BROTLI = 4
+# Preenchimento aleatório (0 a N-1 bytes) nas respostas gzip, contra BREACH.
+COMPRESSAO_MAX_BYTES_ALEATORIOS = 100
+
+# Perfilamento sob demanda (staff com "X-Profile: 1") e por amostragem.
+PROFILING_AMOSTRAGEM = 0.0
+PROFILING_MAX_REGISTROS = 200
+
+# Schema OpenAPI pré-gerado (manage.py gerar_schema). Se estiver ausente ou
+# for de outra versão do código, é gerado na primeira requisição. A versão é
+# OPENAPI_VERSAO (ex.: o SHA do deploy) ou, sem ela, a revisão git.
+OPENAPI_DIR = BASE_DIR / "openapi"
+OPENAPI_VERSAO = os.environ.get("OPENAPI_VERSAO")
+
+SWAGGER_SETTINGS = {"SPEC_URL": "/swagger.json"}
+REDOC_SETTINGS = {"SPEC_URL": "/swagger.json"}
+
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
@@ -111,12 +176,30 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "apps.core.throttling.BaldeDeTokensThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "10/min",
+        "registro": "5/min",
+        "pagamento": "10/min",
+        "catalogo": "120/min",
+    },
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",  
     ],
 }
 
+# Tamanho do balde (rajada aceita) por escopo de throttling; as taxas de
+# DEFAULT_THROTTLE_RATES acima são a reposição. Sem entrada, vale o N da taxa.
+THROTTLE_CAPACIDADE = {
+    "login": 5,
+    "registro": 3,
+    "pagamento": 5,
+    "catalogo": 60,
+}
+
 SIMPLE_JWT = {
     "TOKEN_OBTAIN_SERIALIZER": "apps.users.serializers.CustomTokenObtainPairSerializer",
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
@@ -124,5 +207,21 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Eventos de pedidos (SSE em /api/pedidos/eventos/). Com mais de um worker,
+# use "apps.pedidos.eventos.BrokerRedis" com OPTIONS {"url": "redis://..."}.
+PEDIDOS_EVENTOS = {
+    "BACKEND": "apps.pedidos.eventos.BrokerMemoria",
+    "OPTIONS": {},
+}
+
+# Por quanto tempo uma Idempotency-Key é lembrada (POST em /api/pedidos/).
+IDEMPOTENCIA_TTL = timedelta(hours=24)
+# Reserva sem resposta há mais que isso é de um processo que caiu e é liberada.
+IDEMPOTENCIA_PROCESSAMENTO_MAXIMO = timedelta(minutes=5)
+
+# Idade mínima (dias) de um pedido entregue/cancelado para
+# `manage.py arquivar_pedidos` movê-lo para as tabelas de arquivo.
+ARQUIVO_PEDIDOS_DIAS = 365
+
 LOGIN_REDIRECT_URL = '/api/users/painel/usuario/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,27 +1,16 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
 from apps.users.views import ApiRootView, PainelUsuarioView, PainelLojaView
-
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="API TRAINEE",
-        default_version="v1",
-        description="API de entrega para evitar desperdício de alimentos",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from apps.core.metricas import metricas_view
 
 urlpatterns = [
     path("", ApiRootView.as_view(), name="api-root"),
 
     path("admin/", admin.site.urls),
 
+    path("metrics", metricas_view, name="metricas"),
+
     path("api/users/", include(("apps.users.urls", "users"), namespace="users")),
 
     path("api/core/", include("apps.core.urls")),
@@ -30,10 +19,16 @@ urlpatterns = [
 
     path("painel/usuario/", PainelUsuarioView.as_view(), name="painel-usuario"),
     path("painel/loja/", PainelLojaView.as_view(), name="painel-loja"),
+]
+
+if settings.DOCUMENTACAO_API:
+    # O gerador e a UI do drf-yasg só são importados quando uma dessas rotas gera ou renderiza o schema.
+    from apps.core.schema import schema_json_view, schema_yaml_view, swagger_ui_view, redoc_view
 
-    path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger"),
+    urlpatterns += [
+        path("swagger/", swagger_ui_view, name="schema-swagger"),
 
-    path("swagger.json", schema_view.without_ui(cache_timeout=0), name="schema-json"),
-    path("swagger.yaml", schema_view.without_ui(cache_timeout=0), name="schema-yaml"),
-    path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
-]
\ No newline at end of file
+        path("swagger.json", schema_json_view, name="schema-json"),
+        path("swagger.yaml", schema_yaml_view, name="schema-yaml"),
+        path("redoc/", redoc_view, name="schema-redoc"),
+    ]
\ No newline at end of file